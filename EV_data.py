@@ -71,28 +71,37 @@ def energy_calc(atoms):
     return energy_per_atom
 
 
-def change_lattice_parameter(atoms, lattice_parameter, crystal_type):
+# sites per conventional cubic cell
+SITES_PER_CELL = {'FCC': 4, 'BCC': 2}
+
+
+def conventional_lattice_parameter(atoms, crystal_type):
     """
-    Change the lattice parameter of an atoms object
+    Cubic lattice parameter of an FCC or BCC supercell of any shape, from its volume per site
 
     Returns:
-    ase atoms object, volume of unit cell
+    lattice parameter (float)
     """
+    return np.cbrt(SITES_PER_CELL[crystal_type] * atoms.get_volume() / len(atoms))
 
 
-    # Set cell parameters based on the test structure type
-    if crystal_type == 'FCC':
-        atoms.set_cell([lattice_parameter, lattice_parameter, lattice_parameter])
-        volume = lattice_parameter**3
+def change_lattice_parameter(atoms, lattice_parameter, crystal_type):
+    """
+    Change the lattice parameter of an atoms object
 
-    elif crystal_type == 'BCC':
-        atoms.set_cell([lattice_parameter, lattice_parameter, lattice_parameter*2])
-        volume = lattice_parameter*lattice_parameter*(lattice_parameter*2)
+    The cell is scaled with the atoms, so it works for the near-cubic primitive supercells of make_vasp as well
+    as for conventional cubic cells.
 
-    else:
-        print(':(')
+    Returns:
+    ase atoms object, volume of the cell
+    """
 
+    if crystal_type not in SITES_PER_CELL:
+        raise ValueError(f"Unknown crystal type {crystal_type}, expected FCC or BCC")
 
+    scale = lattice_parameter / conventional_lattice_parameter(atoms, crystal_type)
+    atoms.set_cell(atoms.get_cell() * scale, scale_atoms=True)
+    volume = atoms.get_volume()
 
     return atoms, volume
 
@@ -105,19 +114,18 @@ def EV_data(file):
     returns: EV_data (dict)
     """
 
-    # change the lattice parameter list between FCC/BCC such that they are centered around the same volume 
-
     if 'FCC' in file:
         test_structure = 'FCC'
-        lattice_parameter_list= [4,5,6,7,8,9]
     elif 'BCC' in file:
         test_structure = 'BCC'
-        lattice_parameter_list= [4,5,6,7,8,9]
     
     volumes = []
     energies = []
     ase = ASEread(file)
 
+    # lattice parameters centered around the estimate the POSCAR was written with
+    lattice_parameter_list = conventional_lattice_parameter(ase, test_structure) * np.linspace(0.9, 1.1, 6)
+
     # calculate individual energy points
     for param in lattice_parameter_list:
 
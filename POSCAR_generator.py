@@ -1,8 +1,25 @@
 import re
-import random
+import functools
+import io
 import numpy as np
-import os
-import math
+
+from compact_structure import CompactStructure
+from element_properties import element_property
+from structure_utils import (
+    apportion_atoms, decoration_rng, estimate_lattice_parameter_bcc, estimate_lattice_parameter_fcc,
+    find_supercell_matrix, generate_random_decorations, get_supercell, minimal_supercell_size,
+)
+
+
+# smallest cell generated when the size is picked from the composition
+MIN_ATOMS = 16
+
+# largest cell minimal_supercell_size may pick
+MAX_ATOMS = 500
+
+# largest deviation of an element's fraction in the cell from the alloy when the size is picked
+COMPOSITION_TOLERANCE = 0.01
+
 
 def find_mole_fractions(input_string):
     """
@@ -45,67 +62,135 @@ def write_vasp(lines, output_file):
     return output_file
 
 
+def write_poscar(structure: CompactStructure, file, comment: str='Alloy'):
+    """
+    Stream a structure as POSCAR text to an open file handle or text buffer.
 
-def make_vasp(alloy, element_mol_fraction, filepath, output_file):
+    VASP lists the sites of each element together, so the sites are written grouped by species (in element
+    table order, keeping the site order within an element).  Elements without sites are left out.
+
+    Args:
+        structure (CompactStructure): structure to write
+        file: writable text file handle or buffer, e.g. open(path, 'w') or io.StringIO()
+        comment (str): first line of the POSCAR
     """
-    Generate a POSCAR file for a given alloy.
+    order = np.argsort(structure.species, kind='stable')
+    counts = structure.counts
+    present = np.nonzero(counts)[0]
+
+    file.write(f'{comment}\n1.0\n')
+    np.savetxt(file, structure.lattice, fmt='%.10f')
+    file.write(' '.join(structure.elements[n] for n in present) + '\n')
+    file.write(' '.join(str(counts[n]) for n in present) + '\n')
+    file.write('Cartesian\n')
+    np.savetxt(file, structure.cart_coords[order], fmt='%.10f')
 
-    inputs: alloy (str), element_mol_fraction (dict), filepath (str), output_file (str)
 
-    returns: none (writes to file)
+def poscar_lines(structure: CompactStructure, comment: str='Alloy'):
+    """
+    Render a structure as POSCAR lines in memory, see write_poscar.
+
+    Returns:
+        list: lines of the POSCAR, each ending in a newline
     """
+    buffer = io.StringIO()
+    write_poscar(structure, buffer, comment)
+    return buffer.getvalue().splitlines(keepends=True)
 
-    total_atoms = 40
 
-    element_atom_count = {element: max(1, math.floor(total_atoms * fraction)) for element, fraction in element_mol_fraction.items()}
+def estimate_lattice_parameter(element_mol_fraction, crystal):
+    """
+    Vegard's-law lattice parameter of touching spheres.
+
+    The radius is the fraction-weighted average metallic radius (the atomic radius for elements without one).
 
-    # Calculate the current total and determine how many atoms are missing
-    current_total = sum(element_atom_count.values())
-    atoms_to_add = total_atoms - current_total
+    inputs: element_mol_fraction (dict), crystal (str): 'FCC' or 'BCC'
 
-    # Distribute the remaining atoms
-    for element in sorted(element_mol_fraction, key=lambda e: element_mol_fraction[e], reverse=True):
-        if atoms_to_add <= 0:
+    returns: lattice parameter in Angstroms (float)
+    """
+    elements = list(element_mol_fraction.keys())
+    fractions = np.array(list(element_mol_fraction.values()), dtype=float)
+    radius = element_property("metallic_radius", elements)
+    radius = np.where(np.isnan(radius), element_property("atomic_radius", elements), radius)
+    average_radius = float(fractions @ radius / fractions.sum())
+
+    if crystal.upper() == 'FCC':
+        return float(estimate_lattice_parameter_fcc(average_radius))
+    elif crystal.upper() == 'BCC':
+        return float(estimate_lattice_parameter_bcc(average_radius))
+    raise ValueError(f"{crystal} is not a valid crystal type. Valid crystal types are FCC, BCC.")
+
+
+@functools.lru_cache(maxsize=4096)
+def _default_total_atoms(fractions: tuple):
+    # search the small cells first, most alloys fit in one and a campaign repeats the same fraction vectors
+    fractions = np.array(fractions) / sum(fractions)
+    smallest = max(MIN_ATOMS, len(fractions))
+    for sizes in (np.arange(smallest, 65), np.arange(smallest, MAX_ATOMS + 1)):
+        total_atoms = minimal_supercell_size(fractions, COMPOSITION_TOLERANCE, sizes=sizes)
+        if np.abs(apportion_atoms(fractions, total_atoms) / total_atoms - fractions).max() <= COMPOSITION_TOLERANCE + 1e-9:
             break
-        element_atom_count[element] += 1
-        atoms_to_add -= 1
+    return int(total_atoms)
+
+
+def make_vasp(alloy, element_mol_fraction, crystal, *, output_file=None, total_atoms=None, lattice_parameter=None,
+              rng=None, return_structure=False):
+    """
+    Generate a POSCAR for a given alloy with any number of elements.
+
+    The cell is a near-cubic FCC or BCC supercell with exactly total_atoms sites, the sites are split between
+    the elements with apportion_atoms and assigned to them at random.
+
+    inputs: alloy (str), element_mol_fraction (dict), crystal (str): 'FCC' or 'BCC', output_file (str): also
+            write the POSCAR there, total_atoms (int): number of sites, default the smallest cell of at least
+            MIN_ATOMS sites that represents the composition to within COMPOSITION_TOLERANCE, lattice_parameter (float): default
+            estimate_lattice_parameter, rng: random number generator (see decoration_rng),
+            return_structure (bool): also return the CompactStructure the lines were rendered from
+
+    returns: list of POSCAR lines, or (lines, CompactStructure) if return_structure
+    """
+    fractions = list(element_mol_fraction.values())
+    if total_atoms is None:
+        total_atoms = _default_total_atoms(tuple(fractions))
+    if lattice_parameter is None:
+        lattice_parameter = estimate_lattice_parameter(element_mol_fraction, crystal)
+
+    # Split the sites between the elements, keeping every element in the cell
+    counts = apportion_atoms(fractions, total_atoms)
 
     # Verify that the total now matches the desired number of atoms
-    assert sum(element_atom_count.values()) == total_atoms, "Total atom count does not match."
+    assert sum(counts) == total_atoms, "Total atom count does not match."
+
+    crystal = crystal.lower()
+    lattice, frac_coords = get_supercell(crystal, lattice_parameter, find_supercell_matrix(crystal, total_atoms),
+                                         primitive=True)
+    species = generate_random_decorations(counts, 1, rng or decoration_rng())[0]
+    structure = CompactStructure(lattice, frac_coords, species, list(element_mol_fraction.keys()))
 
-    # Read the original file
-    with open(filepath, 'r') as file:
-        lines = file.readlines()
+    lines = poscar_lines(structure, comment=alloy)
+    if output_file is not None:
+        write_vasp(lines, output_file)
 
-    # Insert the elements list into line 6
-    lines[5] = ' '.join(element_mol_fraction.keys()) + '\n'
+    return (lines, structure) if return_structure else lines
 
-    # Insert the num_atoms list into line 7
-    num_atoms_line = ' '.join(str(element_atom_count[element]) for element in element_mol_fraction.keys()) + '\n'
-    lines[6] = num_atoms_line
-    
-    #write_vasp(lines, output_file)
-    
-    return lines
 
-    
 
-def generate_poscar_files(alloy, crystal):
+def generate_poscar_files(alloy, crystal, return_structure=False, total_atoms=None, lattice_parameter=None, rng=None):
     """
     Generate POSCAR files for a given alloy.
 
-    inputs: alloy (str)
+    inputs: alloy (str), crystal (str): 'FCC' or 'BCC', return_structure (bool): also return the CompactStructure,
+            total_atoms, lattice_parameter, rng: see make_vasp
 
-    returns: none (writes to file)
+    returns: (POSCAR lines, mol_fractions), or (POSCAR lines, mol_fractions, CompactStructure) if return_structure
     """
     mol_fractions = find_mole_fractions(alloy)
 
-    if crystal == 'FCC':
-        filepath = '5_component_FCC.txt'
-    elif crystal == 'BCC':
-        filepath = '5_component_BCC.txt'
-
-    output_data = make_vasp(alloy, mol_fractions, filepath, f'vasp_files_temp/{alloy}_{crystal}.vasp')
+    output_data = make_vasp(alloy, mol_fractions, crystal, total_atoms=total_atoms,
+                            lattice_parameter=lattice_parameter, rng=rng, return_structure=return_structure)
+    if return_structure:
+        lines, structure = output_data
+        return lines, mol_fractions, structure
     return output_data, mol_fractions
 
 if __name__ == '__main__':
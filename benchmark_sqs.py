@@ -0,0 +1,228 @@
+"""
+SQS quality versus time benchmark.
+
+Runs every SQS engine over a set of compositions and supercell sizes at a ladder of budgets and records the
+wall time, the cores used and the error of the best structure.  Every engine optimizes the clusters within
+the same cutoffs, those of propose_fcc_cutoffs / propose_bcc_cutoffs, and all of them are scored with the same
+metric, the cluster-probability error of sqs_kernel.sqs_error over those clusters, since their own scores are
+not comparable.  The quality per core-second is the error
+removed relative to a random decoration of the same cell, divided by the core-seconds spent.
+
+    python benchmark_sqs.py --output sqs_benchmark.json
+    python benchmark_sqs.py --results sqs_benchmark.json --target-error 1e-3
+"""
+from pymatgen.core.composition import Composition
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+import numpy as np
+
+import structure_utils as su
+import sqs_generator
+from compact_structure import CompactStructure
+from sqs_kernel import generate_sqs, sqs_error
+
+
+ALLOYS = ("CoNi", "CoCrNi", "CoCrFeNi", "CoCrFeMnNi")
+
+SIZES = (60, 120)
+
+CRYSTALS = ("fcc", "bcc")
+
+# budget ladder of each engine, in the engine's own unit
+BUDGETS = {
+    "native": (10, 50, 200),          # swap attempts per site
+    "corr": (1000, 5000, 20000),      # smol MC steps per temperature
+    "cint": (1000, 5000, 20000),
+    "parallel": (1000, 5000, 20000),  # smol MC steps per temperature of every chain
+    "mcsqs": (10, 60, 300),           # seconds
+}
+
+# number of random decorations averaged for the reference error
+N_RANDOM = 8
+
+
+def _native(comp, crystal, prim, a, total_atoms, cutoffs, budget, seed):
+    structure, objective = generate_sqs(comp, crystal, total_atoms, cutoffs=cutoffs, lattice_parameter=a,
+                                        n_steps=budget * total_atoms, rng=su.decoration_rng(seed))
+    return structure, objective, 1
+
+
+def _smol(feature_type, n_chains):
+    def run(comp, crystal, prim, a, total_atoms, cutoffs, budget, seed):
+        # the generator of corr_sqs / cint_sqs with the cutoffs, step budget and supercell size of the benchmark
+        best = sqs_generator.parallel_sqs(prim, feature_type, n_chains=n_chains, mcmc_steps=budget, cutoffs=cutoffs,
+                                          supercell_size=total_atoms // len(prim), seed=seed, num_structures=1)[0]
+        return best.structure, best.score, n_chains
+    return run
+
+
+def _mcsqs(comp, crystal, prim, a, total_atoms, cutoffs, budget, seed):
+    instances = os.cpu_count()
+    sqs = sqs_generator.pmg_sqs(prim, clusters=cutoffs, scaling=total_atoms // len(prim), instances=instances,
+                                time_budget=budget, plateau_time=budget, poll_interval=min(5.0, budget / 10))
+    score = -np.inf if sqs.objective_function == "Perfect_match" else sqs.objective_function
+    return sqs.bestsqs, score, instances
+
+
+def make_engines():
+    """
+    Returns:
+        dict: name -> callable(comp, crystal, primitive structure, lattice parameter, total_atoms, cutoffs, budget,
+            seed) returning (structure, the engine's own score, cores used)
+    """
+    engines = {
+        "native": _native,
+        "corr": _smol("correlation", 1),
+        "cint": _smol("cluster-interaction", 1),
+        "parallel": _smol("correlation", os.cpu_count()),
+    }
+    if shutil.which("mcsqs") is None:
+        logging.debug("Skipping mcsqs, it is not on the PATH")
+    else:
+        engines["mcsqs"] = _mcsqs
+    return engines
+
+
+def random_error(comp, crystal, a, total_atoms, cutoffs, seed: int=0):
+    """Mean sqs_error of random decorations of the exact-size supercell, the error an SQS starts from"""
+    rng = su.decoration_rng(seed)
+    lattice, frac_coords = su.get_supercell(crystal, a, su.find_supercell_matrix(crystal, total_atoms), primitive=True)
+    fractions = list(comp.fractional_composition.get_el_amt_dict().values())
+    decorations = su.generate_random_decorations(su.apportion_atoms(fractions, total_atoms), N_RANDOM, rng)
+    elements = [str(el) for el in comp.fractional_composition.get_el_amt_dict()]
+    return float(np.mean([sqs_error(CompactStructure(lattice, frac_coords, decoration, elements), cutoffs, comp)
+                          for decoration in decorations]))
+
+
+def run_benchmark(alloys=ALLOYS, sizes=SIZES, crystals=CRYSTALS, engines=None, budgets=None, seed: int=0):
+    """
+    Run every engine at every budget over the alloys, crystals and sizes.
+
+    Returns:
+        list: one dict of results per (engine, alloy, crystal, size, budget)
+    """
+    all_engines = make_engines()
+    engines = {name: run for name, run in all_engines.items() if not engines or name in engines}
+    budgets = {**BUDGETS, **(budgets or {})}
+    results = []
+
+    for alloy in alloys:
+        comp = su.adjust_equiatomic_composition(Composition(alloy))
+        for crystal in crystals:
+            el = su.get_most_common_element(comp)
+            estimate = su.estimate_lattice_parameter_fcc if crystal == "fcc" else su.estimate_lattice_parameter_bcc
+            a = estimate(el.atomic_radius)
+            # silence the scaling factor prints
+            with contextlib.redirect_stdout(io.StringIO()):
+                prim, _ = su.create_disordered_structure(comp, crystal, lattice_parameter=a)
+            propose_cutoffs = su.propose_fcc_cutoffs if crystal == "fcc" else su.propose_bcc_cutoffs
+            cutoffs = propose_cutoffs(prim)
+
+            for total_atoms in sizes:
+                reference = random_error(comp, crystal, a, total_atoms, cutoffs, seed)
+                for name, run in engines.items():
+                    for budget in budgets[name]:
+                        start = time.perf_counter()
+                        try:
+                            with contextlib.redirect_stdout(io.StringIO()):
+                                structure, score, cores = run(comp, crystal, prim, a, total_atoms, cutoffs, budget, seed)
+                        except Exception as err:
+                            logging.warning(f"{name} failed for {alloy} {crystal} {total_atoms} at {budget}: {err}")
+                            continue
+                        wall = time.perf_counter() - start
+
+                        error = sqs_error(structure, cutoffs, comp)
+                        results.append({
+                            "engine": name, "alloy": alloy, "n_elements": len(comp), "crystal": crystal,
+                            "total_atoms": total_atoms, "budget": budget, "wall_s": wall, "cores": cores,
+                            "core_s": wall * cores, "score": float(score), "error": error, "random_error": reference,
+                            "quality_per_core_s": (reference - error) / (wall * cores),
+                        })
+                        logging.info(f"{name} {alloy} {crystal} {total_atoms} budget {budget}: error {error:.3g} "
+                                     f"(random {reference:.3g}) in {wall:.1f} s on {cores} cores")
+
+    return results
+
+
+def recommend(results, target_error: float):
+    """
+    Cheapest engine and budget that reaches the target error for each job.
+
+    Args:
+        results: results of run_benchmark
+        target_error: largest acceptable sqs_error
+
+    Returns:
+        dict: (n_elements, crystal, total_atoms) -> cheapest result by core-seconds, or None if no engine
+            reached the target
+    """
+    choices = {}
+    for result in results:
+        key = (result["n_elements"], result["crystal"], result["total_atoms"])
+        best = choices.get(key)
+        if result["error"] <= target_error and (best is None or result["core_s"] < best["core_s"]):
+            choices[key] = result
+        else:
+            choices.setdefault(key, None)
+    return choices
+
+
+def print_results(results, file=sys.stdout):
+    header = (f"{'engine':<9} {'alloy':<12} {'crystal':<7} {'atoms':>6} {'budget':>7} {'wall s':>8} {'cores':>5} "
+              f"{'error':>10} {'random':>10} {'gain/core-s':>12}")
+    print(header, file=file)
+    print('-' * len(header), file=file)
+    for result in results:
+        print(f"{result['engine']:<9} {result['alloy']:<12} {result['crystal']:<7} {result['total_atoms']:>6} "
+              f"{result['budget']:>7} {result['wall_s']:>8.2f} {result['cores']:>5} {result['error']:>10.3g} "
+              f"{result['random_error']:>10.3g} {result['quality_per_core_s']:>12.3g}", file=file)
+
+
+def print_recommendations(choices, target_error: float, file=sys.stdout):
+    print(f"\nCheapest engine reaching an error of {target_error:g}:", file=file)
+    for (n_elements, crystal, total_atoms), result in sorted(choices.items()):
+        choice = "none" if result is None else \
+            f"{result['engine']} at budget {result['budget']} ({result['core_s']:.1f} core-s, error {result['error']:.3g})"
+        print(f"  {n_elements} elements {crystal} {total_atoms} atoms: {choice}", file=file)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alloys", nargs="+", default=list(ALLOYS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--crystals", nargs="+", default=list(CRYSTALS), choices=CRYSTALS)
+    parser.add_argument("--engines", nargs="+", choices=list(BUDGETS), help="only run these engines")
+    parser.add_argument("--budgets", type=json.loads,
+                        help='budgets per engine as JSON, e.g. \'{"native": [20, 100], "mcsqs": [30]}\'')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--results", help="report on the JSON results of an earlier run instead of running")
+    parser.add_argument("--target-error", type=float, default=1e-3,
+                        help="recommend the cheapest engine and budget reaching this error")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s', level=logging.INFO)
+    args = parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            results = json.load(f)
+    else:
+        results = run_benchmark(args.alloys, args.sizes, args.crystals, args.engines, args.budgets, args.seed)
+    print_results(results)
+    print_recommendations(recommend(results, args.target_error), args.target_error)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,250 @@
+"""
+Offline benchmark of the structure generation paths.
+
+Times every path over compositions with 2-8 elements and supercells of 32-2000 atoms, and reports the time
+per structure, the memory still allocated after a call, the number of memory blocks it allocated and the peak
+traced memory.  Cases that raise are recorded with their error instead of timings.  Results can be written to
+JSON and compared against an earlier run to catch regressions:
+
+    python benchmark_structure_generation.py --output baseline.json
+    python benchmark_structure_generation.py --baseline baseline.json
+"""
+from pymatgen.core.composition import Composition
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import structure_utils as su
+from compact_structure import CompactStructure
+from POSCAR_generator import generate_poscar_files
+
+
+# element pool, the first n elements make the n-component alloy
+ELEMENTS = ("Co", "Cr", "Fe", "Ni", "Mn", "Cu", "Al", "Ti")
+
+SIZES = (32, 108, 256, 500, 864, 2000)
+
+CRYSTALS = ("fcc", "bcc")
+
+# number of random decorations built per call of the decoration path
+N_DECORATIONS = 16
+
+
+def make_alloys(min_elements: int=2, max_elements: int=8):
+    """
+    One equiatomic and one non-equiatomic alloy string for each number of elements.
+
+    Returns:
+        list: alloy strings, e.g. 'CoCr' and 'Co0.5Cr'
+    """
+    alloys = []
+    for n in range(min_elements, max_elements + 1):
+        elements = ELEMENTS[:n]
+        alloys.append(''.join(elements))
+        alloys.append(f"{elements[0]}0.5{''.join(elements[1:])}")
+    return alloys
+
+
+def random_decorations(comp: Composition, crystal: str, total_atoms: int, rng: np.random.Generator):
+    # the vectorized random path: exact-size supercell, apportioned counts, a batch of decorations
+    matrix = su.find_supercell_matrix(crystal, total_atoms)
+    lattice, frac_coords = su.get_supercell(crystal, 3.6, matrix, primitive=True)
+    fractions = list(comp.fractional_composition.get_el_amt_dict().values())
+    counts = su.apportion_atoms(fractions, len(frac_coords))
+    decorations = su.generate_random_decorations(counts, N_DECORATIONS, rng)
+    template = CompactStructure(lattice, frac_coords, decorations[0], [str(el) for el in comp.elements])
+    return [template.with_species(decoration).to_pymatgen() for decoration in decorations]
+
+
+def make_cases(alloy: str, crystal: str, total_atoms: int, rng: np.random.Generator):
+    """
+    Benchmark cases for one alloy, crystal and supercell size.
+
+    Returns:
+        dict: name -> (callable, number of structures made per call, depends on total_atoms)
+    """
+    comp = su.adjust_equiatomic_composition(Composition(alloy))
+
+    cases = {
+        "adjust_equiatomic_composition": (lambda: su.adjust_equiatomic_composition(Composition(alloy)), 1, False),
+        "create_disordered_structure": (lambda: su.create_disordered_structure(comp, crystal, total_atoms=total_atoms), 1, True),
+        "create_random_supercell_structure": (lambda: su.create_random_supercell_structure(comp, crystal, total_atoms, rng=rng), 1, True),
+        "random_decorations": (lambda: random_decorations(comp, crystal, total_atoms, rng), N_DECORATIONS, True),
+        "generate_poscar_files": (lambda: generate_poscar_files(alloy, crystal.upper(), total_atoms=total_atoms, rng=rng), 1, True),
+    }
+
+    try:
+        import random_structure
+    except ImportError as err:
+        logging.debug(f"Skipping the pyxtal random structure path: {err}")
+    else:
+        cases["random_structure"] = (lambda: random_structure.random_structure(alloy, crystal.upper()), 1, False)
+
+    return cases
+
+
+def measure(func, repeats: int=3):
+    """
+    Time a callable and trace its memory.
+
+    The callable is run once to fill the caches, then timed without tracing, then run once more under
+    tracemalloc so tracing does not distort the timings.
+
+    Returns:
+        dict: best and mean seconds per call, KiB still allocated after the call, number of memory blocks still
+        allocated after the call, peak KiB during the call
+    """
+    func()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        snapshot_before = tracemalloc.take_snapshot()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        after, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    allocations = sum(stat.count_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename'))
+
+    return {
+        "best_s": min(times),
+        "mean_s": sum(times) / len(times),
+        "retained_kib": (after - before) / 1024,
+        "allocations": allocations,
+        "peak_kib": (peak - before) / 1024,
+    }
+
+
+def run_benchmark(alloys, sizes=SIZES, crystals=CRYSTALS, cases=None, repeats: int=3, seed: int=0):
+    """
+    Run every case over the alloys, crystals and sizes.
+
+    Cases that do not depend on the supercell size are only run for the first size.  A case that raises is
+    recorded with its error, so a failure shows up in the results and in the baseline comparison.
+
+    Returns:
+        list: one dict of results per (case, alloy, crystal, size)
+    """
+    rng = su.decoration_rng(seed)
+    results = []
+
+    # silence the prints of the scaling factor helpers
+    with contextlib.redirect_stdout(io.StringIO()):
+        for alloy in alloys:
+            for crystal in crystals:
+                for n, total_atoms in enumerate(sizes):
+                    for name, (func, per_call, sized) in make_cases(alloy, crystal, total_atoms, rng).items():
+                        if cases and name not in cases:
+                            continue
+                        if not sized and n > 0:
+                            continue
+
+                        result = {"case": name, "alloy": alloy, "n_elements": len(Composition(alloy)),
+                                  "crystal": crystal, "total_atoms": total_atoms if sized else None}
+                        try:
+                            timing = measure(func, repeats)
+                        except Exception as err:
+                            logging.error(f"{name} failed for {alloy} {crystal} {total_atoms}: {err!r}")
+                            results.append({**result, "error": repr(err)})
+                            continue
+                        timing["per_structure_s"] = timing["best_s"] / per_call
+                        results.append({**result, **timing})
+                        logging.info(f"{name} {alloy} {crystal} {total_atoms if sized else '-'}: "
+                                     f"{1e3 * timing['per_structure_s']:.3f} ms")
+
+    return results
+
+
+def _result_key(result):
+    return result["case"], result["alloy"], result["crystal"], result["total_atoms"]
+
+
+def compare_to_baseline(results, baseline, tolerance: float=1.5):
+    """
+    Find the cases that got slower than tolerance times the baseline, or that fail but did not fail in the baseline.
+
+    Returns:
+        list: (result, baseline result) pairs of the regressions
+    """
+    previous = {_result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(_result_key(result))
+        if old is None or "error" in old:
+            continue
+        if "error" in result or result["per_structure_s"] > tolerance * old["per_structure_s"]:
+            regressions.append((result, old))
+    return regressions
+
+
+def print_results(results, file=sys.stdout):
+    header = (f"{'case':<34} {'alloy':<22} {'crystal':<7} {'atoms':>6} {'ms/structure':>13} {'retained KiB':>13} "
+              f"{'allocations':>12} {'peak KiB':>10}")
+    print(header, file=file)
+    print('-' * len(header), file=file)
+    for result in results:
+        atoms = '-' if result["total_atoms"] is None else result["total_atoms"]
+        row = f"{result['case']:<34} {result['alloy']:<22} {result['crystal']:<7} {atoms:>6} "
+        if "error" in result:
+            print(row + f"failed: {result['error']}", file=file)
+            continue
+        print(row + f"{1e3 * result['per_structure_s']:>13.3f} {result['retained_kib']:>13.1f} "
+              f"{result['allocations']:>12} {result['peak_kib']:>10.1f}", file=file)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-elements", type=int, default=2)
+    parser.add_argument("--max-elements", type=int, default=8)
+    parser.add_argument("--alloys", nargs="+", help="alloy strings, instead of the generated 2-8 element alloys")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--crystals", nargs="+", default=list(CRYSTALS), choices=CRYSTALS)
+    parser.add_argument("--cases", nargs="+", help="only run these cases")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="report a regression when a case is this many times slower than the baseline")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s', level=logging.INFO)
+    args = parse_args()
+
+    alloys = args.alloys or make_alloys(args.min_elements, args.max_elements)
+    results = run_benchmark(alloys, args.sizes, args.crystals, args.cases, args.repeats, args.seed)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for result, old in regressions:
+            now = result['error'] if "error" in result else f"{1e3 * result['per_structure_s']:.3f} ms"
+            logging.warning(f"Regression in {result['case']} {result['alloy']} {result['crystal']} {result['total_atoms']}: "
+                            f"{now} vs {1e3 * old['per_structure_s']:.3f} ms")
+        sys.exit(1 if regressions else 0)
+
+    sys.exit(1 if any("error" in result for result in results) else 0)
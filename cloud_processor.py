@@ -12,7 +12,7 @@ from gcp_utils import bq
 from gcp_utils.utils import tznow, duck_str, timing
 
 
-from POSCAR_generator import generate_poscar_files, write_vasp
+from POSCAR_generator import generate_poscar_files
 from energy_calculation import calculate_energy
 
 # input message
@@ -40,9 +40,9 @@ def process_message(message):
     alloy = message.alloy
     crystal = message.crystal 
 
-    unrelaxed_poscar_data, mol_fractions = generate_poscar_files(alloy, crystal)
-    unrelaxed_vasp_file = write_vasp(unrelaxed_poscar_data, f'vasp_files_temp/{alloy}_{crystal}.vasp')
-    energy, relaxed_poscar_data = calculate_energy(unrelaxed_vasp_file, relaxation=message.do_relaxation)
+    # the structure goes straight to the energy calculation, no POSCAR file is written and parsed back
+    unrelaxed_poscar_data, mol_fractions, structure = generate_poscar_files(alloy, crystal, return_structure=True)
+    energy, relaxed_poscar_data = calculate_energy(structure, relaxation=message.do_relaxation)
 
     if message.do_relaxation:
         poscar_data = relaxed_poscar_data
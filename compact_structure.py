@@ -0,0 +1,158 @@
+import numpy as np
+
+
+class CompactStructure:
+    """
+    Lightweight array-backed periodic structure used on the hot path.
+
+    A structure is a 3x3 lattice (rows are the lattice vectors), an (n, 3) array of fractional coordinates
+    and a uint8 array of species indices into a small element table.  Decorations of the same supercell
+    share the lattice and coordinate arrays, only the species array differs.
+
+    Converters hand the arrays straight to pymatgen, jarvis and ase without going through POSCAR text.
+    """
+
+    __slots__ = ("lattice", "frac_coords", "species", "elements")
+
+    def __init__(self, lattice, frac_coords, species, elements):
+        """
+        Args:
+            lattice: 3x3 lattice matrix, rows are the lattice vectors
+            frac_coords: (n, 3) fractional coordinates
+            species: (n,) species index of each site into elements
+            elements: element symbol for each species index
+        """
+        self.lattice = np.asarray(lattice, dtype=float).reshape(3, 3)
+        self.frac_coords = np.asarray(frac_coords, dtype=float).reshape(-1, 3)
+        self.species = np.asarray(species, dtype=np.uint8)
+        self.elements = tuple(elements)
+
+        assert len(self.species) == len(self.frac_coords), \
+            f"{len(self.species)} species for {len(self.frac_coords)} sites"
+
+    def __len__(self):
+        return len(self.species)
+
+    def __repr__(self):
+        return f"CompactStructure({self.formula}, {len(self)} sites)"
+
+    @property
+    def num_sites(self):
+        return len(self.species)
+
+    @property
+    def symbols(self):
+        """Element symbol of every site"""
+        return np.asarray(self.elements, dtype=object)[self.species]
+
+    @property
+    def cart_coords(self):
+        return self.frac_coords @ self.lattice
+
+    @property
+    def volume(self):
+        return abs(np.linalg.det(self.lattice))
+
+    @property
+    def counts(self):
+        """Number of atoms of each element, in element table order"""
+        return np.bincount(self.species, minlength=len(self.elements))
+
+    @property
+    def formula(self):
+        return ''.join(f"{el}{n}" for el, n in zip(self.elements, self.counts) if n)
+
+    def with_species(self, species, elements=None):
+        """
+        New structure on the same lattice and coordinates (shared, not copied) with a different decoration.
+
+        Args:
+            species: (n,) species indices
+            elements: element table, defaults to this structure's table
+
+        Returns:
+            CompactStructure
+        """
+        return CompactStructure(self.lattice, self.frac_coords, species,
+                                self.elements if elements is None else elements)
+
+    def scaled(self, factor: float):
+        """New structure with the lattice scaled by factor, sharing coordinates and species"""
+        return CompactStructure(self.lattice * factor, self.frac_coords, self.species, self.elements)
+
+    # ---- constructors -----
+
+    @classmethod
+    def from_symbols(cls, lattice, frac_coords, symbols):
+        """Build from a per-site list of element symbols"""
+        elements, species = np.unique(np.asarray(symbols, dtype=str), return_inverse=True)
+        return cls(lattice, frac_coords, species, elements.tolist())
+
+    @classmethod
+    def from_pymatgen(cls, structure):
+        """
+        Args:
+            structure: ordered pymatgen Structure
+
+        Returns:
+            CompactStructure
+        """
+        if not structure.is_ordered:
+            raise ValueError("CompactStructure only represents ordered structures")
+        return cls.from_symbols(structure.lattice.matrix, structure.frac_coords,
+                                [site.specie.symbol for site in structure])
+
+    @classmethod
+    def from_jarvis(cls, atoms):
+        """
+        Args:
+            atoms: jarvis Atoms
+
+        Returns:
+            CompactStructure
+        """
+        return cls.from_symbols(atoms.lattice_mat, atoms.frac_coords, atoms.elements)
+
+    @classmethod
+    def from_ase(cls, atoms):
+        """
+        Args:
+            atoms: ase Atoms
+
+        Returns:
+            CompactStructure
+        """
+        return cls.from_symbols(atoms.cell.array, atoms.get_scaled_positions(wrap=False),
+                                atoms.get_chemical_symbols())
+
+    # ---- converters -----
+
+    def to_pymatgen(self):
+        """
+        Returns:
+            pymatgen Structure
+        """
+        from pymatgen.core.lattice import Lattice
+        from pymatgen.core.structure import Structure
+
+        return Structure(Lattice(self.lattice), list(self.symbols), self.frac_coords)
+
+    def to_jarvis(self):
+        """
+        Returns:
+            jarvis Atoms
+        """
+        from jarvis.core.atoms import Atoms as JarvisAtoms
+
+        return JarvisAtoms(lattice_mat=self.lattice, coords=self.frac_coords,
+                           elements=list(self.symbols), cartesian=False)
+
+    def to_ase(self):
+        """
+        Returns:
+            ase Atoms
+        """
+        from ase import Atoms as ASEAtoms
+
+        return ASEAtoms(symbols=list(self.symbols), scaled_positions=self.frac_coords,
+                        cell=self.lattice, pbc=True)
@@ -0,0 +1,210 @@
+from pymatgen.core.structure import Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+import functools
+import itertools
+import logging
+import math
+import numpy as np
+
+from compact_structure import CompactStructure
+from structure_utils import apportion_atoms, lattice_points_in_supercell
+
+
+# enumeration scans every decoration (about 5e5 per second), so keep it to cells where their number stays
+# manageable: 16-site binaries have 12870, 12-site equiatomic ternaries 34650, 24-site ones 9.4e9
+MAX_DECORATIONS = 10**7
+
+
+def make_supercell_arrays(structure: Structure, supercell_matrix):
+    """
+    Lattice and site positions of a supercell of a (possibly disordered) parent structure.
+
+    Args:
+        structure: parent structure, e.g. the primitive structure from create_disordered_structure
+        supercell_matrix: (nx, ny, nz) scaling factors or a 3x3 integer matrix relative to the parent cell
+
+    Returns:
+        tuple: (3x3 lattice matrix, (n_sites, 3) fractional coordinates)
+    """
+    matrix = np.array(supercell_matrix, dtype=float)
+    if matrix.ndim == 1:
+        matrix = np.diag(matrix)
+
+    points = lattice_points_in_supercell(matrix)
+    basis = structure.frac_coords @ np.linalg.inv(matrix)
+    frac_coords = (basis[:, None, :] + points[None, :, :]).reshape(-1, 3) % 1.0
+
+    return matrix @ structure.lattice.matrix, frac_coords
+
+
+def site_permutations(lattice, frac_coords, symprec: float=1e-3):
+    """
+    Permutations of the supercell sites generated by the space group of the undecorated supercell.
+
+    These are the parent lattice operations that map the supercell onto itself, including the pure
+    translations by parent lattice vectors, so decorations that only differ by a translation are recognised
+    as equivalent too.
+
+    Args:
+        lattice: 3x3 lattice matrix of the supercell
+        frac_coords: (n_sites, 3) fractional coordinates
+        symprec: symmetry tolerance passed to spglib
+
+    Returns:
+        np.ndarray: (n_operations, n_sites) array, row g maps site i onto site permutations[g, i]
+    """
+    frac_coords = np.asarray(frac_coords, dtype=float)
+    parent = Structure(lattice, ["Cu"] * len(frac_coords), frac_coords)
+    operations = SpacegroupAnalyzer(parent, symprec=symprec).get_symmetry_operations()
+
+    permutations = []
+    for operation in operations:
+        moved = operation.operate_multi(frac_coords)
+        difference = moved[:, None, :] - frac_coords[None, :, :]
+        difference -= np.round(difference)
+        permutations.append(np.argmin(np.linalg.norm(difference @ lattice, axis=2), axis=1))
+
+    permutations = np.unique(np.array(permutations), axis=0)
+    assert np.all(np.sort(permutations, axis=1) == np.arange(len(frac_coords))), "symmetry operations do not map sites onto sites"
+
+    return permutations
+
+
+@functools.lru_cache(maxsize=8)
+def _all_decorations(counts: tuple, species: tuple):
+    # every arrangement of the multiset of species over sum(counts) slots, built vectorized.  Cached (read-only)
+    # for the few sub-multisets a block stream reuses.
+    n_slots = sum(counts)
+    if len(counts) == 1:
+        decorations = np.full((1, n_slots), species[0], dtype=np.uint8)
+        decorations.setflags(write=False)
+        return decorations
+
+    rest = _all_decorations(counts[1:], species[1:])
+    combinations = np.array(list(itertools.combinations(range(n_slots), counts[0])), dtype=int).reshape(-1, counts[0])
+    decorations = np.empty((len(combinations), len(rest), n_slots), dtype=np.uint8)
+    for n, chosen in enumerate(combinations):
+        others = np.setdiff1d(np.arange(n_slots), chosen)
+        decorations[n][:, chosen] = species[0]
+        decorations[n][:, others] = rest
+    decorations = decorations.reshape(-1, n_slots)
+    decorations.setflags(write=False)
+    return decorations
+
+
+def _count_decorations(counts):
+    # multinomial coefficient: number of distinct arrangements of the multiset
+    return math.factorial(sum(counts)) // math.prod(math.factorial(c) for c in counts)
+
+
+def _decoration_blocks(counts, species, block_size: int):
+    # stream the decorations in blocks: loop over placements of the first species, vectorize the rest
+    n_slots = sum(counts)
+    if _count_decorations(counts[1:]) > block_size and len(counts) > 2:
+        # the remaining species alone are too many, split them further
+        for chosen in itertools.combinations(range(n_slots), counts[0]):
+            others = np.setdiff1d(np.arange(n_slots), chosen)
+            for block in _decoration_blocks(counts[1:], species[1:], block_size):
+                out = np.empty((len(block), n_slots), dtype=np.uint8)
+                out[:, list(chosen)] = species[0]
+                out[:, others] = block
+                yield out
+        return
+
+    rest = _all_decorations(tuple(counts[1:]), tuple(species[1:]))
+    buffer = []
+    buffered = 0
+    for chosen in itertools.combinations(range(n_slots), counts[0]):
+        out = np.empty((len(rest), n_slots), dtype=np.uint8)
+        out[:, list(chosen)] = species[0]
+        out[:, np.setdiff1d(np.arange(n_slots), chosen)] = rest
+        buffer.append(out)
+        buffered += len(out)
+        if buffered >= block_size:
+            yield np.concatenate(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield np.concatenate(buffer)
+
+
+def distinct_decorations(counts, permutations, block_size: int=4096):
+    """
+    Stream the symmetrically distinct decorations of a set of sites.
+
+    A decoration is kept only if it is the lexicographically smallest member of its orbit under the site
+    permutations, so exactly one representative of each orbit survives and no set of seen decorations has
+    to be stored.
+
+    Args:
+        counts: number of atoms of each species
+        permutations: site permutations from site_permutations
+        block_size: number of decorations checked at once
+
+    Yields:
+        tuple: ((n_distinct, n_sites) uint8 species arrays, (n_distinct,) orbit size of each decoration)
+    """
+    counts = [int(c) for c in counts]
+    species = [s for s, c in enumerate(counts) if c > 0]
+    counts = [c for c in counts if c > 0]
+
+    # loop over the placements of the least abundant species, vectorize over the others
+    order = np.argsort(counts, kind="stable")
+    counts = [counts[n] for n in order]
+    species = [species[n] for n in order]
+
+    n_operations = len(permutations)
+    for block in _decoration_blocks(counts, species, block_size):
+        images = block[:, permutations]
+        different = images != block[:, None, :]
+        first = np.argmax(different, axis=2)
+        image_values = np.take_along_axis(images, first[:, :, None], axis=2)[:, :, 0]
+        block_values = np.take_along_axis(block, first, axis=1)
+        smaller_image = different.any(axis=2) & (image_values < block_values)
+
+        canonical = ~smaller_image.any(axis=1)
+        if canonical.any():
+            stabilizer = (~different.any(axis=2))[canonical].sum(axis=1)
+            yield block[canonical], n_operations // stabilizer
+
+
+def enumerate_distinct_structures(structure: Structure, supercell_matrix, total_counts=None, symprec: float=1e-3,
+                                  max_decorations: int=MAX_DECORATIONS):
+    """
+    Lazily enumerate the symmetrically distinct decorations of a small supercell of a disordered structure.
+
+    Args:
+        structure: disordered parent structure, e.g. the primitive structure from create_disordered_structure
+        supercell_matrix: (nx, ny, nz) or 3x3 integer matrix relative to the parent cell, see
+            structure_utils.find_supercell_matrix for exact site counts
+        total_counts: number of atoms of each element (in the order of the parent site composition),
+            apportioned from the site occupancies if not given
+        symprec: symmetry tolerance
+        max_decorations: largest number of decorations (before symmetry reduction) to scan
+
+    Raises:
+        ValueError: if the cell has more than max_decorations decorations
+
+    Yields:
+        tuple: (CompactStructure, orbit size).  All structures share the same lattice and coordinate arrays.
+    """
+    lattice, frac_coords = make_supercell_arrays(structure, supercell_matrix)
+    n_sites = len(frac_coords)
+
+    occupancy = structure[0].species.get_el_amt_dict()
+    elements = list(occupancy.keys())
+    if total_counts is None:
+        total_counts = apportion_atoms(list(occupancy.values()), n_sites)
+
+    n_decorations = _count_decorations([int(c) for c in total_counts])
+    if n_decorations > max_decorations:
+        raise ValueError(f"{dict(zip(elements, total_counts))} on {n_sites} sites has {n_decorations:.3g} decorations, "
+                         f"too many to enumerate exhaustively (max {max_decorations:.3g}); use a smaller cell or an SQS")
+
+    permutations = site_permutations(lattice, frac_coords, symprec)
+    logging.debug(f"Enumerating {dict(zip(elements, total_counts))} on {n_sites} sites with {len(permutations)} operations")
+
+    template = CompactStructure(lattice, frac_coords, np.zeros(n_sites, dtype=np.uint8), elements)
+    for decorations, multiplicities in distinct_decorations(total_counts, permutations):
+        for decoration, multiplicity in zip(decorations, multiplicities):
+            yield template.with_species(decoration), int(multiplicity)
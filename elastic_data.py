@@ -0,0 +1,165 @@
+import functools
+import logging
+
+import numpy as np
+from ase import units
+from ase.io import read as ASEread
+
+from alignn.ff.ff import AlignnAtomwiseCalculator, alignnff_fmult
+
+
+# choose alignn-ff model
+
+#model_path=wt10_path()
+model_path=alignnff_fmult()
+
+# default strain magnitude applied to each Voigt component
+DEFAULT_STRAIN = 0.01
+
+# Voigt index -> pair of cartesian indices (xx, yy, zz, yz, xz, xy)
+VOIGT_PAIRS = [(0, 0), (1, 1), (2, 2), (1, 2), (0, 2), (0, 1)]
+
+
+@functools.cache
+def get_calculator():
+    """
+    Load the alignn-ff model once and share the calculator between every strained cell.
+
+    Returns:
+      AlignnAtomwiseCalculator (ase calculator)
+    """
+    return AlignnAtomwiseCalculator(path=model_path)
+
+
+def voigt_strain_matrix(component, delta):
+    """
+    Build the symmetric strain tensor for a single Voigt component.
+
+    Shear components (3, 4, 5) are engineering strains, so the tensor entries are delta/2.
+
+    Args:
+        component (int): Voigt index 0-5
+        delta (float): strain magnitude
+
+    Returns:
+        np.ndarray: 3x3 strain tensor
+    """
+    i, j = VOIGT_PAIRS[component]
+    strain = np.zeros((3, 3))
+    if i == j:
+        strain[i, j] = delta
+    else:
+        strain[i, j] = strain[j, i] = delta / 2
+    return strain
+
+
+def make_strained_cells(atoms, delta=DEFAULT_STRAIN):
+    """
+    Apply the standard +/- delta strain set to each of the six Voigt components.
+
+    Args:
+        atoms: relaxed ase atoms object
+        delta (float): strain magnitude
+
+    Returns:
+        list of 12 ase atoms objects ordered (+delta, -delta) for Voigt components 0-5
+    """
+    cell = np.array(atoms.get_cell())
+    strained = []
+    for component in range(6):
+        for sign in (1, -1):
+            deformation = np.eye(3) + voigt_strain_matrix(component, sign * delta)
+            strained_atoms = atoms.copy()
+            strained_atoms.set_cell(cell @ deformation, scale_atoms=True)
+            strained.append(strained_atoms)
+    return strained
+
+
+def batch_stresses(atoms_list, calculator=None):
+    """
+    Evaluate the stress of every cell in one pass with a single loaded force field.
+
+    Args:
+        atoms_list: list of ase atoms objects
+        calculator: ase calculator, defaults to the shared alignn-ff calculator
+
+    Returns:
+        np.ndarray: (n_cells, 6) Voigt stresses in eV/A^3
+    """
+    calculator = calculator or get_calculator()
+    stresses = np.empty((len(atoms_list), 6))
+    for n, atoms in enumerate(atoms_list):
+        calculator.calculate(atoms, properties=["stress"])
+        stresses[n] = calculator.results["stress"]
+    return stresses
+
+
+def elastic_tensor(stresses, delta=DEFAULT_STRAIN):
+    """
+    Central-difference elastic constants from the stresses of the +/- delta strain set.
+
+    Args:
+        stresses (np.ndarray): (12, 6) stresses ordered as returned by make_strained_cells
+        delta (float): strain magnitude used to build the cells
+
+    Returns:
+        np.ndarray: 6x6 symmetrised Cij tensor in GPa
+    """
+    stresses = np.asarray(stresses).reshape(6, 2, 6)
+    # column j of Cij is d(sigma)/d(epsilon_j)
+    cij = ((stresses[:, 0, :] - stresses[:, 1, :]) / (2 * delta)).T
+    cij = 0.5 * (cij + cij.T)
+    return cij / units.GPa
+
+
+def elastic_moduli(cij):
+    """
+    Voigt-Reuss-Hill bulk and shear moduli of an elastic tensor.
+
+    Args:
+        cij (np.ndarray): 6x6 elastic tensor
+
+    Returns:
+        dict: bulk and shear moduli (Voigt, Reuss and Hill averages) in the units of cij
+    """
+    c = np.asarray(cij)
+    s = np.linalg.inv(c)
+
+    bulk_voigt = (c[0, 0] + c[1, 1] + c[2, 2] + 2 * (c[0, 1] + c[1, 2] + c[0, 2])) / 9
+    shear_voigt = (c[0, 0] + c[1, 1] + c[2, 2] - (c[0, 1] + c[1, 2] + c[0, 2])
+                   + 3 * (c[3, 3] + c[4, 4] + c[5, 5])) / 15
+    bulk_reuss = 1 / (s[0, 0] + s[1, 1] + s[2, 2] + 2 * (s[0, 1] + s[1, 2] + s[0, 2]))
+    shear_reuss = 15 / (4 * (s[0, 0] + s[1, 1] + s[2, 2]) - 4 * (s[0, 1] + s[1, 2] + s[0, 2])
+                        + 3 * (s[3, 3] + s[4, 4] + s[5, 5]))
+
+    return {
+        'bulk_voigt': bulk_voigt,
+        'bulk_reuss': bulk_reuss,
+        'bulk_modulus': (bulk_voigt + bulk_reuss) / 2,
+        'shear_voigt': shear_voigt,
+        'shear_reuss': shear_reuss,
+        'shear_modulus': (shear_voigt + shear_reuss) / 2,
+    }
+
+
+def elastic_data(atoms, delta=DEFAULT_STRAIN, calculator=None):
+    """
+    Calculate the elastic constants of a relaxed cell
+
+    inputs: atoms (ase atoms object or POSCAR file path), delta (float)
+
+    returns: elastic_data (dict) with the Cij tensor and bulk/shear moduli in GPa
+    """
+    if isinstance(atoms, str):
+        atoms = ASEread(atoms)
+
+    strained = make_strained_cells(atoms, delta)
+    logging.debug(f"Evaluating {len(strained)} strained cells for {atoms.get_chemical_formula()}")
+
+    stresses = batch_stresses(strained, calculator)
+    cij = elastic_tensor(stresses, delta)
+
+    elastic_data = {'cij': cij}
+    elastic_data.update(elastic_moduli(cij))
+
+    return elastic_data
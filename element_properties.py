@@ -0,0 +1,113 @@
+from pymatgen.core.periodic_table import Element
+
+import functools
+import warnings
+import numpy as np
+
+from alloy_mol_fractions import find_mole_fractions
+
+
+# largest atomic number in the table
+MAX_Z = 118
+
+PROPERTIES = ("atomic_radius", "metallic_radius", "atomic_mass", "vec", "electronegativity", "melting_point")
+
+
+def _valence_electron_concentration(element: Element):
+    # s + d electrons for the s/d blocks (Fe 8, Cu 11), s + p electrons for the p block (Al 3, Si 4)
+    group = element.group
+    return group - 10 if group > 12 else group
+
+
+def _to_float(value):
+    return np.nan if value is None else float(value)
+
+
+@functools.cache
+def get_element_table():
+    """
+    Build the in-memory table of element properties once, indexed by atomic number.
+
+    Missing values (e.g. metallic radius of non-metals) are NaN.
+
+    Returns:
+        dict: property name -> read-only (MAX_Z + 1,) float array, plus "symbol" -> array of element symbols
+    """
+    table = {name: np.full(MAX_Z + 1, np.nan) for name in PROPERTIES}
+    symbols = np.full(MAX_Z + 1, "", dtype=object)
+
+    # pymatgen warns for every missing property (e.g. no electronegativity of the noble gases), those are NaN here
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for z in range(1, MAX_Z + 1):
+            element = Element.from_Z(z)
+            symbols[z] = element.symbol
+            table["atomic_radius"][z] = _to_float(element.atomic_radius)
+            table["metallic_radius"][z] = _to_float(element.metallic_radius)
+            table["atomic_mass"][z] = _to_float(element.atomic_mass)
+            table["vec"][z] = _valence_electron_concentration(element)
+            table["electronegativity"][z] = _to_float(element.X)
+            table["melting_point"][z] = _to_float(element.melting_point)
+
+    table["symbol"] = symbols
+    for values in table.values():
+        values.setflags(write=False)
+
+    return table
+
+
+@functools.cache
+def _symbol_to_z():
+    return {symbol: z for z, symbol in enumerate(get_element_table()["symbol"]) if symbol}
+
+
+def element_indices(elements):
+    """
+    Args:
+        elements: element symbols
+
+    Returns:
+        np.ndarray: atomic number of each element
+    """
+    symbol_to_z = _symbol_to_z()
+    return np.array([symbol_to_z[str(el)] for el in elements], dtype=int)
+
+
+def element_property(name: str, elements):
+    """
+    Look up one property for a list of elements.
+
+    Args:
+        name: one of PROPERTIES
+        elements: element symbols
+
+    Returns:
+        np.ndarray: property value of each element
+    """
+    return get_element_table()[name][element_indices(elements)]
+
+
+def fraction_matrix(compositions, elements=None):
+    """
+    Build an (n_compositions, n_elements) matrix of atomic fractions.
+
+    Args:
+        compositions: alloy strings (parsed with find_mole_fractions) or dicts of element -> amount
+        elements: column order, defaults to every element that appears, in order of first appearance
+
+    Returns:
+        tuple: (np.ndarray of normalized fractions, list of element symbols for the columns)
+    """
+    parsed = [find_mole_fractions(comp) if isinstance(comp, str) else comp for comp in compositions]
+
+    if elements is None:
+        elements = list(dict.fromkeys(el for comp in parsed for el in comp))
+    column = {el: n for n, el in enumerate(elements)}
+
+    fractions = np.zeros((len(parsed), len(elements)))
+    for row, comp in enumerate(parsed):
+        for el, amt in comp.items():
+            fractions[row, column[str(el)]] = amt
+
+    fractions /= fractions.sum(axis=1, keepdims=True)
+    return fractions, list(elements)
@@ -6,6 +6,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 from ase.io import vasp
 
+from compact_structure import CompactStructure
+from POSCAR_generator import poscar_lines
+from poscar_reader import read_poscar
+
 
 #alignn setup
 from alignn.ff.ff import AlignnAtomwiseCalculator,default_path,wt10_path,alignnff_fmult,fd_path,ForceField
@@ -17,10 +21,14 @@ calc = AlignnAtomwiseCalculator(path=model_path)
 # ALIGNN CALCS
 
 def make_atoms_object(filepath, mode='jarvis'):
+    # parse the POSCAR straight into arrays and convert, instead of going through the jarvis / ase readers
+    structure = read_poscar(filepath)
     if mode == 'jarvis':
-        atoms = JarvisAtoms.from_poscar(filename=filepath)
+        atoms = structure.to_jarvis()
     elif mode == 'ase':
-        atoms = ASEread(filename=filepath)
+        atoms = structure.to_ase()
+    elif mode == 'compact':
+        atoms = structure
     return atoms
 
 
@@ -89,18 +97,30 @@ def energy_per_atom(atoms):
 
 
 def calculate_energy(filepath, relaxation=False):
+    '''
+    Calculates the energy per atom of a structure, optionally after relaxing it
+
+    Inputs:
+      filepath: POSCAR file, or a CompactStructure used directly without going through POSCAR text
+      relaxation: relax the lattice first (bool)
 
-    atoms = make_atoms_object(filepath)
+    Returns:
+      energy: energy per atom (float)
+      vasp_data: POSCAR lines of the relaxed structure, None without relaxation
+    '''
+
+    if isinstance(filepath, CompactStructure):
+        atoms = filepath.to_jarvis()
+    else:
+        atoms = make_atoms_object(filepath)
     energy = 0
     vasp_data = None
 
     if relaxation:
         relaxed_atoms=optimize_lattice(atoms)
         energy = energy_per_atom(relaxed_atoms)
-        temp_filename = 'vasp_files_temp/relaxed_lattice.vasp'
-        JarvisAtoms.write_poscar(relaxed_atoms, filename=temp_filename)
-        with open(temp_filename, 'r') as file:
-            vasp_data = file.readlines()
+        # render the relaxed POSCAR in memory instead of writing and reading back a temporary file
+        vasp_data = poscar_lines(CompactStructure.from_jarvis(relaxed_atoms))
 
     else:
         energy = energy_per_atom(atoms)
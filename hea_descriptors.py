@@ -0,0 +1,242 @@
+import functools
+import numpy as np
+
+from element_properties import element_property, fraction_matrix
+
+
+# gas constant in J/(mol K)
+GAS_CONSTANT = 8.314462618
+
+# Miedema binary mixing enthalpies (kJ/mol) of equiatomic liquid alloys,
+# Takeuchi & Inoue, Materials Transactions 46 (2005) 2817.  Pairs that are not listed are treated as unknown.
+MIXING_ENTHALPY = {
+    ("Al", "Co"): -19, ("Al", "Cr"): -10, ("Al", "Cu"): -1, ("Al", "Fe"): -11, ("Al", "Hf"): -39,
+    ("Al", "Mn"): -19, ("Al", "Mo"): -5, ("Al", "Nb"): -18, ("Al", "Ni"): -22, ("Al", "Ta"): -19,
+    ("Al", "Ti"): -30, ("Al", "V"): -16, ("Al", "W"): -2, ("Al", "Zr"): -44,
+    ("Co", "Cr"): -4, ("Co", "Cu"): 6, ("Co", "Fe"): -1, ("Co", "Hf"): -35, ("Co", "Mn"): -5,
+    ("Co", "Mo"): -5, ("Co", "Nb"): -25, ("Co", "Ni"): 0, ("Co", "Ta"): -24, ("Co", "Ti"): -28,
+    ("Co", "V"): -14, ("Co", "W"): -1, ("Co", "Zr"): -41,
+    ("Cr", "Cu"): 12, ("Cr", "Fe"): -1, ("Cr", "Hf"): -9, ("Cr", "Mn"): 2, ("Cr", "Mo"): 0,
+    ("Cr", "Nb"): -7, ("Cr", "Ni"): -7, ("Cr", "Ta"): -7, ("Cr", "Ti"): -7, ("Cr", "V"): -2,
+    ("Cr", "W"): 1, ("Cr", "Zr"): -12,
+    ("Cu", "Fe"): 13, ("Cu", "Hf"): -17, ("Cu", "Mn"): 4, ("Cu", "Mo"): 19, ("Cu", "Nb"): 3,
+    ("Cu", "Ni"): 4, ("Cu", "Ta"): 2, ("Cu", "Ti"): -9, ("Cu", "V"): 5, ("Cu", "W"): 22,
+    ("Cu", "Zr"): -23,
+    ("Fe", "Hf"): -21, ("Fe", "Mn"): 0, ("Fe", "Mo"): -2, ("Fe", "Nb"): -16, ("Fe", "Ni"): -2,
+    ("Fe", "Ta"): -15, ("Fe", "Ti"): -17, ("Fe", "V"): -7, ("Fe", "W"): 0, ("Fe", "Zr"): -25,
+    ("Hf", "Mn"): -12, ("Hf", "Mo"): -4, ("Hf", "Nb"): 4, ("Hf", "Ni"): -42, ("Hf", "Ta"): 3,
+    ("Hf", "Ti"): 0, ("Hf", "V"): -2, ("Hf", "W"): -6, ("Hf", "Zr"): 0,
+    ("Mn", "Mo"): 5, ("Mn", "Nb"): -4, ("Mn", "Ni"): -8, ("Mn", "Ta"): -4, ("Mn", "Ti"): -8,
+    ("Mn", "V"): -1, ("Mn", "W"): 6, ("Mn", "Zr"): -15,
+    ("Mo", "Nb"): -6, ("Mo", "Ni"): -7, ("Mo", "Ta"): -5, ("Mo", "Ti"): -4, ("Mo", "V"): 0,
+    ("Mo", "W"): 0, ("Mo", "Zr"): -6,
+    ("Nb", "Ni"): -30, ("Nb", "Ta"): 0, ("Nb", "Ti"): 2, ("Nb", "V"): -1, ("Nb", "W"): -8,
+    ("Nb", "Zr"): 4,
+    ("Ni", "Ta"): -29, ("Ni", "Ti"): -35, ("Ni", "V"): -18, ("Ni", "W"): -3, ("Ni", "Zr"): -49,
+    ("Ta", "Ti"): 1, ("Ta", "V"): -1, ("Ta", "W"): -7, ("Ta", "Zr"): 3,
+    ("Ti", "V"): -2, ("Ti", "W"): -6, ("Ti", "Zr"): 0,
+    ("V", "W"): -1, ("V", "Zr"): -4,
+    ("W", "Zr"): -9,
+    ("Al", "Si"): -19, ("Co", "Si"): -38, ("Cr", "Si"): -37, ("Cu", "Si"): -19, ("Fe", "Si"): -35,
+    ("Hf", "Si"): -77, ("Mn", "Si"): -45, ("Mo", "Si"): -35, ("Nb", "Si"): -56, ("Ni", "Si"): -40,
+    ("Ta", "Si"): -56, ("Ti", "Si"): -66, ("V", "Si"): -48, ("W", "Si"): -31, ("Zr", "Si"): -84,
+    ("Al", "C"): -36, ("C", "Co"): -42, ("C", "Cr"): -61, ("C", "Cu"): 33, ("C", "Fe"): -50,
+    ("C", "Mn"): -66, ("C", "Mo"): -67, ("C", "Nb"): -102, ("C", "Ni"): -39, ("C", "Si"): -39,
+    ("C", "Ti"): -109, ("C", "V"): -82, ("C", "W"): -60, ("C", "Zr"): -131,
+}
+
+# Yang & Zhang solid solution criteria
+MAX_SIZE_MISMATCH = 6.6
+MIN_OMEGA = 1.1
+
+# Guo VEC rule for the solid solution phase
+FCC_MIN_VEC = 8.0
+BCC_MAX_VEC = 6.87
+
+
+@functools.cache
+def _mixing_enthalpy_matrix(elements: tuple):
+    n_elements = len(elements)
+    matrix = np.full((n_elements, n_elements), np.nan)
+    np.fill_diagonal(matrix, 0.0)
+    for i, a in enumerate(elements):
+        for j, b in enumerate(elements):
+            value = MIXING_ENTHALPY.get((a, b), MIXING_ENTHALPY.get((b, a)))
+            if value is not None:
+                matrix[i, j] = value
+    matrix.setflags(write=False)
+    return matrix
+
+
+def mixing_enthalpy_matrix(elements):
+    """
+    Args:
+        elements: element symbols
+
+    Returns:
+        np.ndarray: (n_elements, n_elements) binary mixing enthalpies in kJ/mol, NaN for unknown pairs
+    """
+    return _mixing_enthalpy_matrix(tuple(str(el) for el in elements))
+
+
+def _element_radius(elements):
+    # metallic radius where it is known, atomic radius otherwise (e.g. C, Si)
+    metallic = element_property("metallic_radius", elements)
+    return np.where(np.isnan(metallic), element_property("atomic_radius", elements), metallic)
+
+
+def atomic_size_mismatch(fractions, elements):
+    """
+    Atomic size mismatch delta = 100 * sqrt(sum_i c_i (1 - r_i / r_avg)^2), in percent.
+
+    Args:
+        fractions: (n_compositions, n_elements) atomic fractions
+        elements: element symbol of each column
+
+    Returns:
+        np.ndarray: (n_compositions,) delta
+    """
+    radius = _element_radius(elements)
+    average_radius = fractions @ radius
+    return 100 * np.sqrt(np.sum(fractions * (1 - radius[None, :] / average_radius[:, None]) ** 2, axis=1))
+
+
+def valence_electron_concentration(fractions, elements):
+    """
+    Args:
+        fractions: (n_compositions, n_elements) atomic fractions
+        elements: element symbol of each column
+
+    Returns:
+        np.ndarray: (n_compositions,) fraction-weighted VEC
+    """
+    return fractions @ element_property("vec", elements)
+
+
+def mixing_entropy(fractions):
+    """
+    Ideal configurational entropy of mixing -R sum_i c_i ln(c_i).
+
+    Args:
+        fractions: (n_compositions, n_elements) atomic fractions
+
+    Returns:
+        np.ndarray: (n_compositions,) entropy in J/(mol K)
+    """
+    logs = np.log(np.where(fractions > 0, fractions, 1.0))
+    # + 0.0 turns the -0.0 of a single element into 0.0
+    return -GAS_CONSTANT * np.sum(fractions * logs, axis=1) + 0.0
+
+
+def mixing_enthalpy(fractions, elements):
+    """
+    Regular-solution mixing enthalpy sum_{i<j} 4 H_ij c_i c_j from the Miedema binary enthalpies.
+
+    Args:
+        fractions: (n_compositions, n_elements) atomic fractions
+        elements: element symbol of each column
+
+    Returns:
+        np.ndarray: (n_compositions,) enthalpy in kJ/mol, NaN where a pair of present elements is unknown
+    """
+    matrix = mixing_enthalpy_matrix(elements)
+    unknown = np.isnan(matrix)
+
+    # each unordered pair appears twice in the symmetric matrix, so 4 * (1/2) = 2
+    enthalpy = 2 * np.einsum("ni,ij,nj->n", fractions, np.where(unknown, 0.0, matrix), fractions)
+
+    if unknown.any():
+        present = (fractions > 0).astype(float)
+        missing_pairs = np.einsum("ni,ij,nj->n", present, unknown.astype(float), present)
+        enthalpy[missing_pairs > 0] = np.nan
+
+    return enthalpy
+
+
+def omega(fractions, elements, entropy=None, enthalpy=None):
+    """
+    Omega = Tm dS_mix / |dH_mix| with Tm the fraction-weighted melting point.
+
+    Args:
+        fractions: (n_compositions, n_elements) atomic fractions
+        elements: element symbol of each column
+        entropy: precomputed mixing_entropy, optional
+        enthalpy: precomputed mixing_enthalpy, optional
+
+    Returns:
+        np.ndarray: (n_compositions,) Omega, inf where the mixing enthalpy is zero (ideal mixtures and single
+            elements), NaN where it is unknown
+    """
+    entropy = mixing_entropy(fractions) if entropy is None else entropy
+    enthalpy = mixing_enthalpy(fractions, elements) if enthalpy is None else enthalpy
+    melting_point = fractions @ element_property("melting_point", elements)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = melting_point * entropy / (1000 * np.abs(enthalpy))
+    return np.where(enthalpy == 0, np.inf, values)
+
+
+def hea_descriptors(compositions, elements=None, chunk_size: int=1000000):
+    """
+    Compute the standard HEA phase-selection descriptors for a batch of compositions.
+
+    Args:
+        compositions: (n_compositions, n_elements) fraction matrix, or alloy strings / dicts as accepted by
+            element_properties.fraction_matrix
+        elements: element symbol of each column (required for a fraction matrix)
+        chunk_size: number of compositions evaluated at once, bounds the temporary memory
+
+    Returns:
+        dict: delta (%), vec, entropy (J/(mol K)), enthalpy (kJ/mol) and omega arrays, plus the elements
+    """
+    if elements is None:
+        fractions, elements = fraction_matrix(compositions)
+    else:
+        fractions = np.asarray(compositions, dtype=float)
+        fractions = fractions / fractions.sum(axis=1, keepdims=True)
+
+    descriptors = {name: np.empty(len(fractions)) for name in ("delta", "vec", "entropy", "enthalpy", "omega")}
+    for start in range(0, len(fractions), chunk_size):
+        chunk = fractions[start:start + chunk_size]
+        rows = slice(start, start + len(chunk))
+
+        entropy = mixing_entropy(chunk)
+        enthalpy = mixing_enthalpy(chunk, elements)
+        descriptors["delta"][rows] = atomic_size_mismatch(chunk, elements)
+        descriptors["vec"][rows] = valence_electron_concentration(chunk, elements)
+        descriptors["entropy"][rows] = entropy
+        descriptors["enthalpy"][rows] = enthalpy
+        descriptors["omega"][rows] = omega(chunk, elements, entropy, enthalpy)
+
+    descriptors["elements"] = list(elements)
+    return descriptors
+
+
+def solid_solution_mask(descriptors, max_delta: float=MAX_SIZE_MISMATCH, min_omega: float=MIN_OMEGA):
+    """
+    Keep the compositions expected to form a solid solution (delta <= 6.6 %, Omega >= 1.1).
+
+    Compositions with an unknown mixing enthalpy are kept so they are not silently dropped.
+
+    Args:
+        descriptors: output of hea_descriptors
+
+    Returns:
+        np.ndarray: boolean mask over the compositions
+    """
+    omega_ok = np.isnan(descriptors["omega"]) | (descriptors["omega"] >= min_omega)
+    return (descriptors["delta"] <= max_delta) & omega_ok
+
+
+def predict_crystal_from_vec(vec):
+    """
+    VEC rule for the solid solution phase: FCC for VEC >= 8, BCC for VEC < 6.87, mixed in between.
+
+    Args:
+        vec: valence electron concentrations
+
+    Returns:
+        np.ndarray: 'FCC', 'BCC' or 'FCC+BCC' for each composition
+    """
+    vec = np.asarray(vec)
+    return np.where(vec >= FCC_MIN_VEC, 'FCC', np.where(vec < BCC_MAX_VEC, 'BCC', 'FCC+BCC'))
@@ -0,0 +1,159 @@
+from pymatgen.core.structure import Structure
+from pymatgen.command_line.mcsqs_caller import Sqs, _parse_clusters
+
+import logging
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import warnings
+
+
+# time between checks of the objective functions, in seconds
+POLL_INTERVAL = 5.0
+
+
+def _read_objective(path: str):
+    # last objective written to a bestcorr file, None while the file is missing or half written
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+        value = lines[-1].split("=")[-1].strip()
+        return -math.inf if value == "Perfect_match" else float(value)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _read_structure(path: str):
+    with open(path) as f:
+        return Structure.from_str(f.read(), fmt="mcsqs")
+
+
+def _stop(processes, timeout: float=10.0):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_mcsqs_monitored(structure: Structure, clusters: dict, scaling=1, instances: int|None=None,
+                        time_budget: float=600.0, plateau_time: float=60.0, min_improvement: float=1e-4,
+                        poll_interval: float=POLL_INTERVAL, temperature: float=1.0, wr: float=1.0, wn: float=1.0,
+                        wd: float=0.5, tol: float=1e-3, scratch_dir: str|None=None, keep_directory: bool=False):
+    """
+    Run parallel mcsqs instances until their best objective stops improving or the time budget is used up.
+
+    The instances run in a scratch directory of their own.  Their bestcorr files are polled while they run,
+    and all of them are stopped once the best objective has not improved by more than min_improvement for
+    plateau_time seconds, a perfect match is found, or time_budget seconds have passed.  The best structure
+    is then read back and the scratch directory removed.
+
+    Args:
+        structure: disordered pymatgen structure
+        clusters: cluster cutoffs {number of atoms: cutoff in angstrom}
+        scaling: number of primitive cells in the supercell, or (nx, ny, nz) scaling of the structure
+        instances: number of mcsqs instances, default one per core
+        time_budget: maximum run time in seconds
+        plateau_time: stop after this many seconds without improvement of the best objective
+        min_improvement: smallest decrease of the objective counted as an improvement
+        poll_interval: seconds between checks of the objectives
+        temperature, wr, wn, wd, tol: mcsqs Monte Carlo temperature, objective weights and tolerance
+        scratch_dir: parent directory of the scratch directory, default the system temporary directory
+        keep_directory: keep the scratch directory, e.g. for debugging
+
+    Returns:
+        Sqs: best structure, its objective, the best structure and objective of every instance, the clusters
+            and the scratch directory (removed unless keep_directory)
+    """
+    if shutil.which("mcsqs") is None:
+        raise RuntimeError("mcsqs not found, install ATAT: https://www.brown.edu/Departments/Engineering/Labs/avdw/atat/")
+    if structure.is_ordered:
+        raise ValueError("Pick a disordered structure")
+
+    instances = os.cpu_count() if instances is None else instances
+    directory = tempfile.mkdtemp(prefix="mcsqs_", dir=scratch_dir)
+
+    try:
+        if isinstance(scaling, (int, float)):
+            assert scaling % 1 == 0, f"scaling={scaling} should be an integer"
+            find_sqs = ["mcsqs", f"-n={int(scaling) * len(structure)}"]
+        else:
+            # make the supercell here and tell mcsqs to keep it
+            with open(os.path.join(directory, "sqscell.out"), "w") as f:
+                f.write("1\n1 0 0\n0 1 0\n0 0 1\n")
+            structure = structure * scaling
+            find_sqs = ["mcsqs", "-rc", f"-n={len(structure)}"]
+        structure.to(filename=os.path.join(directory, "rndstr.in"))
+
+        subprocess.run(["mcsqs"] + [f"-{size}={cutoff}" for size, cutoff in clusters.items()],
+                       cwd=directory, check=True, stdout=subprocess.DEVNULL)
+
+        options = [f"-T={temperature}", f"-wr={wr}", f"-wn={wn}", f"-wd={wd}", f"-tol={tol}"]
+        processes = [
+            subprocess.Popen(find_sqs + options + [f"-ip={n}"], cwd=directory,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for n in range(1, instances + 1)
+        ]
+        logging.info(f"Running {instances} mcsqs instances in {directory}")
+
+        start = time.perf_counter()
+        best = math.inf
+        last_improvement = start
+        try:
+            while True:
+                time.sleep(poll_interval)
+                now = time.perf_counter()
+
+                objectives = [_read_objective(os.path.join(directory, f"bestcorr{n}.out")) for n in range(1, instances + 1)]
+                current = min((value for value in objectives if value is not None), default=math.inf)
+                if current < best - min_improvement:
+                    best = current
+                    last_improvement = now
+                    logging.debug(f"mcsqs best objective {best} after {now - start:.0f} s")
+
+                if current == -math.inf:
+                    logging.info("mcsqs found a perfect match")
+                    break
+                if best < math.inf and now - last_improvement > plateau_time:
+                    logging.info(f"mcsqs objective plateaued at {best} after {now - start:.0f} s")
+                    break
+                if now - start > time_budget:
+                    logging.info(f"mcsqs time budget of {time_budget} s used up, best objective {best}")
+                    break
+                if all(process.poll() is not None for process in processes):
+                    break
+        finally:
+            _stop(processes)
+
+        objectives = [_read_objective(os.path.join(directory, f"bestcorr{n}.out")) for n in range(1, instances + 1)]
+        finished = [n for n, value in enumerate(objectives, 1) if value is not None]
+        if not finished:
+            raise RuntimeError("mcsqs did not write any results, is the time budget too short?")
+
+        all_sqs = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for n in finished:
+                all_sqs.append({
+                    "structure": _read_structure(os.path.join(directory, f"bestsqs{n}.out")),
+                    "objective_function": "Perfect_match" if objectives[n - 1] == -math.inf else objectives[n - 1],
+                })
+
+        best_n = min(range(len(finished)), key=lambda n: objectives[finished[n] - 1])
+        return Sqs(
+            bestsqs=all_sqs[best_n]["structure"],
+            objective_function=all_sqs[best_n]["objective_function"],
+            allsqs=all_sqs,
+            clusters=_parse_clusters(os.path.join(directory, "clusters.out")),
+            directory=directory,
+        )
+    finally:
+        if not keep_directory:
+            shutil.rmtree(directory, ignore_errors=True)
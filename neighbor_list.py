@@ -0,0 +1,121 @@
+import itertools
+import numpy as np
+
+
+def _perpendicular_widths(lattice):
+    # distance between opposite faces of the cell along each lattice direction
+    volume = abs(np.linalg.det(lattice))
+    face_normals = np.cross(lattice[[1, 2, 0]], lattice[[2, 0, 1]])
+    return volume / np.linalg.norm(face_normals, axis=1)
+
+
+def neighbor_list(lattice, frac_coords, cutoff: float, self_interaction: bool=False):
+    """
+    Find all pairs of sites closer than cutoff in a periodic cell using cell lists, in O(N).
+
+    Sites are sorted into bins at least cutoff/reach wide, and each site is only compared with the sites in
+    the neighboring bins.  Cells smaller than the cutoff are handled by visiting the periodic images of the
+    bins, so every image of every neighbor within the cutoff is returned.  Each pair is returned in both
+    directions (i, j) and (j, i).
+
+    Args:
+        lattice: 3x3 lattice matrix, rows are the lattice vectors
+        frac_coords: (n, 3) fractional coordinates
+        cutoff: neighbor distance cutoff, same units as the lattice
+        self_interaction: also return each site paired with itself at zero distance
+
+    Returns:
+        tuple: (i, j, offsets, distances) where site j shifted by offsets (integer lattice vectors) is
+            the neighbor of site i at the given distance, sorted by i then distance
+    """
+    lattice = np.asarray(lattice, dtype=float).reshape(3, 3)
+    frac_coords = np.asarray(frac_coords, dtype=float).reshape(-1, 3)
+    n_sites = len(frac_coords)
+
+    # wrap the sites into the cell, remembering the shift so offsets refer to the original coordinates
+    shifts = np.floor(frac_coords)
+    wrapped = frac_coords - shifts
+
+    widths = _perpendicular_widths(lattice)
+    n_bins = np.maximum(1, np.floor(widths / cutoff)).astype(int)
+    reach = np.ceil(cutoff * n_bins / widths).astype(int)
+
+    site_bins = np.minimum((wrapped * n_bins).astype(int), n_bins - 1)
+    bin_ids = np.ravel_multi_index(site_bins.T, n_bins)
+    order = np.argsort(bin_ids, kind="stable")
+    bin_counts = np.bincount(bin_ids, minlength=np.prod(n_bins))
+    bin_starts = np.cumsum(bin_counts) - bin_counts
+
+    sites = np.arange(n_sites)
+    pair_i, pair_j, pair_images, pair_distances = [], [], [], []
+    for step in itertools.product(*(range(-r, r + 1) for r in reach)):
+        neighbor_bins = site_bins + np.array(step)
+        images = np.floor_divide(neighbor_bins, n_bins)
+        neighbor_ids = np.ravel_multi_index((neighbor_bins - images * n_bins).T, n_bins)
+
+        # expand every site into one candidate pair per site in its neighbor bin
+        counts = bin_counts[neighbor_ids]
+        total = counts.sum()
+        if total == 0:
+            continue
+        i = np.repeat(sites, counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(bin_starts[neighbor_ids], counts) + np.arange(total) - first]
+        image = np.repeat(images, counts, axis=0)
+
+        distances = np.linalg.norm((wrapped[j] + image - wrapped[i]) @ lattice, axis=1)
+        keep = distances < cutoff
+        if not self_interaction:
+            keep &= ~((i == j) & np.all(image == 0, axis=1))
+
+        pair_i.append(i[keep])
+        pair_j.append(j[keep])
+        pair_images.append(image[keep])
+        pair_distances.append(distances[keep])
+
+    if not pair_i:
+        return np.empty(0, int), np.empty(0, int), np.empty((0, 3), int), np.empty(0)
+
+    i = np.concatenate(pair_i)
+    j = np.concatenate(pair_j)
+    distances = np.concatenate(pair_distances)
+    offsets = (np.concatenate(pair_images) - shifts[j] + shifts[i]).astype(int)
+
+    order = np.lexsort((distances, i))
+    return i[order], j[order], offsets[order], distances[order]
+
+
+def neighbor_shells(lattice, frac_coords, n_shells: int, tolerance: float=1e-3):
+    """
+    Group the neighbor pairs of a periodic cell into the first n_shells distance shells.
+
+    Args:
+        lattice: 3x3 lattice matrix, rows are the lattice vectors
+        frac_coords: (n, 3) fractional coordinates
+        n_shells: number of shells to find
+        tolerance: distances within this absolute tolerance belong to the same shell
+
+    Returns:
+        tuple: (shell distances (n_shells,), (i, j, offsets, shell index) of every pair in those shells)
+    """
+    lattice = np.asarray(lattice, dtype=float).reshape(3, 3)
+    frac_coords = np.asarray(frac_coords, dtype=float).reshape(-1, 3)
+
+    # start around the mean interatomic spacing and grow the cutoff until enough shells are inside
+    spacing = np.cbrt(abs(np.linalg.det(lattice)) / len(frac_coords))
+    cutoff = 1.5 * spacing
+    while True:
+        i, j, offsets, distances = neighbor_list(lattice, frac_coords, cutoff)
+        if len(distances):
+            sorted_distances = np.sort(distances)
+            new_shell = np.diff(sorted_distances) > tolerance
+            shell_distances = sorted_distances[np.concatenate([[True], new_shell])]
+            if len(shell_distances) > n_shells:
+                break
+        cutoff *= 1.5
+
+    shell_distances = shell_distances[:n_shells]
+    shell = np.searchsorted(shell_distances + tolerance, distances)
+    keep = shell < n_shells
+
+    return shell_distances, (i[keep], j[keep], offsets[keep], shell[keep])
@@ -0,0 +1,171 @@
+"""
+Fast POSCAR / CONTCAR reader straight into CompactStructure arrays.
+
+Reads VASP 4 and 5 files (with or without the species line), negative (volume) and per-axis scale factors,
+selective dynamics and Direct or Cartesian coordinates.  CONTCAR velocity blocks are skipped.  Several
+structures concatenated in one stream, and every file of a directory, are read in one pass.
+"""
+import glob
+import os
+import re
+import numpy as np
+
+from compact_structure import CompactStructure
+
+
+def _is_number(token: str):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_vector(line: str):
+    tokens = line.split()
+    return len(tokens) == 3 and all(_is_number(token) for token in tokens)
+
+
+def _float_block(lines):
+    # (n, 3) array of the first three numbers of each line.  Plain three-column blocks are parsed in one call,
+    # blocks with selective dynamics flags or site labels fall back to splitting each line.
+    values = ' '.join(lines).split()
+    if len(values) == 3 * len(lines):
+        return np.array(list(map(float, values))).reshape(-1, 3)
+    return np.array([line.split()[:3] for line in lines], dtype=float)
+
+
+def _parse(lines, start: int, elements=None):
+    # parse one structure starting at lines[start], returns the structure and the index of the line after it
+    comment = lines[start]
+    scale = np.array(lines[start + 1].split()[:3], dtype=float)
+    lattice = _float_block(lines[start + 2:start + 5])
+
+    n = start + 5
+    tokens = lines[n].split()
+    if _is_number(tokens[0]):
+        # VASP 4: no species line, the species come from the caller or the comment line
+        if elements is not None:
+            symbols = list(elements)
+        else:
+            matches = [re.match(r'[A-Z][a-z]?', token) for token in comment.split()[:len(tokens)]]
+            if len(matches) < len(tokens) or not all(matches):
+                raise ValueError(f"VASP 4 POSCAR '{comment.strip()}' has no species line and its comment does not "
+                                 f"list the {len(tokens)} elements, pass them with elements=")
+            symbols = [match.group() for match in matches]
+    else:
+        symbols = tokens
+        n += 1
+        tokens = lines[n].split()
+    counts = np.array(tokens, dtype=int)
+    if len(symbols) != len(counts):
+        raise ValueError(f"{len(symbols)} species {symbols} for {len(counts)} counts in POSCAR '{comment.strip()}'")
+    n += 1
+
+    if lines[n].lstrip()[:1] in ('s', 'S'):
+        n += 1
+    cartesian = lines[n].lstrip()[:1] in ('c', 'C', 'k', 'K')
+    n += 1
+
+    n_sites = int(counts.sum())
+    coords = _float_block(lines[n:n + n_sites])
+    n += n_sites
+
+    # a negative scale is the cell volume, three numbers scale the Cartesian x, y and z components
+    if len(scale) == 1 and scale[0] < 0:
+        scale = np.cbrt(-scale / abs(np.linalg.det(lattice)))
+    lattice = lattice * scale
+    frac_coords = np.linalg.solve(lattice.T, (coords * scale).T).T if cartesian else coords
+
+    # repeated species in the species line share one element table entry
+    element_table = list(dict.fromkeys(symbols))
+    index = {el: k for k, el in enumerate(element_table)}
+    species = np.repeat([index[el] for el in symbols], counts)
+    structure = CompactStructure(lattice, frac_coords, species, element_table)
+
+    # skip CONTCAR velocity blocks: n_sites lines of three numbers after a blank separator (VASP) or after a
+    # "Cartesian" / "Direct" header line (ase), and the lattice velocities of VASP MD runs
+    while n < len(lines):
+        line = lines[n].strip()
+        if not line:
+            n += 1
+        elif line.lower().startswith('lattice velocities'):
+            # header, initialization state, 3 lattice velocities and 3 lattice vectors
+            n += 8
+        elif n + n_sites < len(lines) and len(line.split()) == 1 and line[0] in 'cCkKdD' \
+                and _is_vector(lines[n + 1]) and _is_vector(lines[n + n_sites]):
+            n += 1 + n_sites
+        elif n + n_sites <= len(lines) and _is_vector(line) and _is_vector(lines[n + n_sites - 1]):
+            n += n_sites
+        else:
+            break
+
+    return structure, n
+
+
+def _lines(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source).decode().splitlines()
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    if isinstance(source, str) and '\n' not in source:
+        with open(source, 'r') as f:
+            return f.read().splitlines()
+    if isinstance(source, str):
+        return source.splitlines()
+    text = source.read()
+    return (text.decode() if isinstance(text, bytes) else text).splitlines()
+
+
+def read_poscar(source, elements=None):
+    """
+    Read one structure from a POSCAR or CONTCAR.
+
+    Args:
+        source: file path (str or os.PathLike), POSCAR text, bytes, or an open file
+        elements: element symbols of the species blocks, only needed for VASP 4 files whose comment line does
+            not list them
+
+    Returns:
+        CompactStructure
+    """
+    return _parse(_lines(source), 0, elements)[0]
+
+
+def read_poscars(source, elements=None):
+    """
+    Read every structure of a concatenated POSCAR stream.
+
+    Args:
+        source: file path, text, bytes, or an open file holding POSCARs one after another
+        elements: element symbols of the species blocks for VASP 4 structures, see read_poscar
+
+    Returns:
+        list: CompactStructures in stream order
+    """
+    lines = _lines(source)
+    structures = []
+    n = 0
+    while n < len(lines):
+        if not lines[n].strip():
+            n += 1
+            continue
+        structure, n = _parse(lines, n, elements)
+        structures.append(structure)
+    return structures
+
+
+def read_poscar_directory(directory: str, pattern: str="*", elements=None):
+    """
+    Read every POSCAR-format file of a directory.
+
+    Args:
+        directory: directory to read
+        pattern: glob pattern of the files, e.g. "*.vasp" or "CONTCAR*"
+        elements: element symbols of the species blocks for VASP 4 files, see read_poscar
+
+    Returns:
+        dict: file name -> CompactStructure, in sorted file name order
+    """
+    paths = sorted(path for path in glob.glob(os.path.join(directory, pattern)) if os.path.isfile(path))
+    return {os.path.basename(path): read_poscar(path, elements) for path in paths}
@@ -0,0 +1,107 @@
+import numpy as np
+
+from compact_structure import CompactStructure
+from neighbor_list import neighbor_shells
+
+
+def shell_pairs(lattice, frac_coords, n_shells: int=2):
+    """
+    Precompute the neighbor pairs of each shell of a lattice, shared by every decoration of it.
+
+    Args:
+        lattice: 3x3 lattice matrix, rows are the lattice vectors
+        frac_coords: (n_sites, 3) fractional coordinates
+        n_shells: number of neighbor shells
+
+    Returns:
+        tuple: (shell distances, i, j, shell index) with one entry per directed pair
+    """
+    shell_distances, (i, j, _, shell) = neighbor_shells(lattice, frac_coords, n_shells)
+    return shell_distances, i, j, shell
+
+
+def pair_counts(species, i, j, shell, n_species: int, n_shells: int, chunk_size: int=256):
+    """
+    Count the neighbor pairs of each species pair in each shell.
+
+    Args:
+        species: (n_sites,) or (n_structures, n_sites) integer species arrays on the same lattice
+        i, j, shell: pair arrays from shell_pairs
+        n_species: number of species
+        n_shells: number of shells
+        chunk_size: number of structures counted at once, bounds the temporary memory
+
+    Returns:
+        np.ndarray: (n_structures, n_shells, n_species, n_species) pair counts
+    """
+    species = np.atleast_2d(species)
+    n_structures = len(species)
+    counts = np.empty((n_structures, n_shells, n_species, n_species), dtype=np.int64)
+
+    pair_index = shell * n_species * n_species
+    for start in range(0, n_structures, chunk_size):
+        chunk = species[start:start + chunk_size].astype(np.int64)
+        # one flat bin per (structure, shell, species of i, species of j)
+        index = (np.arange(len(chunk))[:, None] * n_shells * n_species * n_species
+                 + pair_index[None, :] + chunk[:, i] * n_species + chunk[:, j])
+        counts[start:start + len(chunk)] = np.bincount(
+            index.ravel(), minlength=len(chunk) * n_shells * n_species * n_species
+        ).reshape(len(chunk), n_shells, n_species, n_species)
+
+    return counts
+
+
+def warren_cowley(species, i, j, shell, n_species: int|None=None, n_shells: int|None=None):
+    """
+    Warren-Cowley short-range order parameters alpha_ab = 1 - P(b | a) / c_b for each neighbor shell.
+
+    P(b | a) is the probability that a neighbor of an a site in the shell is b, and c_b is the concentration
+    of b.  alpha is 0 for a random alloy, negative when a-b pairs are preferred and positive when avoided.
+
+    Args:
+        species: (n_sites,) or (n_structures, n_sites) integer species arrays on the same lattice
+        i, j, shell: pair arrays from shell_pairs
+        n_species: number of species, defaults to the largest species index + 1
+        n_shells: number of shells, defaults to the largest shell index + 1
+
+    Returns:
+        np.ndarray: (n_shells, n_species, n_species) alpha for a single structure, or
+            (n_structures, n_shells, n_species, n_species) for a batch.  NaN for species that are absent.
+    """
+    species = np.asarray(species)
+    single = species.ndim == 1
+    species = np.atleast_2d(species)
+    n_species = int(species.max()) + 1 if n_species is None else n_species
+    n_shells = int(shell.max()) + 1 if n_shells is None else n_shells
+
+    counts = pair_counts(species, i, j, shell, n_species, n_shells).astype(float)
+    n_structures, n_sites = species.shape
+    # one flat bin per (structure, species)
+    index = np.arange(n_structures)[:, None] * n_species + species
+    concentrations = np.bincount(index.ravel(), minlength=n_structures * n_species).reshape(n_structures, n_species) / n_sites
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        conditional = counts / counts.sum(axis=-1, keepdims=True)
+        alpha = 1 - conditional / concentrations[:, None, None, :]
+
+    return alpha[0] if single else alpha
+
+
+def structure_sro(structure, n_shells: int=2):
+    """
+    Warren-Cowley parameters of a single structure.
+
+    Args:
+        structure: CompactStructure or ordered pymatgen Structure
+        n_shells: number of neighbor shells
+
+    Returns:
+        tuple: (alpha (n_shells, n_elements, n_elements), element symbols, shell distances)
+    """
+    if not isinstance(structure, CompactStructure):
+        structure = CompactStructure.from_pymatgen(structure)
+
+    shell_distances, i, j, shell = shell_pairs(structure.lattice, structure.frac_coords, n_shells)
+    alpha = warren_cowley(structure.species, i, j, shell, len(structure.elements), n_shells)
+
+    return alpha, list(structure.elements), shell_distances
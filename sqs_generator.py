@@ -4,17 +4,92 @@ from pymatgen.core.composition import Composition
 from pymatgen.core.periodic_table import Element
 from pymatgen.command_line import mcsqs_caller
 from pymatgen.transformations.advanced_transformations import SQSTransformation
-from smol.capp.generate.special.sqs import StochasticSQSGenerator
+from smol.capp.generate.random import generate_random_ordered_occupancy
+from smol.capp.generate.special.sqs import SQS, StochasticSQSGenerator
+from concurrent.futures import ProcessPoolExecutor
+import itertools
 import logging
+import os
+import numpy as np
+
+from mcsqs_runner import run_mcsqs_monitored
+from neighbor_list import neighbor_shells
+from sqs_kernel import select_sqs_parameters
+from sqs_library import DEFAULT_LIBRARY_DIR, load_sqs, load_sqs_templates, store_sqs, store_sqs_templates
+from structure_fingerprint import unique_structure_indices
+
+
+# cluster cutoffs and supercell size (in primitive cells) of the library and mcsqs searches, which need fixed
+# parameters to key the stored SQS
+SQS_CUTOFFS = {2: 7, 3: 5}
+SQS_SUPERCELL_SIZE = 36
+
+# nearest neighbors of a site of each crystal type
+COORDINATION = {12: "fcc", 8: "bcc"}
+# sites per conventional cubic cell
+SITES_PER_CELL = {"fcc": 4, "bcc": 2}
     
 
-def corr_sqs(primitive_structure):
+def remove_duplicate_sqs(sqs_list, matcher=None):
+    """
+    Drop SQS whose structures are equivalent, keeping the best scored one of each group.
+
+    Args:
+        sqs_list: SQS tuples from get_best_sqs, ranked by score
+        matcher: StructureMatcher, default StructureMatcher()
+
+    Returns:
+        list: the distinct SQS, still ranked by score
+    """
+    indices = unique_structure_indices([sqs.structure for sqs in sqs_list], matcher)
+    return [sqs_list[n] for n in indices]
+
+
+def select_generator_parameters(primitive_structure, rng: np.random.Generator|None=None, **kwargs):
+    """
+    Pick the cluster cutoffs and supercell size of an SQS search with sqs_kernel.select_sqs_parameters.
+
+    The crystal type is read from the nearest neighbor count and the lattice parameter from the volume per site,
+    so any disordered FCC or BCC cell works, e.g. from create_disordered_structure.
+
+    Args:
+        primitive_structure: disordered FCC or BCC structure
+        rng: random number generator of the trial runs, see decoration_rng
+        kwargs: passed to select_sqs_parameters
+
+    Returns:
+        tuple: (cutoffs {2: pair cutoff, 3: triplet cutoff}, supercell size in cells of primitive_structure)
+    """
+    lattice = primitive_structure.lattice.matrix
+    frac_coords = primitive_structure.frac_coords
+    _, (i, _, _, _) = neighbor_shells(lattice, frac_coords, 1)
+    coordination = len(i) // len(frac_coords)
+    if coordination not in COORDINATION:
+        raise ValueError(f"Sites with {coordination} nearest neighbors are neither FCC nor BCC")
+    crystal = COORDINATION[coordination]
+    lattice_parameter = np.cbrt(SITES_PER_CELL[crystal] * primitive_structure.volume / len(frac_coords))
+
+    cutoffs, total_atoms, error = select_sqs_parameters(primitive_structure.composition, crystal,
+                                                        lattice_parameter=lattice_parameter, rng=rng, **kwargs)
+    supercell_size = max(1, round(total_atoms / len(frac_coords)))
+    logging.info(f"Selected cutoffs {cutoffs} and {supercell_size} cells for a trial error of {error:.3g}")
+
+    return cutoffs, supercell_size
+
+
+def corr_sqs(primitive_structure, cutoffs=None, supercell_size: int|None=None, rng: np.random.Generator|None=None):
+
+    # cutoffs and size not given are picked for the alloy with select_generator_parameters
+    if cutoffs is None or supercell_size is None:
+        selected_cutoffs, selected_size = select_generator_parameters(primitive_structure, rng)
+        cutoffs = selected_cutoffs if cutoffs is None else cutoffs
+        supercell_size = selected_size if supercell_size is None else supercell_size
 
     # create a correlation vector based SQS generator
     generator_corr = StochasticSQSGenerator.from_structure(
         structure=primitive_structure,
-        cutoffs={2: 7, 3: 5},  # cluster cutoffs as passed to cluster subspaces
-        supercell_size=36,   # the search will be over supercells of 36 atoms
+        cutoffs=cutoffs,  # cluster cutoffs as passed to cluster subspaces
+        supercell_size=supercell_size,   # the search will be over supercells of this many primitive cells
         feature_type="correlation",
         match_weight=1.0,  # weight given to the maximum diameter of perfectly matched vectors (see original publication for details)
     )
@@ -27,22 +102,29 @@ def corr_sqs(primitive_structure):
     progress=True       # show progress bar for each temperature
     )
 
-    sqs_corr_list = generator_corr.get_best_sqs(
+    # dedupe with the fingerprint prefilter instead of matching every pair of structures
+    sqs_corr_list = remove_duplicate_sqs(generator_corr.get_best_sqs(
         num_structures=generator_corr.num_structures,
-        remove_duplicates=True,
-    )
+        remove_duplicates=False,
+    ))
 
     return sqs_corr_list, generator_corr
 
-def cint_sqs(primitive_structure):
-    
+def cint_sqs(primitive_structure, cutoffs=None, supercell_size: int|None=None, rng: np.random.Generator|None=None):
+
+    # cutoffs and size not given are picked for the alloy with select_generator_parameters
+    if cutoffs is None or supercell_size is None:
+        selected_cutoffs, selected_size = select_generator_parameters(primitive_structure, rng)
+        cutoffs = selected_cutoffs if cutoffs is None else cutoffs
+        supercell_size = selected_size if supercell_size is None else supercell_size
+
     logging.info("Creationg a Stochastic SQS generator")    
 
     # create a cluster interaction vector based SQS generator
     generator_cint = StochasticSQSGenerator.from_structure(
         structure=primitive_structure,
-        cutoffs={2: 7, 3: 5},
-        supercell_size=36,
+        cutoffs=cutoffs,
+        supercell_size=supercell_size,
         feature_type="cluster-interaction",
         match_weight=1.0,
     )
@@ -56,17 +138,161 @@ def cint_sqs(primitive_structure):
         progress=True       # show progress bar for each temperature
     )
 
-    sqs_cint_list = generator_cint.get_best_sqs(
+    # dedupe with the fingerprint prefilter instead of matching every pair of structures
+    sqs_cint_list = remove_duplicate_sqs(generator_cint.get_best_sqs(
         num_structures=generator_cint.num_structures,
-        remove_duplicates=True,
-    )
+        remove_duplicates=False,
+    ))
 
     return sqs_cint_list, generator_cint
 
-def pmg_sqs(struc):
+def _run_sqs_chain(primitive_structure, feature_type, cutoffs, supercell_size, mcmc_steps, temperatures, seed):
+    # one independent annealing chain, run in a worker process.  Every random stream is derived from the seed sequence.
+    seeds = seed.generate_state(2)
+    generator = StochasticSQSGenerator.from_structure(
+        structure=primitive_structure,
+        cutoffs=cutoffs,
+        supercell_size=supercell_size,
+        feature_type=feature_type,
+        match_weight=1.0,
+        seed=int(seeds[0]),
+        kernel_kwargs={"seed": int(seeds[1])},
+    )
+
+    rng = np.random.default_rng(seed)
+    compositions = [sublattice.composition for sublattice in generator.processors[0].get_sublattices()]
+    initial_occupancies = np.vstack([
+        generate_random_ordered_occupancy(processor, composition=compositions, rng=rng)
+        for processor in generator.processors
+    ])
+
+    generator.generate(
+        mcmc_steps=mcmc_steps,
+        temperatures=temperatures,
+        initial_occupancies=initial_occupancies,
+        progress=False,
+    )
+
+    return generator.get_best_sqs(num_structures=generator.num_structures, remove_duplicates=False)
+
+
+def parallel_sqs(primitive_structure, feature_type: str="correlation", n_chains: int|None=None,
+                 mcmc_steps: int=100000, temperatures=None, cutoffs=None, supercell_size: int=SQS_SUPERCELL_SIZE,
+                 seed=None, max_workers: int|None=None, num_structures: int|None=None):
+    """
+    Run independent SQS annealing chains across a process pool and merge their best structures.
+
+    Args:
+        primitive_structure: disordered primitive structure, e.g. from create_disordered_structure
+        feature_type: "correlation" or "cluster-interaction"
+        n_chains: number of chains, default one per core
+        mcmc_steps: steps per temperature of each chain
+        temperatures: decreasing temperature schedule shared by all chains, or a list with one schedule per
+            chain.  None uses the smol default.
+        cutoffs: cluster cutoffs, default SQS_CUTOFFS
+        supercell_size: supercell size in primitive cells
+        seed: seed of the chains, each chain gets an independent stream spawned from it
+        max_workers: number of processes, default n_chains
+        num_structures: number of SQS to return, default all distinct ones
+
+    Returns:
+        list: distinct SQS tuples (structure, score, feature_distance, supercell_matrix) of all chains,
+            best score first
+    """
+    n_chains = os.cpu_count() if n_chains is None else n_chains
+    cutoffs = SQS_CUTOFFS if cutoffs is None else cutoffs
+
+    # a list of schedules gives every chain its own, otherwise they all share one
+    if temperatures is not None and isinstance(temperatures[0], (list, tuple, np.ndarray)):
+        assert len(temperatures) == n_chains, f"{len(temperatures)} temperature schedules for {n_chains} chains"
+        schedules = list(temperatures)
+    else:
+        schedules = [temperatures] * n_chains
+
+    seeds = np.random.SeedSequence(seed).spawn(n_chains)
+
+    logging.info(f"Running {n_chains} {feature_type} SQS chains of {mcmc_steps} steps per temperature")
+    with ProcessPoolExecutor(max_workers=max_workers or n_chains) as pool:
+        chains = pool.map(_run_sqs_chain,
+                          itertools.repeat(primitive_structure), itertools.repeat(feature_type),
+                          itertools.repeat(cutoffs), itertools.repeat(supercell_size),
+                          itertools.repeat(mcmc_steps), schedules, seeds)
+        candidates = sorted(itertools.chain.from_iterable(chains), key=lambda sqs: sqs.score)
+
+    best_sqs = remove_duplicate_sqs(candidates)
+    if best_sqs:
+        logging.info(f"{len(best_sqs)} distinct SQS out of {len(candidates)} candidates, best score {best_sqs[0].score}")
+    else:
+        logging.warning(f"No SQS candidates from {n_chains} {feature_type} chains")
+
+    return best_sqs if num_structures is None else best_sqs[:num_structures]
+
+
+def library_sqs(primitive_structure, feature_type: str="correlation", cutoffs=None,
+                supercell_size: int=SQS_SUPERCELL_SIZE, library_dir: str=DEFAULT_LIBRARY_DIR,
+                gcs_folder: str|None=None, **kwargs):
+    """
+    Get SQS from the library, generating and storing them with parallel_sqs when they are not there yet.
+
+    Args:
+        primitive_structure: disordered primitive structure
+        feature_type: "correlation" or "cluster-interaction"
+        cutoffs: cluster cutoffs, default SQS_CUTOFFS
+        supercell_size: supercell size in primitive cells
+        library_dir: local library directory
+        gcs_folder: folder of the shared library in GCS, None to only use the local library
+        kwargs: passed to parallel_sqs
+
+    Returns:
+        list: distinct SQS tuples, best score first
+    """
+    cutoffs = SQS_CUTOFFS if cutoffs is None else cutoffs
+
+    stored = load_sqs(primitive_structure, supercell_size, cutoffs, feature_type, library_dir, gcs_folder)
+    if stored is not None:
+        return [SQS(**sqs) for sqs in stored]
+
+    best_sqs = parallel_sqs(primitive_structure, feature_type, cutoffs=cutoffs, supercell_size=supercell_size, **kwargs)
+    store_sqs(primitive_structure, supercell_size, cutoffs, feature_type, best_sqs, library_dir, gcs_folder)
+
+    return best_sqs
+
+
+def template_sqs(primitive_structure, feature_type: str="correlation", library_dir: str=DEFAULT_LIBRARY_DIR,
+                 gcs_folder: str|None=None):
+    """
+    Get SQS for an alloy by relabeling stored abstract-species templates with the same fractions.
+
+    Only fraction vectors that have not been seen yet run a search (corr_sqs or cint_sqs), whose results are
+    stored as templates for every alloy with those fractions.
+
+    Args:
+        primitive_structure: disordered primitive structure
+        feature_type: "correlation" or "cluster-interaction"
+        library_dir: local library directory
+        gcs_folder: folder of the shared library in GCS, None to only use the local library
+
+    Returns:
+        list: (CompactStructure, score) tuples, best score first
+    """
+    args = (primitive_structure, SQS_SUPERCELL_SIZE, SQS_CUTOFFS, feature_type, library_dir, gcs_folder)
+
+    templates = load_sqs_templates(*args)
+    if templates is not None:
+        return templates
+
+    search = corr_sqs if feature_type == "correlation" else cint_sqs
+    sqs_list, _ = search(primitive_structure, SQS_CUTOFFS, SQS_SUPERCELL_SIZE)
+    store_sqs_templates(*args[:4], sqs_list, library_dir, gcs_folder)
+
+    return load_sqs_templates(*args)
+
+
+def pmg_sqs(struc, clusters=None, **kwargs):
 
-    clust={2: 7, 3: 5}
-    mcsqs_caller.run_mcsqs(structure = struc, clusters = clust)
+    clust = SQS_CUTOFFS if clusters is None else clusters
+    # stops once the mcsqs objective plateaus instead of after a fixed search time
+    return run_mcsqs_monitored(structure = struc, clusters = clust, **kwargs)
     
 
 if __name__ == '__main__':
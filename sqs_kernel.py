@@ -0,0 +1,480 @@
+from pymatgen.core.composition import Composition
+from pymatgen.core.structure import Structure
+
+import itertools
+import logging
+import numpy as np
+
+from compact_structure import CompactStructure
+from neighbor_list import neighbor_list, neighbor_shells
+from structure_utils import (
+    apportion_atoms, decoration_rng, estimate_lattice_parameter_bcc, estimate_lattice_parameter_fcc,
+    find_supercell_matrix, generate_random_decorations, get_most_common_element, get_supercell,
+    minimal_supercell_size, propose_bcc_cutoffs, propose_fcc_cutoffs, SPACE_GROUPS,
+)
+
+
+class ClusterOrbits:
+    """
+    The clusters of one order (pairs or triplets) of a supercell as integer index arrays.
+
+    Every cluster is a row of site indices.  Clusters are stored once per site they start from (pairs twice,
+    triplets three times), which does not change the cluster probabilities.  The clusters that contain a
+    site are listed in CSR form so a swap only touches those.
+
+    The sites of a cluster are in the canonical vertex order of its orbit, and vertex_classes marks the
+    vertices the orbit's symmetry can exchange (same class), e.g. [0, 0, 1] for the base and apex of an
+    isosceles triangle.
+    """
+
+    __slots__ = ("order", "sites", "orbit", "n_orbits", "diameters", "vertex_classes", "site_clusters", "site_start")
+
+    def __init__(self, sites, orbit, diameters, n_sites: int, vertex_classes=None):
+        """
+        Args:
+            sites: (n_clusters, order) site indices of each cluster, in the canonical vertex order
+            orbit: (n_clusters,) orbit index of each cluster
+            diameters: (n_orbits,) longest edge of the clusters of each orbit
+            n_sites: number of sites of the supercell
+            vertex_classes: (n_orbits, order) non-decreasing class of each vertex, vertices of one class are
+                equivalent.  Defaults to all vertices equivalent.
+        """
+        self.sites = np.asarray(sites, dtype=np.int64)
+        self.order = self.sites.shape[1]
+        self.orbit = np.asarray(orbit, dtype=np.int64)
+        self.diameters = np.asarray(diameters, dtype=float)
+        self.n_orbits = len(self.diameters)
+        self.vertex_classes = np.zeros((self.n_orbits, self.order), dtype=np.int64) if vertex_classes is None \
+            else np.asarray(vertex_classes, dtype=np.int64).reshape(self.n_orbits, self.order)
+
+        # clusters containing each site, a cluster with a site twice (small cells) is only listed once
+        n_clusters = len(self.sites)
+        pairs = np.unique(self.sites.ravel() * n_clusters + np.repeat(np.arange(n_clusters), self.order))
+        self.site_clusters = pairs % n_clusters
+        counts = np.bincount(pairs // n_clusters, minlength=n_sites)
+        self.site_start = np.concatenate([[0], np.cumsum(counts)])
+
+    def __repr__(self):
+        return f"ClusterOrbits(order {self.order}, {self.n_orbits} orbits, {len(self.sites)} clusters)"
+
+    def clusters_of(self, site: int):
+        """Indices of the clusters containing a site"""
+        return self.site_clusters[self.site_start[site]:self.site_start[site + 1]]
+
+
+def _shell_index(distances, shell_distances, tolerance):
+    return np.searchsorted(shell_distances + tolerance, distances)
+
+
+def cluster_orbits(lattice, frac_coords, cutoffs: dict, tolerance: float=1e-3):
+    """
+    Find the pair and triplet clusters of a supercell within the cutoffs and group them into orbits.
+
+    Pairs are grouped by neighbor shell, triplets by the shells of their three edges, which are the orbits of
+    the FCC and BCC lattices.  The vertices of a triplet are ordered by the shell of their opposite edge, so
+    only vertices with equally long opposite edges are equivalent.
+
+    Args:
+        lattice: 3x3 lattice matrix, rows are the lattice vectors
+        frac_coords: (n_sites, 3) fractional coordinates
+        cutoffs: {2: pair cutoff, 3: triplet cutoff}, e.g. from propose_fcc_cutoffs.  A triplet is included
+            when all of its edges are within the triplet cutoff.
+        tolerance: distances within this tolerance belong to the same shell
+
+    Returns:
+        dict: order -> ClusterOrbits
+    """
+    lattice = np.asarray(lattice, dtype=float)
+    frac_coords = np.asarray(frac_coords, dtype=float)
+    n_sites = len(frac_coords)
+    cutoffs = {int(order): float(cutoff) for order, cutoff in cutoffs.items()}
+    assert set(cutoffs) <= {2, 3}, "only pair and triplet clusters are supported"
+
+    i, j, offsets, distances = neighbor_list(lattice, frac_coords, max(cutoffs.values()) + tolerance)
+    sorted_distances = np.sort(distances)
+    shell_distances = sorted_distances[np.concatenate([[True], np.diff(sorted_distances) > tolerance])]
+    shell = _shell_index(distances, shell_distances, tolerance)
+
+    orbits = {}
+    if 2 in cutoffs:
+        keep = distances <= cutoffs[2] + tolerance
+        orbits[2] = ClusterOrbits(np.stack([i[keep], j[keep]], axis=1), shell[keep], shell_distances[:shell[keep].max() + 1],
+                                  n_sites)
+
+    if 3 in cutoffs:
+        keep = distances <= cutoffs[3] + tolerance
+        i, j, offsets, shell = i[keep], j[keep], offsets[keep], shell[keep]
+        positions = (frac_coords[j] + offsets) @ lattice
+
+        # every pair of neighbors (a, b) of a site i that are also within the cutoff of each other
+        counts = np.bincount(i, minlength=n_sites)
+        starts = np.cumsum(counts) - counts
+        sites, keys = [], []
+        for coordination in np.unique(counts[counts > 1]):
+            origins = np.nonzero(counts == coordination)[0]
+            first, second = np.triu_indices(coordination, 1)
+            a = (starts[origins][:, None] + first[None, :]).ravel()
+            b = (starts[origins][:, None] + second[None, :]).ravel()
+            edge = np.linalg.norm(positions[b] - positions[a], axis=1)
+            close = edge <= cutoffs[3] + tolerance
+            a, b, edge = a[close], b[close], edge[close]
+
+            # shell of the edge opposite each vertex: i faces (a, b), j[a] faces (i, b) and j[b] faces (i, a)
+            opposite = np.stack([_shell_index(edge, shell_distances, tolerance), shell[b], shell[a]], axis=1)
+            vertex_order = np.argsort(opposite, axis=1, kind='stable')
+            sites.append(np.take_along_axis(np.stack([i[a], j[a], j[b]], axis=1), vertex_order, axis=1))
+            keys.append(np.take_along_axis(opposite, vertex_order, axis=1))
+
+        sites = np.concatenate(sites)
+        orbit_keys, orbit = np.unique(np.concatenate(keys), axis=0, return_inverse=True)
+        # vertices facing edges of the same shell share a class
+        vertex_classes = np.concatenate([np.zeros((len(orbit_keys), 1), dtype=np.int64),
+                                         np.cumsum(np.diff(orbit_keys, axis=1) > 0, axis=1)], axis=1)
+        orbits[3] = ClusterOrbits(sites, orbit.ravel(), shell_distances[orbit_keys.max(axis=1)], n_sites, vertex_classes)
+
+    return orbits
+
+
+def _cluster_codes(cluster_species, n_species: int, classes=None):
+    # symmetrized cluster label: the species of the cluster as a base-n_species number, sorted among the
+    # equivalent vertices (the same vertex class, all vertices if no classes are given)
+    if classes is None:
+        cluster_species = np.sort(cluster_species, axis=-1)
+    else:
+        cluster_species = np.sort(classes * n_species + cluster_species, axis=-1) % n_species
+    code = np.zeros(cluster_species.shape[:-1], dtype=np.int64)
+    for column in range(cluster_species.shape[-1]):
+        code = code * n_species + cluster_species[..., column]
+    return code
+
+
+def cluster_counts(species, orbits: ClusterOrbits, n_species: int):
+    """
+    Count the clusters of each orbit by their species, symmetrized over the equivalent vertices.
+
+    Args:
+        species: (n_sites,) species indices
+        orbits: ClusterOrbits of one order
+        n_species: number of species
+
+    Returns:
+        np.ndarray: (n_orbits, n_species ** order) counts, indexed by the symmetrized cluster code
+    """
+    n_codes = n_species ** orbits.order
+    codes = _cluster_codes(np.asarray(species, dtype=np.int64)[orbits.sites], n_species,
+                           orbits.vertex_classes[orbits.orbit])
+    return np.bincount(orbits.orbit * n_codes + codes, minlength=orbits.n_orbits * n_codes).reshape(orbits.n_orbits, n_codes).astype(float)
+
+
+def random_cluster_probabilities(concentrations, order: int, vertex_classes=None):
+    """
+    Probability of each symmetrized species combination in a cluster of a perfectly random alloy.
+
+    Args:
+        concentrations: (n_species,) concentrations
+        order: cluster order
+        vertex_classes: (n_orbits, order) vertex classes of the orbits (ClusterOrbits.vertex_classes), all
+            vertices equivalent if not given
+
+    Returns:
+        np.ndarray: (n_species ** order,) probabilities, or (n_orbits, n_species ** order) with vertex_classes,
+            indexed by the symmetrized cluster code and 0 for non-canonical codes
+    """
+    concentrations = np.asarray(concentrations, dtype=float)
+    n_species = len(concentrations)
+    n_codes = n_species ** order
+
+    # every ordered decoration of the cluster, collected on its symmetrized code
+    decorations = np.array(list(itertools.product(range(n_species), repeat=order)), dtype=np.int64)
+    weights = np.prod(concentrations[decorations], axis=1)
+    if vertex_classes is None:
+        return np.bincount(_cluster_codes(decorations, n_species), weights, minlength=n_codes)
+    return np.array([np.bincount(_cluster_codes(decorations, n_species, classes), weights, minlength=n_codes)
+                     for classes in np.asarray(vertex_classes, dtype=np.int64)]).reshape(-1, n_codes)
+
+
+def _orbit_norms(orbits: ClusterOrbits):
+    return np.bincount(orbits.orbit, minlength=orbits.n_orbits).astype(float)[:, None]
+
+
+def sqs_objective(counts, norms, targets, weights):
+    """
+    Weighted squared distance of the cluster probabilities from those of the random alloy.
+
+    The cluster probabilities, symmetrized only over the vertices each orbit can exchange, span the same space
+    as the cluster correlation functions, so a zero objective is a perfect SQS for the orbits included.
+
+    Args:
+        counts: {order: (n_orbits, n_codes) cluster counts}
+        norms: {order: (n_orbits, 1) number of clusters of each orbit}
+        targets: {order: (n_orbits, n_codes) random-alloy probabilities}
+        weights: {order: (n_orbits,) weight of each orbit}
+
+    Returns:
+        float: objective
+    """
+    return sum(float(weights[order] @ np.sum((counts[order] / norms[order] - targets[order]) ** 2, axis=1))
+               for order in counts)
+
+
+def sqs_monte_carlo(species, orbits: dict, n_species: int|None=None, n_steps: int=20000, weights=None,
+                    temperatures=(1e-3, 1e-6), rng: np.random.Generator|None=None):
+    """
+    Species-swap simulated annealing toward the cluster statistics of a random alloy.
+
+    The cluster counts are kept up to date incrementally: a swap of sites u and v only changes the clusters
+    that contain u or v, so a step costs O(clusters touching the two sites) instead of O(n_sites).
+
+    Args:
+        species: (n_sites,) initial species indices, the composition is kept fixed
+        orbits: {order: ClusterOrbits} from cluster_orbits
+        n_species: number of species, defaults to the largest species index + 1
+        n_steps: number of swap attempts
+        weights: {order: (n_orbits,) weights}, defaults to 1 for every orbit
+        temperatures: (start, end) of the geometric annealing schedule, in objective units
+        rng: random number generator, see decoration_rng
+
+    Returns:
+        tuple: (best species array, its objective)
+    """
+    rng = rng or decoration_rng()
+    species = np.array(species, dtype=np.int64)
+    n_sites = len(species)
+    n_species = int(species.max()) + 1 if n_species is None else n_species
+    concentrations = np.bincount(species, minlength=n_species) / n_sites
+
+    weights = {order: np.ones(orbit.n_orbits) if weights is None else np.asarray(weights[order], dtype=float)
+               for order, orbit in orbits.items()}
+    targets = {order: random_cluster_probabilities(concentrations, order, orbit.vertex_classes)
+               for order, orbit in orbits.items()}
+    norms = {order: _orbit_norms(orbit) for order, orbit in orbits.items()}
+    counts = {order: cluster_counts(species, orbit, n_species) for order, orbit in orbits.items()}
+    objective = sqs_objective(counts, norms, targets, weights)
+
+    best_species, best_objective = species.copy(), objective
+    temperature = np.geomspace(temperatures[0], temperatures[1], n_steps)
+    sites = rng.integers(n_sites, size=(n_steps, 2))
+    thresholds = rng.random(n_steps)
+
+    for step in range(n_steps):
+        u, v = sites[step]
+        a, b = species[u], species[v]
+        if a == b:
+            continue
+
+        trial = {}
+        for order, orbit in orbits.items():
+            # clusters containing u, and those containing v but not u (so none is counted twice)
+            of_v = orbit.clusters_of(v)
+            clusters = np.concatenate([orbit.clusters_of(u), of_v[~(orbit.sites[of_v] == u).any(axis=1)]])
+
+            cluster_sites = orbit.sites[clusters]
+            before = species[cluster_sites]
+            after = np.where(cluster_sites == u, b, np.where(cluster_sites == v, a, before))
+
+            n_codes = n_species ** order
+            cluster_orbit = orbit.orbit[clusters]
+            classes = orbit.vertex_classes[cluster_orbit]
+            offset = cluster_orbit * n_codes
+            delta = (np.bincount(offset + _cluster_codes(after, n_species, classes), minlength=counts[order].size)
+                     - np.bincount(offset + _cluster_codes(before, n_species, classes), minlength=counts[order].size))
+            trial[order] = counts[order] + delta.reshape(counts[order].shape)
+
+        trial_objective = sqs_objective(trial, norms, targets, weights)
+
+        change = trial_objective - objective
+        if change <= 0 or thresholds[step] < np.exp(-change / temperature[step]):
+            species[u], species[v] = b, a
+            counts, objective = trial, trial_objective
+            if objective < best_objective:
+                best_species, best_objective = species.copy(), objective
+                if best_objective == 0:
+                    break
+
+    return best_species.astype(np.uint8), best_objective
+
+
+def generate_sqs(composition: Composition, crystal: str, total_atoms=100, cutoffs: dict|None=None,
+                 lattice_parameter: float|None=None, n_steps: int|None=None, weights=None,
+                 temperatures=(1e-3, 1e-6), rng: np.random.Generator|None=None):
+    """
+    Create an SQS of an exact-size FCC or BCC supercell with the native cluster Monte Carlo.
+
+    Args:
+        composition: composition of the alloy (fractions)
+        crystal: "fcc" or "bcc"
+        total_atoms: exact number of sites
+        cutoffs: {2: pair cutoff, 3: triplet cutoff}, from propose_fcc_cutoffs / propose_bcc_cutoffs if not given
+        lattice_parameter: lattice parameter, estimated from the most common element if not given
+        n_steps: number of swap attempts, defaults to 200 per site
+        weights: {order: (n_orbits,) weights} of the orbits in the objective
+        temperatures: (start, end) of the annealing schedule
+        rng: random number generator, see decoration_rng
+
+    Returns:
+        tuple: (CompactStructure, objective)
+    """
+    crystal = crystal.lower()
+    assert crystal in SPACE_GROUPS, f"{crystal} is not a valid crystal type. Valid crystal types are fcc, bcc."
+    rng = rng or decoration_rng()
+
+    lattice_parameter = _lattice_parameter(composition, crystal, lattice_parameter)
+
+    lattice, frac_coords = get_supercell(crystal, lattice_parameter, find_supercell_matrix(crystal, total_atoms),
+                                         primitive=True)
+    if cutoffs is None:
+        propose_cutoffs = propose_fcc_cutoffs if crystal == "fcc" else propose_bcc_cutoffs
+        cutoffs = propose_cutoffs(Structure(lattice, ["Cu"] * len(frac_coords), frac_coords))
+    orbits = cluster_orbits(lattice, frac_coords, cutoffs)
+
+    comp_dict = composition.fractional_composition.get_el_amt_dict()
+    elements = list(comp_dict.keys())
+    counts = apportion_atoms(list(comp_dict.values()), len(frac_coords))
+    initial = generate_random_decorations(counts, 1, rng)[0]
+
+    species, objective = sqs_monte_carlo(initial, orbits, len(elements), n_steps=n_steps or 200 * len(frac_coords),
+                                         weights=weights, temperatures=temperatures, rng=rng)
+    logging.debug(f"SQS objective for {composition.reduced_formula} on {len(frac_coords)} sites: {objective}")
+
+    return CompactStructure(lattice, frac_coords, species, elements), objective
+
+
+def sqs_error(structure, cutoffs: dict, composition: Composition|None=None, weights=None):
+    """
+    Cluster-probability error of any ordered structure, the objective of sqs_monte_carlo.
+
+    Gives one metric for SQS from every engine (smol, mcsqs, this kernel), whatever their own score.
+
+    Args:
+        structure: CompactStructure or ordered pymatgen Structure
+        cutoffs: {2: pair cutoff, 3: triplet cutoff}
+        composition: composition the structure should represent, defaults to the composition of the structure.
+            Elements missing from the structure count against it.
+        weights: {order: (n_orbits,) weights}, defaults to 1 for every orbit
+
+    Returns:
+        float: objective, 0 for a perfect SQS
+    """
+    if not isinstance(structure, CompactStructure):
+        structure = CompactStructure.from_pymatgen(structure)
+    orbits = cluster_orbits(structure.lattice, structure.frac_coords, cutoffs)
+
+    if composition is None:
+        elements, species = structure.elements, structure.species.astype(np.int64)
+        concentrations = structure.counts / len(structure)
+    else:
+        comp_dict = composition.fractional_composition.get_el_amt_dict()
+        elements = list(comp_dict)
+        index = {el: n for n, el in enumerate(elements)}
+        species = np.array([index[el] for el in structure.symbols], dtype=np.int64)
+        concentrations = np.array(list(comp_dict.values()))
+    n_species = len(elements)
+
+    counts = {order: cluster_counts(species, orbit, n_species) for order, orbit in orbits.items()}
+    norms = {order: _orbit_norms(orbit) for order, orbit in orbits.items()}
+    targets = {order: random_cluster_probabilities(concentrations, order, orbit.vertex_classes)
+               for order, orbit in orbits.items()}
+    weights = {order: np.ones(orbit.n_orbits) if weights is None else np.asarray(weights[order], dtype=float)
+               for order, orbit in orbits.items()}
+    return sqs_objective(counts, norms, targets, weights)
+
+
+def _lattice_parameter(composition: Composition, crystal: str, lattice_parameter: float|None):
+    if lattice_parameter is not None:
+        return lattice_parameter
+    el = get_most_common_element(composition)
+    estimate = estimate_lattice_parameter_fcc if crystal == "fcc" else estimate_lattice_parameter_bcc
+    return estimate(el.atomic_radius)
+
+
+def _padded_cutoff(distance: float, shells):
+    # halfway between the shell at distance and the next one, so every code includes the same clusters
+    n = int(np.argmin(np.abs(shells - distance)))
+    return float((shells[n] + shells[n + 1]) / 2)
+
+
+def select_sqs_parameters(composition: Composition, crystal: str, target_error: float=1e-3,
+                          lattice_parameter: float|None=None, max_pair_shells: int=3, sizes=None,
+                          max_atoms: int=256, steps_per_site: int=50, n_trials: int=3,
+                          rng: np.random.Generator|None=None):
+    """
+    Choose the smallest cluster cutoffs and supercell size whose SQS reach a target accuracy.
+
+    The cutoffs start from propose_fcc_cutoffs / propose_bcc_cutoffs: the triplet cutoff is their second
+    shell, and the pair cutoff their first shell, extended by up to max_pair_shells - 1 further shells.  Each
+    cutoff is moved halfway to the next shell so every code includes the same clusters.  Supercell sizes are
+    multiples of minimal_supercell_size, so the composition is represented.
+
+    For each size, smallest first, and each pair cutoff, smallest first, n_trials short sqs_monte_carlo trials
+    are run from different random decorations.  Each result is scored with sqs_error over all max_pair_shells
+    pair shells, and the candidate is judged by the median error of its trials.  The first candidate within
+    target_error is returned: larger cutoffs only add orbits and Monte Carlo cost once the far shells come out
+    right anyway, and more components need larger cells rather than larger cutoffs.  The trials are
+    stochastic, so a candidate close to target_error can still pass or fail depending on rng.
+
+    Args:
+        composition: composition of the alloy (fractions)
+        crystal: "fcc" or "bcc"
+        target_error: largest acceptable median sqs_error over the reference cutoffs
+        lattice_parameter: lattice parameter, estimated from the most common element if not given
+        max_pair_shells: largest number of pair shells, also the pair shells of the reference error
+        sizes: candidate numbers of sites, default multiples of the minimal size from 16 to max_atoms
+        max_atoms: largest supercell of the default sizes
+        steps_per_site: swap attempts per site of the trial runs
+        n_trials: number of trials per candidate
+        rng: random number generator, see decoration_rng
+
+    Returns:
+        tuple: (cutoffs {2: pair cutoff, 3: triplet cutoff}, number of sites, median trial error).  Without a
+            candidate within target_error, the candidate with the smallest error.
+    """
+    crystal = crystal.lower()
+    assert crystal in SPACE_GROUPS, f"{crystal} is not a valid crystal type. Valid crystal types are fcc, bcc."
+    rng = rng or decoration_rng()
+    a = _lattice_parameter(composition, crystal, lattice_parameter)
+
+    comp_dict = composition.fractional_composition.get_el_amt_dict()
+    fractions = list(comp_dict.values())
+    if sizes is None:
+        step = minimal_supercell_size(fractions)
+        sizes = np.unique(step * np.ceil(np.geomspace(16, max(max_atoms, 16), 12) / step).astype(int))
+        sizes = sizes[sizes <= max(max_atoms, step)]
+
+    # the shells do not depend on the supercell, read them from the conventional cell
+    lattice, frac_coords = get_supercell(crystal, a, [1, 1, 1])
+    propose_cutoffs = propose_fcc_cutoffs if crystal == "fcc" else propose_bcc_cutoffs
+    proposed = propose_cutoffs(Structure(lattice, ["Cu"] * len(frac_coords), frac_coords))
+    shells, _ = neighbor_shells(lattice, frac_coords, max_pair_shells + 2)
+    first_pair_shell = int(np.argmin(np.abs(shells - proposed[2])))
+    pair_cutoffs = [_padded_cutoff(distance, shells)
+                    for distance in shells[first_pair_shell:first_pair_shell + max_pair_shells]]
+    triplet_cutoff = _padded_cutoff(proposed[3], shells)
+
+    best = None
+    for total_atoms in sizes:
+        lattice, frac_coords = get_supercell(crystal, a, find_supercell_matrix(crystal, int(total_atoms)), primitive=True)
+
+        reference = {2: pair_cutoffs[-1], 3: triplet_cutoff}
+        reference_orbits = cluster_orbits(lattice, frac_coords, reference)
+        initial = generate_random_decorations(apportion_atoms(fractions, int(total_atoms)), n_trials, rng)
+
+        for n_shells, pair_cutoff in enumerate(pair_cutoffs, start=1):
+            cutoffs = {2: pair_cutoff, 3: triplet_cutoff}
+            orbits = reference_orbits if n_shells == max_pair_shells else cluster_orbits(lattice, frac_coords, cutoffs)
+            errors = []
+            for decoration in initial:
+                species, _ = sqs_monte_carlo(decoration, orbits, len(fractions), n_steps=steps_per_site * int(total_atoms),
+                                             rng=rng)
+                structure = CompactStructure(lattice, frac_coords, species, list(comp_dict))
+                errors.append(sqs_error(structure, reference, composition))
+            error = float(np.median(errors))
+            logging.debug(f"SQS trials {total_atoms} sites, {n_shells} pair shells: median error {error:.3g}")
+
+            if best is None or error < best[2]:
+                best = (cutoffs, int(total_atoms), error)
+            if error <= target_error:
+                return cutoffs, int(total_atoms), error
+
+    logging.warning(f"No SQS parameters reach an error of {target_error} for {composition.reduced_formula}, "
+                    f"using {best[1]} sites with error {best[2]:.3g}")
+    return best
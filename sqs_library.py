@@ -0,0 +1,422 @@
+from pymatgen.core.structure import Structure
+
+from fractions import Fraction
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import numpy as np
+
+from compact_structure import CompactStructure
+from neighbor_list import neighbor_list
+from structure_fingerprint import unique_structure_indices
+
+
+# local library directory, shared by every job on the machine
+DEFAULT_LIBRARY_DIR = os.environ.get("SQS_LIBRARY_DIR", "sqs_library")
+
+# folder of the shared library in the GCS bucket
+DEFAULT_GCS_FOLDER = "sqs_library/"
+
+# number of SQS kept per key
+MAX_ENTRIES = 20
+
+# site occupancies are matched as fractions with at most this denominator, e.g. 0.1795 -> 7/39
+MAX_DENOMINATOR = 1000
+
+# attempts to update a shared library entry that other workers keep changing
+GCS_UPDATE_ATTEMPTS = 5
+
+
+def _lattice_signature(structure: Structure, decimals: int=3):
+    # lattice lengths in units of the size per site, angles and site positions: independent of the lattice parameter
+    spacing = np.cbrt(structure.volume / len(structure))
+    lengths = np.round(np.array(structure.lattice.abc) / spacing, decimals)
+    angles = np.round(structure.lattice.angles, decimals - 1)
+    frac_coords = np.round(structure.frac_coords % 1.0, decimals) % 1.0
+    return [lengths.tolist(), angles.tolist(), frac_coords.tolist()]
+
+
+def _composition_signature(structure: Structure):
+    # rational occupancy of every site, e.g. [[["Co", "1/4"], ["Cr", "1/4"], ...]]
+    return [
+        [[el, str(Fraction(amt).limit_denominator(MAX_DENOMINATOR))] for el, amt in sorted(site.species.get_el_amt_dict().items())]
+        for site in structure
+    ]
+
+
+@functools.cache
+def _cutoff_shells(lattice: tuple, frac_coords: tuple, cutoffs: tuple, tolerance: float):
+    cutoffs = dict(cutoffs)
+    _, _, _, distances = neighbor_list(np.array(lattice), np.array(frac_coords), max(cutoffs.values()) + tolerance)
+    distances = np.sort(distances)
+    shells = distances[np.concatenate([[True], np.diff(distances) > tolerance])] if len(distances) else distances
+    return {int(order): int(np.sum(shells <= cutoff + tolerance)) for order, cutoff in sorted(cutoffs.items())}
+
+
+def cutoff_shells(structure: Structure, cutoffs: dict, tolerance: float=1e-3):
+    """
+    Express cluster cutoffs as the number of neighbor shells they include.
+
+    SQS with the same number of shells per cluster order are the same for any lattice parameter, so the
+    library stays valid when the lattice parameter estimate changes.  Cached per lattice, so repeated
+    lookups of the same parent are cheap.
+
+    Args:
+        structure: disordered primitive structure
+        cutoffs: cluster cutoffs {order: diameter in angstrom} as passed to the SQS generators
+
+    Returns:
+        dict: order -> number of shells within the cutoff
+    """
+    lattice = tuple(map(tuple, structure.lattice.matrix.tolist()))
+    frac_coords = tuple(map(tuple, structure.frac_coords.tolist()))
+    return dict(_cutoff_shells(lattice, frac_coords, tuple(sorted(cutoffs.items())), tolerance))
+
+
+def sqs_key(primitive_structure: Structure, supercell_size: int, cutoffs: dict, feature_type: str):
+    """
+    Args:
+        primitive_structure: disordered primitive structure
+        supercell_size: supercell size in primitive cells
+        cutoffs: cluster cutoffs {order: diameter}
+        feature_type: "correlation" or "cluster-interaction"
+
+    Returns:
+        tuple: (key dict, file name of the library entry)
+    """
+    key = {
+        "lattice": _lattice_signature(primitive_structure),
+        "composition": _composition_signature(primitive_structure),
+        "supercell_size": int(supercell_size),
+        "cutoff_shells": cutoff_shells(primitive_structure, cutoffs),
+        "feature_type": feature_type,
+    }
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return key, f"sqs_{digest}.json"
+
+
+def _parse_entry(text: str, key: dict, source: str):
+    # an empty or truncated file (e.g. an interrupted download) is a miss
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as err:
+        logging.warning(f"SQS library entry {source} is not valid JSON, ignoring it: {err}")
+        return None
+    if json.loads(json.dumps(key)) != data["key"]:
+        logging.warning(f"SQS library entry {source} does not match its key, ignoring it")
+        return None
+    return data["entries"]
+
+
+def _read_entry(path: str, key: dict):
+    with open(path) as f:
+        return _parse_entry(f.read(), key, path)
+
+
+def _merge_entries(entries, stored, structure_of, max_entries: int):
+    # best max_entries distinct entries of both lists, ranked by score
+    entries = sorted(list(entries) + list(stored or []), key=lambda entry: entry["score"])
+    structures = [structure_of(entry) for entry in entries]
+    return [entries[n] for n in unique_structure_indices(structures)][:max_entries]
+
+
+def _write_entry(path: str, key: dict, entries):
+    # write to a temporary file and rename, so concurrent jobs never read a partial file
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp', delete=False) as f:
+        json.dump({"key": key, "entries": entries}, f)
+    os.replace(f.name, path)
+
+
+def _gcs_get(name: str, library_dir: str, gcs_folder: str):
+    from gcp_utils import gs
+
+    try:
+        path = gs.get(name, path=os.path.join(library_dir, name), folder=gcs_folder)
+    except Exception as err:
+        logging.warning(f"Could not read {name} from the shared SQS library: {err}")
+        return None
+    return path if path and os.path.exists(path) else None
+
+
+def _gcs_update(path: str, name: str, key: dict, gcs_folder: str, merge):
+    # read-merge-write of a shared entry.  The upload only succeeds if nobody replaced the object since it was
+    # read (generation precondition, 0 if it did not exist), otherwise the entry is read and merged again.
+    from gcp_utils import gs
+    from google.api_core.exceptions import PreconditionFailed
+
+    try:
+        for _ in range(GCS_UPDATE_ATTEMPTS):
+            blob = gs.ref(name, load=True, folder=gcs_folder)
+            generation = blob.generation or 0
+            stored = _parse_entry(blob.download_as_text(if_generation_match=generation), key, gs.loc(blob)) \
+                if generation else None
+
+            entries = merge(stored)
+            _write_entry(path, key, entries)
+            try:
+                blob.upload_from_filename(path, if_generation_match=generation)
+            except PreconditionFailed:
+                logging.debug(f"{name} changed in the shared SQS library while merging, retrying")
+                continue
+            return entries
+        logging.warning(f"Could not store {name} in the shared SQS library: it kept changing")
+    except Exception as err:
+        logging.warning(f"Could not store {name} in the shared SQS library: {err}")
+    return None
+
+
+def _find_entry(name: str, library_dir: str, gcs_folder: str|None):
+    # local path of a library entry, downloading it from the shared library if it is only there
+    path = os.path.join(library_dir, name)
+    if os.path.exists(path):
+        return path
+    if gcs_folder is None:
+        return None
+    os.makedirs(library_dir, exist_ok=True)
+    return _gcs_get(name, library_dir, gcs_folder)
+
+
+def load_sqs(primitive_structure: Structure, supercell_size: int, cutoffs: dict, feature_type: str,
+             library_dir: str=DEFAULT_LIBRARY_DIR, gcs_folder: str|None=None):
+    """
+    Look up stored SQS, first in the local library and then in the shared GCS library.
+
+    Args:
+        primitive_structure: disordered primitive structure the SQS is generated for
+        supercell_size: supercell size in primitive cells
+        cutoffs: cluster cutoffs {order: diameter}
+        feature_type: "correlation" or "cluster-interaction"
+        library_dir: local library directory
+        gcs_folder: folder of the shared library in GCS, None to only use the local library
+
+    Returns:
+        list: dicts with structure (scaled to the volume of primitive_structure), score, feature_distance and
+            supercell_matrix, best score first, or None if the SQS is not in the library
+    """
+    key, name = sqs_key(primitive_structure, supercell_size, cutoffs, feature_type)
+    path = _find_entry(name, library_dir, gcs_folder)
+    if path is None:
+        return None
+
+    entries = _read_entry(path, key)
+    if not entries:
+        return None
+    logging.info(f"Found {len(entries)} SQS in the library ({name})")
+
+    volume_per_site = primitive_structure.volume / len(primitive_structure)
+    sqs_list = []
+    for entry in entries:
+        structure = Structure.from_dict(entry["structure"])
+        structure.scale_lattice(volume_per_site * len(structure))
+        sqs_list.append({
+            "structure": structure,
+            "score": entry["score"],
+            "feature_distance": np.array(entry["feature_distance"]),
+            "supercell_matrix": np.array(entry["supercell_matrix"]),
+        })
+    return sqs_list
+
+
+def store_sqs(primitive_structure: Structure, supercell_size: int, cutoffs: dict, feature_type: str, sqs_list,
+              library_dir: str=DEFAULT_LIBRARY_DIR, gcs_folder: str|None=None, max_entries: int=MAX_ENTRIES):
+    """
+    Store SQS with their scores, merged with what is already in the library.
+
+    Args:
+        primitive_structure: disordered primitive structure the SQS was generated for
+        supercell_size: supercell size in primitive cells
+        cutoffs: cluster cutoffs {order: diameter}
+        feature_type: "correlation" or "cluster-interaction"
+        sqs_list: SQS tuples or dicts with structure, score, feature_distance and supercell_matrix
+        library_dir: local library directory
+        gcs_folder: folder of the shared library in GCS, None to only store locally
+        max_entries: number of best distinct SQS kept
+
+    Returns:
+        str: path of the local library entry
+    """
+    key, name = sqs_key(primitive_structure, supercell_size, cutoffs, feature_type)
+    path = os.path.join(library_dir, name)
+
+    entries = []
+    for sqs in sqs_list:
+        sqs = sqs if isinstance(sqs, dict) else sqs._asdict()
+        entries.append({
+            "structure": sqs["structure"].as_dict(),
+            "score": float(sqs["score"]),
+            "feature_distance": np.asarray(sqs["feature_distance"]).tolist(),
+            "supercell_matrix": np.asarray(sqs["supercell_matrix"]).tolist(),
+        })
+
+    structure_of = lambda entry: Structure.from_dict(entry["structure"])
+    stored = _read_entry(path, key) if os.path.exists(path) else None
+    entries = _merge_entries(entries, stored, structure_of, max_entries)
+    _write_entry(path, key, entries)
+
+    # merge with what other workers stored in the shared library, so their entries are kept
+    if gcs_folder is not None:
+        local = entries
+        entries = _gcs_update(path, name, key, gcs_folder,
+                              lambda shared: _merge_entries(local, shared, structure_of, max_entries)) or entries
+    logging.info(f"Stored {len(entries)} SQS in the library ({name})")
+
+    return path
+
+
+# templates of abstract-species SQS, loaded once per process: file name -> list of template dicts
+_TEMPLATES = {}
+
+
+def species_order(primitive_structure: Structure):
+    """
+    Map the elements of a disordered parent onto abstract species 0, 1, ... by decreasing fraction.
+
+    Elements with the same fraction are interchangeable in an SQS, so any order between them is fine.
+
+    Args:
+        primitive_structure: disordered parent structure with the same occupancy on every site
+
+    Returns:
+        tuple: (element symbols in abstract species order, their rational fractions as strings)
+    """
+    occupancies = _composition_signature(primitive_structure)
+    assert all(occupancy == occupancies[0] for occupancy in occupancies), \
+        "SQS templates need the same occupancy on every site"
+
+    order = sorted(occupancies[0], key=lambda item: (-Fraction(item[1]), item[0]))
+    return [el for el, _ in order], [fraction for _, fraction in order]
+
+
+def template_key(primitive_structure: Structure, supercell_size: int, cutoffs: dict, feature_type: str):
+    """
+    Args:
+        primitive_structure: disordered primitive structure
+        supercell_size: supercell size in primitive cells
+        cutoffs: cluster cutoffs {order: diameter}
+        feature_type: "correlation" or "cluster-interaction"
+
+    Returns:
+        tuple: (key dict, file name of the template entry).  The key holds the sorted fraction vector, not
+            the elements, so every alloy with the same fractions shares it.
+    """
+    _, fractions = species_order(primitive_structure)
+    key = {
+        "lattice": _lattice_signature(primitive_structure),
+        "fractions": fractions,
+        "supercell_size": int(supercell_size),
+        "cutoff_shells": cutoff_shells(primitive_structure, cutoffs),
+        "feature_type": feature_type,
+    }
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return key, f"sqs_template_{digest}.json"
+
+
+def _load_templates(path: str, name: str, key: dict):
+    if name not in _TEMPLATES:
+        entries = _read_entry(path, key)
+        if not entries:
+            return None
+        templates = []
+        for entry in entries:
+            template = {
+                "lattice": np.array(entry["lattice"]),
+                "frac_coords": np.array(entry["frac_coords"]),
+                "species": np.array(entry["species"], dtype=np.uint8),
+                "score": entry["score"],
+            }
+            for value in template.values():
+                if isinstance(value, np.ndarray):
+                    value.setflags(write=False)
+            templates.append(template)
+        _TEMPLATES[name] = templates
+    return _TEMPLATES[name]
+
+
+def load_sqs_templates(primitive_structure: Structure, supercell_size: int, cutoffs: dict, feature_type: str,
+                       library_dir: str=DEFAULT_LIBRARY_DIR, gcs_folder: str|None=None):
+    """
+    Instantiate stored abstract-species SQS for a concrete alloy.
+
+    After the first lookup of a fraction vector the templates are held in memory, and an alloy is built by
+    relabeling the species and rescaling the lattice, sharing the template arrays.
+
+    Args:
+        primitive_structure: disordered primitive structure of the alloy
+        supercell_size: supercell size in primitive cells
+        cutoffs: cluster cutoffs {order: diameter}
+        feature_type: "correlation" or "cluster-interaction"
+        library_dir: local library directory
+        gcs_folder: folder of the shared library in GCS, None to only use the local library
+
+    Returns:
+        list: (CompactStructure, score) tuples, best score first, or None if the fractions are not stored
+    """
+    key, name = template_key(primitive_structure, supercell_size, cutoffs, feature_type)
+    if name not in _TEMPLATES:
+        path = _find_entry(name, library_dir, gcs_folder)
+        if path is None:
+            return None
+        if _load_templates(path, name, key) is None:
+            return None
+
+    elements, _ = species_order(primitive_structure)
+    scale = np.cbrt(primitive_structure.volume / len(primitive_structure))
+    return [(CompactStructure(scale * template["lattice"], template["frac_coords"], template["species"], elements),
+             template["score"]) for template in _TEMPLATES[name]]
+
+
+def store_sqs_templates(primitive_structure: Structure, supercell_size: int, cutoffs: dict, feature_type: str,
+                        sqs_list, library_dir: str=DEFAULT_LIBRARY_DIR, gcs_folder: str|None=None,
+                        max_entries: int=MAX_ENTRIES):
+    """
+    Store SQS of a concrete alloy as abstract-species templates for every alloy with the same fractions.
+
+    Args:
+        primitive_structure: disordered primitive structure the SQS was generated for
+        supercell_size: supercell size in primitive cells
+        cutoffs: cluster cutoffs {order: diameter}
+        feature_type: "correlation" or "cluster-interaction"
+        sqs_list: SQS tuples or dicts with an ordered structure and a score
+        library_dir: local library directory
+        gcs_folder: folder of the shared library in GCS, None to only store locally
+        max_entries: number of best templates kept
+
+    Returns:
+        str: path of the local template entry
+    """
+    key, name = template_key(primitive_structure, supercell_size, cutoffs, feature_type)
+    path = os.path.join(library_dir, name)
+    elements, _ = species_order(primitive_structure)
+    label = {el: n for n, el in enumerate(elements)}
+
+    entries = []
+    for sqs in sqs_list:
+        sqs = sqs if isinstance(sqs, dict) else sqs._asdict()
+        structure = sqs["structure"]
+        # unit volume per site, abstract species labels
+        scale = np.cbrt(structure.volume / len(structure))
+        entries.append({
+            "lattice": (structure.lattice.matrix / scale).tolist(),
+            "frac_coords": structure.frac_coords.tolist(),
+            "species": [label[site.specie.symbol] for site in structure],
+            "score": float(sqs["score"]),
+        })
+
+    structure_of = lambda entry: CompactStructure(entry["lattice"], entry["frac_coords"], entry["species"], elements)
+    stored = _read_entry(path, key) if os.path.exists(path) else None
+    entries = _merge_entries(entries, stored, structure_of, max_entries)
+    _write_entry(path, key, entries)
+
+    # merge with the templates other workers stored in the shared library
+    if gcs_folder is not None:
+        local = entries
+        entries = _gcs_update(path, name, key, gcs_folder,
+                              lambda shared: _merge_entries(local, shared, structure_of, max_entries)) or entries
+    _TEMPLATES.pop(name, None)
+    logging.info(f"Stored {len(entries)} SQS templates for fractions {key['fractions']} ({name})")
+
+    return path
@@ -0,0 +1,294 @@
+"""
+Binary archive of structures that share a parent lattice.
+
+An archive is a directory holding the parent lattice and site positions once, plus the species of every
+structure as uint8 arrays and optionally small float16 Cartesian displacements from the parent sites:
+
+    header.json                 elements, number of sites and structures, chunk size
+    lattice.npy                 (3, 3) lattice, rows are the lattice vectors
+    frac_coords.npy             (n_sites, 3) fractional coordinates of the parent sites
+    species_00000.npy           (chunk_size, n_sites) uint8 species indices into the elements
+    displacements_00000.npy     (chunk_size, n_sites, 3) float16 Cartesian displacements in angstrom (optional)
+
+Chunks are plain .npy files, so they are memory-mapped on read and a structure is loaded by index without
+reading the rest.  POSCAR files are only written on export, with POSCAR_generator.write_poscar.
+
+    with ArchiveWriter("campaign", lattice, frac_coords, ["Co", "Cr", "Fe", "Ni"]) as archive:
+        archive.extend(decorations)
+    archive = StructureArchive("campaign")
+    structure = archive[12345]
+"""
+import json
+import os
+import tempfile
+import numpy as np
+
+from compact_structure import CompactStructure
+from POSCAR_generator import write_poscar
+
+
+FORMAT_VERSION = 1
+
+# structures per chunk file
+DEFAULT_CHUNK_SIZE = 4096
+
+HEADER = "header.json"
+
+
+def _chunk_path(path: str, name: str, chunk: int):
+    return os.path.join(path, f"{name}_{chunk:05d}.npy")
+
+
+def _save(path: str, array):
+    # write to a temporary file and rename, so readers never see a partial chunk or header
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp', delete=False) as f:
+        np.save(f, array)
+    os.replace(f.name, path)
+
+
+class ArchiveWriter:
+    """
+    Write structures of one parent lattice to an archive, chunk by chunk.
+
+    Appends to an existing archive with the same lattice, sites and elements.  Use as a context manager or
+    call close(), the header is only updated when a chunk is flushed.
+    """
+
+    def __init__(self, path: str, lattice, frac_coords, elements, chunk_size: int=DEFAULT_CHUNK_SIZE,
+                 displacements: bool=False):
+        """
+        Args:
+            path: archive directory
+            lattice: 3x3 parent lattice, rows are the lattice vectors
+            frac_coords: (n_sites, 3) fractional coordinates of the parent sites
+            elements: element symbol of each species index
+            chunk_size: structures per chunk file, ignored when appending
+            displacements: store per-site displacements (float16, angstrom)
+        """
+        self.path = path
+        self.lattice = np.asarray(lattice, dtype=float).reshape(3, 3)
+        self.frac_coords = np.asarray(frac_coords, dtype=float).reshape(-1, 3)
+        self.elements = [str(el) for el in elements]
+        assert len(self.elements) <= 256, "species are stored as uint8"
+
+        if os.path.exists(os.path.join(path, HEADER)):
+            header = _read_header(path)
+            if header["elements"] != self.elements or header["n_sites"] != len(self.frac_coords) \
+                    or header["displacements"] != displacements \
+                    or not np.allclose(np.load(os.path.join(path, "lattice.npy")), self.lattice) \
+                    or not np.allclose(np.load(os.path.join(path, "frac_coords.npy")), self.frac_coords):
+                raise ValueError(f"{path} holds an archive of a different parent structure")
+            self.chunk_size = header["chunk_size"]
+            self.displacements = header["displacements"]
+            self.n_structures = header["n_structures"]
+        else:
+            os.makedirs(path, exist_ok=True)
+            _save(os.path.join(path, "lattice.npy"), self.lattice)
+            _save(os.path.join(path, "frac_coords.npy"), self.frac_coords)
+            self.chunk_size = chunk_size
+            self.displacements = displacements
+            self.n_structures = 0
+
+        # reopen a partly filled last chunk, it is rewritten when the buffer is flushed
+        self._species = []
+        self._displacements = []
+        partial = self.n_structures % self.chunk_size
+        if partial:
+            chunk = self.n_structures // self.chunk_size
+            self._species = list(np.load(_chunk_path(path, "species", chunk)))
+            if self.displacements:
+                self._displacements = list(np.load(_chunk_path(path, "displacements", chunk)))
+            self.n_structures -= partial
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_structures + len(self._species)
+
+    def append(self, species, displacements=None):
+        """
+        Args:
+            species: (n_sites,) species indices
+            displacements: (n_sites, 3) Cartesian displacements from the parent sites in angstrom, only for
+                archives with displacements (zeros if not given)
+        """
+        species = np.asarray(species, dtype=np.uint8)
+        assert species.shape == (len(self.frac_coords),), f"species of shape {species.shape} for {len(self.frac_coords)} sites"
+        if displacements is not None and not self.displacements:
+            raise ValueError("this archive does not store displacements")
+
+        self._species.append(species)
+        if self.displacements:
+            self._displacements.append(np.zeros((len(species), 3), dtype=np.float16) if displacements is None
+                                       else np.asarray(displacements, dtype=np.float16).reshape(-1, 3))
+        if len(self._species) == self.chunk_size:
+            self.flush()
+
+    def extend(self, species, displacements=None):
+        """
+        Args:
+            species: (n_structures, n_sites) species indices, e.g. from generate_random_decorations
+            displacements: (n_structures, n_sites, 3) displacements, see append
+        """
+        for n, decoration in enumerate(species):
+            self.append(decoration, None if displacements is None else displacements[n])
+
+    def append_structure(self, structure: CompactStructure):
+        """Append a CompactStructure on the parent lattice, its site shifts become the displacements"""
+        index = {el: n for n, el in enumerate(self.elements)}
+        species = np.array([index[el] for el in structure.elements], dtype=np.uint8)[structure.species]
+        if not self.displacements:
+            self.append(species)
+            return
+        shift = structure.frac_coords - self.frac_coords
+        shift -= np.round(shift)
+        self.append(species, shift @ self.lattice)
+
+    def flush(self):
+        """Write the buffered structures to their chunk and update the header"""
+        if not self._species:
+            return
+        chunk = self.n_structures // self.chunk_size
+        _save(_chunk_path(self.path, "species", chunk), np.stack(self._species))
+        if self.displacements:
+            _save(_chunk_path(self.path, "displacements", chunk), np.stack(self._displacements))
+
+        count = len(self._species)
+        _write_header(self.path, {
+            "format": "structure_archive", "version": FORMAT_VERSION, "elements": self.elements,
+            "n_sites": len(self.frac_coords), "n_structures": self.n_structures + count,
+            "chunk_size": self.chunk_size, "displacements": self.displacements,
+        })
+
+        # a full chunk is done, a partial one stays buffered so further appends rewrite it
+        if count == self.chunk_size:
+            self.n_structures += count
+            self._species, self._displacements = [], []
+
+    def close(self):
+        self.flush()
+
+
+def _read_header(path: str):
+    with open(os.path.join(path, HEADER)) as f:
+        header = json.load(f)
+    if header.get("format") != "structure_archive" or header.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"{path} is not a structure archive this version can read")
+    return header
+
+
+def _write_header(path: str, header: dict):
+    with tempfile.NamedTemporaryFile('w', dir=os.path.abspath(path), suffix='.tmp', delete=False) as f:
+        json.dump(header, f, indent=2)
+    os.replace(f.name, os.path.join(path, HEADER))
+
+
+class StructureArchive:
+    """
+    Read-only random access to an archive.  Chunks are memory-mapped on first use.
+    """
+
+    def __init__(self, path: str, mmap: bool=True):
+        """
+        Args:
+            path: archive directory
+            mmap: memory-map the chunks instead of reading them into memory
+        """
+        self.path = path
+        header = _read_header(path)
+        self.elements = header["elements"]
+        self.n_sites = header["n_sites"]
+        self.n_structures = header["n_structures"]
+        self.chunk_size = header["chunk_size"]
+        self.has_displacements = header["displacements"]
+        self.lattice = np.load(os.path.join(path, "lattice.npy"))
+        self.frac_coords = np.load(os.path.join(path, "frac_coords.npy"))
+        self._mmap_mode = 'r' if mmap else None
+        self._chunks = {}
+
+    def __len__(self):
+        return self.n_structures
+
+    def __repr__(self):
+        return f"StructureArchive({self.path}, {self.n_structures} structures of {self.n_sites} sites)"
+
+    def _chunk(self, name: str, chunk: int):
+        key = (name, chunk)
+        if key not in self._chunks:
+            self._chunks[key] = np.load(_chunk_path(self.path, name, chunk), mmap_mode=self._mmap_mode)
+        return self._chunks[key]
+
+    def _locate(self, index: int):
+        if index < 0:
+            index += self.n_structures
+        if not 0 <= index < self.n_structures:
+            raise IndexError(f"structure {index} out of range for an archive of {self.n_structures}")
+        return divmod(index, self.chunk_size)
+
+    def species(self, index: int):
+        """(n_sites,) uint8 species indices of a structure"""
+        chunk, row = self._locate(index)
+        return self._chunk("species", chunk)[row]
+
+    def displacements(self, index: int):
+        """(n_sites, 3) Cartesian displacements of a structure in angstrom, None if the archive has none"""
+        if not self.has_displacements:
+            return None
+        chunk, row = self._locate(index)
+        return self._chunk("displacements", chunk)[row]
+
+    def species_chunks(self):
+        """
+        Yields:
+            (n, n_sites) species arrays of each chunk, for bulk analysis without building structures
+        """
+        for chunk in range(-(-self.n_structures // self.chunk_size)):
+            yield self._chunk("species", chunk)
+
+    def __getitem__(self, index: int):
+        """
+        Returns:
+            CompactStructure: the structure, sharing the parent arrays when it has no displacements
+        """
+        chunk, row = self._locate(index)
+        species = np.array(self._chunk("species", chunk)[row])
+        frac_coords = self.frac_coords
+        if self.has_displacements:
+            displacement = self._chunk("displacements", chunk)[row].astype(float)
+            if displacement.any():
+                frac_coords = frac_coords + np.linalg.solve(self.lattice.T, displacement.T).T
+        return CompactStructure(self.lattice, frac_coords, species, self.elements)
+
+    def __iter__(self):
+        for index in range(self.n_structures):
+            yield self[index]
+
+    def write_poscar(self, index: int, file, comment: str|None=None):
+        """Stream one structure as POSCAR text to a file handle or buffer"""
+        structure = self[index]
+        write_poscar(structure, file, comment or f"{structure.formula} {index}")
+
+    def export_poscar(self, directory: str, indices=None, prefix: str="POSCAR_"):
+        """
+        Write structures as POSCAR files, one at a time.
+
+        Args:
+            directory: output directory
+            indices: structures to export, default all
+            prefix: file name prefix, followed by the structure index
+
+        Returns:
+            list: paths of the written files
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for index in range(self.n_structures) if indices is None else indices:
+            path = os.path.join(directory, f"{prefix}{index}")
+            with open(path, 'w') as f:
+                self.write_poscar(index, f)
+            paths.append(path)
+        return paths
@@ -0,0 +1,144 @@
+from pymatgen.analysis.structure_matcher import StructureMatcher
+
+import logging
+import math
+import numpy as np
+
+from compact_structure import CompactStructure
+from neighbor_list import neighbor_list
+from short_range_order import pair_counts
+
+
+# neighbor count cutoffs in units of the mean interatomic spacing (volume per atom) ** (1/3).  They sit in the
+# gaps between the ideal shells of FCC (1.12, 1.59, 1.94) and BCC (1.09, 1.26, 1.78), so every shell keeps
+# its neighbors until a distance moves by about 5 %.
+FINGERPRINT_CUTOFFS = (1.19, 1.42, 1.68)
+
+
+def structure_fingerprint(structure, cutoffs=FINGERPRINT_CUTOFFS, volume_tolerance: float|None=None,
+                          decimals: int=6, _pair_cache=None):
+    """
+    Cheap symmetry-invariant fingerprint of an ordered structure.
+
+    The fingerprint is the reduced composition, the number of neighbor pairs of each species pair within
+    each cutoff per site (invariant to site order, cell choice and supercell size), and optionally a bucket
+    of the volume per atom.  The cutoffs scale with the volume per atom and lie between the ideal FCC and
+    BCC shells, so relaxed copies of a structure keep its fingerprint as long as no neighbor distance moves
+    across a cutoff (distortions up to about 5 % of the neighbor distance).  Different fingerprints then
+    mean the structures can not match, so full matching is only needed within a fingerprint.  Structures
+    distorted beyond that can land in different buckets even though StructureMatcher would match them.
+
+    Args:
+        structure: CompactStructure or ordered pymatgen Structure
+        cutoffs: increasing neighbor cutoffs in units of the mean interatomic spacing
+        volume_tolerance: relative width of the volume-per-atom buckets, None to leave the volume out.  Only
+            use it with StructureMatcher(scale=False), the default matcher scales the volumes.
+        decimals: rounding of the per-site pair counts
+        _pair_cache: dict reused between calls so structures on the same lattice share the neighbor search
+
+    Returns:
+        tuple: hashable fingerprint
+    """
+    if not isinstance(structure, CompactStructure):
+        structure = CompactStructure.from_pymatgen(structure)
+
+    # relabel with only the present elements in alphabetical order, so the element table order does not matter
+    elements, species = np.unique(structure.symbols.astype(str), return_inverse=True)
+    n_sites = len(species)
+
+    counts = np.bincount(species, minlength=len(elements))
+    divisor = np.gcd.reduce(counts)
+    composition = tuple((str(el), int(n // divisor)) for el, n in zip(elements, counts))
+
+    cutoffs = np.asarray(cutoffs, dtype=float)
+    key = (structure.lattice.tobytes(), structure.frac_coords.tobytes(), cutoffs.tobytes())
+    pairs = None if _pair_cache is None else _pair_cache.get(key)
+    if pairs is None:
+        spacing = np.cbrt(structure.volume / n_sites)
+        i, j, _, distances = neighbor_list(structure.lattice, structure.frac_coords, cutoffs[-1] * spacing)
+        pairs = i, j, np.searchsorted(cutoffs * spacing, distances, side='right')
+        if _pair_cache is not None:
+            _pair_cache[key] = pairs
+    i, j, shell = pairs
+
+    histogram = pair_counts(species, i, j, shell, len(elements), len(cutoffs))[0] / n_sites
+    histogram = tuple(float(x) for x in np.round(histogram, decimals).ravel())
+
+    if volume_tolerance is None:
+        return composition, histogram
+
+    volume_bucket = math.floor(math.log(structure.volume / n_sites) / math.log1p(volume_tolerance))
+    return composition, histogram, volume_bucket
+
+
+def group_by_fingerprint(structures, cutoffs=FINGERPRINT_CUTOFFS, volume_tolerance: float|None=None):
+    """
+    Partition structures into buckets of equal fingerprint.
+
+    Args:
+        structures: CompactStructures or ordered pymatgen Structures
+        cutoffs: neighbor cutoffs of the fingerprint, see structure_fingerprint
+        volume_tolerance: relative width of the volume buckets, see structure_fingerprint
+
+    Returns:
+        dict: fingerprint -> list of indices into structures, in input order
+    """
+    buckets = {}
+    pair_cache = {}
+    for n, structure in enumerate(structures):
+        fingerprint = structure_fingerprint(structure, cutoffs, volume_tolerance, _pair_cache=pair_cache)
+        buckets.setdefault(fingerprint, []).append(n)
+    return buckets
+
+
+def unique_structure_indices(structures, matcher: StructureMatcher|None=None, cutoffs=FINGERPRINT_CUTOFFS,
+                             volume_tolerance: float|None=None):
+    """
+    Find the distinct structures, running StructureMatcher only between structures with the same fingerprint.
+
+    This replaces matching every structure against every other with a linear fingerprint pass plus matching
+    within the (usually tiny) buckets.
+
+    Args:
+        structures: pymatgen Structures or CompactStructures
+        matcher: StructureMatcher used within a bucket, default StructureMatcher()
+        cutoffs: neighbor cutoffs of the fingerprint, see structure_fingerprint
+        volume_tolerance: relative width of the volume buckets, only for a matcher with scale=False
+
+    Returns:
+        list: sorted indices of the first structure of each group of equivalent structures
+    """
+    structures = list(structures)
+    matcher = StructureMatcher() if matcher is None else matcher
+    buckets = group_by_fingerprint(structures, cutoffs, volume_tolerance)
+
+    unique = []
+    for indices in buckets.values():
+        if len(indices) == 1:
+            unique.append(indices[0])
+            continue
+
+        candidates = [structures[n] for n in indices]
+        candidates = [s.to_pymatgen() if isinstance(s, CompactStructure) else s for s in candidates]
+        position = {id(s): n for n, s in zip(indices, candidates)}
+        for group in matcher.group_structures(candidates):
+            unique.append(min(position[id(s)] for s in group))
+
+    logging.debug(f"{len(unique)} distinct structures out of {len(structures)} in {len(buckets)} fingerprint buckets")
+    return sorted(unique)
+
+
+def remove_duplicate_structures(structures, matcher: StructureMatcher|None=None, cutoffs=FINGERPRINT_CUTOFFS,
+                                volume_tolerance: float|None=None):
+    """
+    Args:
+        structures: pymatgen Structures or CompactStructures
+        matcher: StructureMatcher used within a fingerprint bucket
+        cutoffs: neighbor cutoffs of the fingerprint, see structure_fingerprint
+        volume_tolerance: relative width of the volume buckets, only for a matcher with scale=False
+
+    Returns:
+        list: the distinct structures, keeping the first of each group in input order
+    """
+    structures = list(structures)
+    return [structures[n] for n in unique_structure_indices(structures, matcher, cutoffs, volume_tolerance)]
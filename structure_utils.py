@@ -5,10 +5,16 @@ from pymatgen.core import Species
 from pymatgen.core.periodic_table import Element
 from pymatgen.symmetry.groups import SpaceGroup
 
+import functools
 import math
 import numpy as np
 import logging
 
+from compact_structure import CompactStructure
+from element_properties import element_property
+from neighbor_list import neighbor_shells
+from short_range_order import shell_pairs
+
 
 def is_stoichiometric(comp: Composition):
     """Check if the composition is stoichiometric (integer proportions or equiatomic). 
@@ -64,7 +70,6 @@ def adjust_equiatomic_composition(comp: Composition):
     """
     #TODO: verify that everything adds up to 1'ish
     #TODO: verify that any partial fractional compositions do not add up to be more than 1
-    #TODO: make sure every atom gets used at least once...small fractions sometimes omit thos atoms in a smaller supercell
 
     # Initialize a dictionary to hold the element proportions
     element_proportions = {}
@@ -107,7 +112,7 @@ def estimate_lattice_parameter_fcc(average_radius: float):
     """
     For FCC, the lattice parameter is the side of the cube with an atom in the center of the face, and an atom on the corner.
     So, the diagonal across the face is 1/2 atom on the corner, a full atom and another 1/2 atom at the other corner.
-    So, 2 atoms across the diagonal of the face.  Solve for the side of the cube:
+    So, 2 atoms (4 radii) across the diagonal of the face, sqrt(2) * a = 4 * r.  Solve for the side of the cube:
 
     Args:
         average_radius: average radius of the atoms in the lattice
@@ -115,13 +120,13 @@ def estimate_lattice_parameter_fcc(average_radius: float):
     Return:
         lattice parameter of the composition assumming FCC in same units as average_radius
     """
-    return average_radius * np.sqrt(2)
+    return 2 * np.sqrt(2) * average_radius
 
 def estimate_lattice_parameter_bcc(average_radius: float):
     """
     For BCC, the lattice parameter is the side of a cube with an atom in the middle of the cube, and an atom on the corner.
-    So, the diagonal across the interior of the cube is 1/2 atom each corner plus one in the middle, so 2 atoms across the diagonal.
-    Solve for the side of the cube:
+    So, the diagonal across the interior of the cube is 1/2 atom each corner plus one in the middle, so 2 atoms (4 radii)
+    across the diagonal, sqrt(3) * a = 4 * r.  Solve for the side of the cube:
 
     Args:
         average_radius: average radius of the atoms in the lattice
@@ -130,33 +135,150 @@ def estimate_lattice_parameter_bcc(average_radius: float):
         lattice parameter of the composition assumming bcc in same units as average_radius
     
     """
-    return 2*average_radius / np.sqrt(3)
+    return 4 * average_radius / np.sqrt(3)
 
-def get_weighted_average_radius_for_material(comp: Composition):
-    atomic_radius = 0.0
+def estimate_lattice_parameters(fractions, elements, crystal: str, radius: str="atomic_radius"):
+    """
+    Vegard's-law lattice parameter estimates for a batch of compositions.
+
+    The lattice parameter of each composition is the fraction-weighted average of the lattice parameters of
+    its elements in the given crystal, i.e. the estimate for the fraction-weighted average radius.
+
+    Args:
+        fractions: (n_compositions, n_elements) atomic fractions, see element_properties.fraction_matrix
+        elements: element symbol of each column
+        crystal: "fcc" or "bcc"
+        radius: element radius to use, "atomic_radius" or "metallic_radius"
+
+    Returns:
+        np.ndarray: (n_compositions,) lattice parameters in Angstroms
+    """
+    fractions = np.asarray(fractions, dtype=float)
+    fractions = fractions / fractions.sum(axis=-1, keepdims=True)
+    average_radius = fractions @ element_property(radius, elements)
+
+    if crystal.lower() == "fcc":
+        return estimate_lattice_parameter_fcc(average_radius)
+    elif crystal.lower() == "bcc":
+        return estimate_lattice_parameter_bcc(average_radius)
+    raise ValueError(f"{crystal} is not a valid crystal type. Valid crystal types are fcc, bcc.")
+
+def _composition_arrays(comp: Composition):
+    # element symbols and atomic fractions of a composition
+    comp_dict = comp.fractional_composition.get_el_amt_dict()
+    return list(comp_dict.keys()), np.array(list(comp_dict.values()))
 
-    # for each element in a composition, construct an element object and extract its radius
-    for element in comp.elements:
-        logging.debug(f"{element.symbol} atomic radius is {element.atomic_radius} with atomic fraction {comp.get_atomic_fraction(element)}")
-        atomic_radius += element.atomic_radius * comp.get_atomic_fraction(element)
+def get_weighted_average_radius_for_material(comp: Composition):
+    elements, fractions = _composition_arrays(comp)
+    atomic_radius = float(fractions @ element_property("atomic_radius", elements))
 
-    logging.info(f"Weighted Average Atomic radius for {comp} is {atomic_radius}")
+    logging.debug(f"Weighted Average Atomic radius for {comp} is {atomic_radius}")
     return atomic_radius
 
 def get_largest_element(comp: Composition):
-    max_radius = 0
-    for element in comp.elements:
-        if element.atomic_radius > max_radius:
-            max_radius = element.atomic_radius
+    elements, _ = _composition_arrays(comp)
+    max_radius = float(element_property("atomic_radius", elements).max())
 
-    logging.info(f"Maximum Atomic radius for {comp} is {max_radius}")
+    logging.debug(f"Maximum Atomic radius for {comp} is {max_radius}")
 
     return max_radius
 
 def get_most_common_element(comp: Composition):
-    comp_dict = comp.to_reduced_dict
+    comp_dict = comp.get_el_amt_dict()
     return Element(max(comp_dict, key=comp_dict.get))
 
+def apportion_atoms(fractions, total_atoms, ensure_present: bool=True):
+    """
+    Split a number of sites between the elements of one or more compositions (largest remainder method).
+
+    Every element first gets the integer part of its quota (fraction * total_atoms), then the sites that are
+    left go to the elements with the largest fractional remainders, so the counts always add up to total_atoms
+    and no element is ever more than one atom away from its quota.
+
+    Args:
+        fractions: (n_elements,) or (n_compositions, n_elements) atomic fractions.  Rows are normalized.
+        total_atoms: number of sites, a single int or one per composition
+        ensure_present: give every element with a non-zero fraction at least one atom (when there are enough
+            sites), taking it from the element that is furthest above its quota
+
+    Returns:
+        np.ndarray: integer atom counts with the same shape as fractions
+    """
+    fractions = np.asarray(fractions, dtype=float)
+    single = fractions.ndim == 1
+    fractions = np.atleast_2d(fractions)
+    fractions = fractions / fractions.sum(axis=1, keepdims=True)
+    n_compositions, n_elements = fractions.shape
+
+    total_atoms = np.broadcast_to(np.asarray(total_atoms, dtype=int), (n_compositions,))[:, None]
+    quotas = fractions * total_atoms
+    counts = np.floor(quotas).astype(int)
+
+    # hand out the remaining sites in order of decreasing remainder
+    remaining = total_atoms[:, 0] - counts.sum(axis=1)
+    order = np.argsort(-(quotas - counts), axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(n_elements), order.shape), axis=1)
+    counts += ranks < remaining[:, None]
+
+    if ensure_present:
+        present = fractions > 0
+        enough_sites = total_atoms[:, 0] >= present.sum(axis=1)
+        rows = np.arange(n_compositions)
+        for _ in range(n_elements):
+            missing = present & (counts == 0) & enough_sites[:, None]
+            needs_atom = missing.any(axis=1)
+            if not needs_atom.any():
+                break
+            receiver = np.argmax(missing, axis=1)
+            surplus = np.where(counts > 1, counts - quotas, -np.inf)
+            donor = np.argmax(surplus, axis=1)
+            counts[rows[needs_atom], receiver[needs_atom]] += 1
+            counts[rows[needs_atom], donor[needs_atom]] -= 1
+
+    return counts[0] if single else counts
+
+
+def minimal_supercell_size(fractions, tolerance: float=0.01, sizes=None, ensure_present: bool=True):
+    """
+    Find the smallest number of sites that represents one or more compositions to within a tolerance.
+
+    This is a rational approximation of the composition with a common denominator: with a tolerance of 0
+    an exactly representable composition such as Al0.5CoCrFeNi (1/9, 2/9, ...) returns its exact size (9).
+    Compositions that cannot be represented within the tolerance by any candidate size get the candidate
+    size with the smallest error.
+
+    Args:
+        fractions: (n_elements,) or (n_compositions, n_elements) atomic fractions
+        tolerance: maximum allowed deviation of any element's fraction from its target
+        sizes: candidate numbers of sites, tried in increasing order.  Defaults to n_elements..500.
+        ensure_present: require every element with a non-zero fraction to have at least one atom
+
+    Returns:
+        int or np.ndarray: smallest acceptable number of sites for each composition
+    """
+    fractions = np.asarray(fractions, dtype=float)
+    single = fractions.ndim == 1
+    fractions = np.atleast_2d(fractions)
+    fractions = fractions / fractions.sum(axis=1, keepdims=True)
+
+    if sizes is None:
+        sizes = np.arange(fractions.shape[1], 501)
+    sizes = np.sort(np.asarray(sizes, dtype=int))
+
+    errors = np.empty((len(fractions), len(sizes)))
+    for n, size in enumerate(sizes):
+        counts = apportion_atoms(fractions, size, ensure_present=ensure_present)
+        errors[:, n] = np.abs(counts / size - fractions).max(axis=1)
+
+    # small slack so that exact fractions are not lost to floating point error
+    acceptable = errors <= tolerance + 1e-9
+    best = np.where(acceptable.any(axis=1), np.argmax(acceptable, axis=1), np.argmin(errors, axis=1))
+    result = sizes[best]
+
+    return int(result[0]) if single else result
+
+
 def calculate_fcc_scaling_factors(total_atoms):
     """
     Calculate the scaling factors for an FCC structure to achieve a target number of atoms.
@@ -203,9 +325,24 @@ def calculate_bcc_scaling_factors(total_atoms):
     # The scaling factors for x, y, and z are the same for a cubic supercell
     return (num_unit_cells, num_unit_cells, num_unit_cells)
 
+def get_neighbor_shells(structure: Structure, n_shells: int=2):
+    """
+    Distances of the first n_shells neighbor shells of a structure, from the cell-list neighbor engine.
+
+    Parameters:
+    - structure (Structure): Structure to analyse.  Only the site positions are used, so disordered
+      structures work too.
+    - n_shells (int): Number of shells.
+
+    Returns:
+    - list: Shell distances in increasing order.
+    """
+    shell_distances, _ = neighbor_shells(structure.lattice.matrix, structure.frac_coords, n_shells)
+    return [float(d) for d in shell_distances]
+
 def propose_fcc_cutoffs(structure: Structure):
     """
-    Propose cutoff values for pairs and triplets in an FCC lattice based on the lattice parameter.
+    Propose cutoff values for pairs and triplets in an FCC lattice based on its neighbor shells.
     
     Parameters:
     - structure: Structure: The full FCC structure.
@@ -214,14 +351,9 @@ def propose_fcc_cutoffs(structure: Structure):
     - dict: Dictionary with proposed cutoff values for pairs and triplets.
     """
 
-    # Get the lattice parameter from the structure
-    lattice_parameter = structure.lattice.a
-    
-    # Nearest neighbor (NN) distance
-    nn_distance = lattice_parameter / (2**0.5)
-    
-    # Second nearest neighbor distance is equal to the lattice parameter
-    second_nn_distance = lattice_parameter
+    # Read the neighbor shells from the actual structure (works for conventional, primitive and supercells)
+    # First shell is the nearest neighbor (NN) distance a/sqrt(2), second shell is the lattice parameter
+    nn_distance, second_nn_distance = get_neighbor_shells(structure, 2)
     
     # Propose cutoffs: For pairs, use the NN distance.
     # For triplets, use the second NN distance to ensure inclusion of these interactions.
@@ -234,7 +366,7 @@ def propose_fcc_cutoffs(structure: Structure):
 
 def propose_bcc_cutoffs(structure: Structure):
     """
-    Propose cutoff values for pairs and triplets in a BCC lattice based on the lattice parameter.
+    Propose cutoff values for pairs and triplets in a BCC lattice based on its neighbor shells.
     
     Parameters:
     - structure (Structure): The full BCC structure.
@@ -242,14 +374,9 @@ def propose_bcc_cutoffs(structure: Structure):
     Returns:
     - dict: Dictionary with proposed cutoff values for pairs and triplets.
     """
-    # Get the lattice parameter from the structure
-    lattice_parameter = structure.lattice.a
-
-    # Nearest neighbor (NN) distance
-    nn_distance = (lattice_parameter * (3**0.5)) / 2
-    
-    # Second nearest neighbor distance is equal to the lattice parameter
-    second_nn_distance = lattice_parameter
+    # Read the neighbor shells from the actual structure (works for conventional, primitive and supercells)
+    # First shell is the nearest neighbor (NN) distance a*sqrt(3)/2, second shell is the lattice parameter
+    nn_distance, second_nn_distance = get_neighbor_shells(structure, 2)
     
     # Propose cutoffs: For pairs, use the NN distance.
     # For triplets, use the second NN distance to ensure inclusion of these interactions.
@@ -261,7 +388,273 @@ def propose_bcc_cutoffs(structure: Structure):
     return cutoffs
 
 
-def create_random_supercell_structure(composition: Composition, crystal: str, total_atoms=100 ):
+# fractional positions of the sites in the conventional cubic cell of each crystal type
+CONVENTIONAL_BASIS = {
+    "fcc": np.array([[0.0, 0.0, 0.0], [0.0, 0.5, 0.5], [0.5, 0.0, 0.5], [0.5, 0.5, 0.0]]),
+    "bcc": np.array([[0.0, 0.0, 0.0], [0.5, 0.5, 0.5]]),
+}
+
+SPACE_GROUPS = {"fcc": "Fm-3m", "bcc": "Im-3m"}
+
+
+def _supercell_matrix_key(scaling):
+    """Normalize scaling factors (3 ints or a 3x3 matrix) into a hashable 3x3 tuple"""
+    matrix = np.array(scaling, dtype=int)
+    if matrix.ndim == 1:
+        matrix = np.diag(matrix)
+    return tuple(map(tuple, matrix))
+
+
+def lattice_points_in_supercell(supercell_matrix):
+    """
+    Find the lattice points of the unit cell that fall inside a supercell.
+
+    Args:
+        supercell_matrix: 3x3 integer matrix, rows are the supercell vectors in units of the unit cell vectors
+
+    Returns:
+        np.ndarray: (det, 3) fractional coordinates of the lattice points in the supercell
+    """
+    matrix = np.array(supercell_matrix, dtype=float)
+    n_points = int(round(abs(np.linalg.det(matrix))))
+
+    # bounding box of the supercell in unit cell coordinates
+    corners = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)]) @ matrix
+    lower = np.floor(corners.min(axis=0)).astype(int)
+    upper = np.ceil(corners.max(axis=0)).astype(int)
+    grid = np.mgrid[lower[0]:upper[0] + 1, lower[1]:upper[1] + 1, lower[2]:upper[2] + 1].reshape(3, -1).T
+
+    frac_coords = grid @ np.linalg.inv(matrix)
+    tol = 1e-8
+    inside = np.all((frac_coords > -tol) & (frac_coords < 1 - tol), axis=1)
+    frac_coords = frac_coords[inside]
+
+    assert len(frac_coords) == n_points, f"found {len(frac_coords)} lattice points, expected {n_points}"
+    return frac_coords
+
+
+@functools.cache
+def _primitive_template(crystal: str):
+    # derive the primitive cell once with a placeholder element at a realistic lattice parameter
+    # (the primitive cell search uses absolute tolerances) and normalize it to a lattice parameter of 1
+    a = 4.0
+    structure = Structure.from_spacegroup(SPACE_GROUPS[crystal], Lattice.cubic(a), ["Cu"], [[0, 0, 0]])
+    primitive_structure = structure.get_primitive_structure()
+
+    lattice = primitive_structure.lattice.matrix / a
+    frac_coords = primitive_structure.frac_coords.copy()
+    lattice.setflags(write=False)
+    frac_coords.setflags(write=False)
+
+    return lattice, frac_coords
+
+
+@functools.cache
+def _supercell_template(crystal: str, matrix_key, primitive: bool):
+    matrix = np.array(matrix_key, dtype=float)
+    if primitive:
+        unit_lattice, unit_basis = _primitive_template(crystal)
+    else:
+        unit_lattice, unit_basis = np.eye(3), CONVENTIONAL_BASIS[crystal]
+
+    points = lattice_points_in_supercell(matrix)
+    basis = unit_basis @ np.linalg.inv(matrix)
+
+    # same site ordering as pymatgen make_supercell: every image of basis site 0, then site 1, ...
+    frac_coords = (basis[:, None, :] + points[None, :, :]).reshape(-1, 3) % 1.0
+    frac_coords[np.isclose(frac_coords, 1.0)] = 0.0
+    lattice = matrix @ unit_lattice
+    frac_coords.setflags(write=False)
+    lattice.setflags(write=False)
+
+    return lattice, frac_coords
+
+
+def get_supercell_template(crystal: str, scaling_factors, primitive: bool=False):
+    """
+    Get the cached lattice and site positions of an FCC or BCC supercell with a lattice parameter of 1.
+
+    The template is computed once per crystal type and supercell shape, scaling it to any lattice parameter
+    is a single multiplication of the lattice.  The returned arrays are read-only and shared between callers.
+
+    Args:
+        crystal: "fcc" or "bcc"
+        scaling_factors: (nx, ny, nz) scaling of the unit cell or a 3x3 supercell matrix
+        primitive: scale the primitive cell (one site) instead of the conventional cubic cell
+
+    Returns:
+        tuple: (3x3 lattice matrix for a=1, (n_sites, 3) fractional coordinates)
+    """
+    return _supercell_template(crystal.lower(), _supercell_matrix_key(scaling_factors), primitive)
+
+
+def get_supercell(crystal: str, lattice_parameter: float, scaling_factors, primitive: bool=False):
+    """
+    Get the lattice and site positions of an FCC or BCC supercell from the template cache.
+
+    Args:
+        crystal: "fcc" or "bcc"
+        lattice_parameter: cubic lattice parameter of the conventional cell
+        scaling_factors: (nx, ny, nz) scaling of the unit cell or a 3x3 supercell matrix
+        primitive: scale the primitive cell (one site) instead of the conventional cubic cell
+
+    Returns:
+        tuple: (3x3 lattice matrix, (n_sites, 3) fractional coordinates)
+    """
+    unit_lattice, frac_coords = get_supercell_template(crystal, scaling_factors, primitive)
+    return float(lattice_parameter) * unit_lattice, frac_coords
+
+
+def _cubic_deviation(matrices, unit_lattice):
+    # distance of each supercell (normalized to unit volume) from a cube aligned with the cartesian axes
+    lattices = matrices @ unit_lattice
+    volumes = np.abs(np.linalg.det(lattices))
+    normalized = lattices / np.cbrt(volumes)[:, None, None]
+    return np.linalg.norm(normalized - np.eye(3), axis=(1, 2))
+
+
+@functools.cache
+def _find_supercell_matrix(crystal: str, n_sites: int, search_range: int):
+    unit_lattice, _ = _primitive_template(crystal)
+    sign = np.sign(np.linalg.det(unit_lattice))
+
+    # integer matrix closest to a perfect cube with n_sites primitive cells
+    edge = np.cbrt(n_sites * abs(np.linalg.det(unit_lattice)))
+    base = np.rint(edge * np.linalg.inv(unit_lattice)).astype(int)
+
+    best_matrix, best_score = None, np.inf
+    steps = np.arange(-search_range, search_range + 1, dtype=np.int8)
+    n_candidates = len(steps) ** 9
+    chunk_size = 200000
+    for start in range(0, n_candidates, chunk_size):
+        # decode candidate indices into 9 offsets in -search_range..search_range
+        index = np.arange(start, min(start + chunk_size, n_candidates))
+        digits = (index[:, None] // len(steps) ** np.arange(9)[::-1]) % len(steps)
+        matrices = base[None, :, :] + steps[digits].reshape(-1, 3, 3)
+
+        dets = np.rint(np.linalg.det(matrices.astype(float))).astype(int)
+        matrices = matrices[dets * sign == n_sites]
+        if len(matrices) == 0:
+            continue
+
+        scores = _cubic_deviation(matrices, unit_lattice)
+        n = np.argmin(scores)
+        if scores[n] < best_score - 1e-12:
+            best_matrix, best_score = matrices[n], scores[n]
+
+    # always possible: a diagonal supercell from a factorization of n_sites
+    for nx in range(1, n_sites + 1):
+        if n_sites % nx:
+            continue
+        for ny in range(1, n_sites // nx + 1):
+            if (n_sites // nx) % ny:
+                continue
+            matrix = np.diag([nx, ny, int(sign) * (n_sites // nx // ny)])
+            score = _cubic_deviation(matrix[None], unit_lattice)[0]
+            if score < best_score - 1e-12:
+                best_matrix, best_score = matrix, score
+
+    return tuple(map(tuple, best_matrix)), best_score
+
+
+def find_supercell_matrix(crystal: str, n_sites: int, max_search_range: int=2, max_deviation: float=1.0):
+    """
+    Find the most compact, near-cubic supercell of the primitive FCC or BCC cell with exactly n_sites sites.
+
+    Integer matrices close to the ideal cube of n_sites primitive cells are scored by how far the supercell
+    (normalized to unit volume) is from a cube, and the best one with the right number of sites wins.
+    Diagonal factorizations of n_sites are always considered, so a matrix is found for any n_sites.
+    The search starts with every matrix element within 1 of the ideal cube (3^9 matrices) and widens, up to
+    max_search_range, while the best cell deviates more than max_deviation from a cube.
+    Results are cached per (crystal, n_sites).
+
+    Args:
+        crystal: "fcc" or "bcc"
+        n_sites: exact number of sites in the supercell
+        max_search_range: largest change of each matrix element from the ideal cube that is searched
+        max_deviation: cubic deviation that is good enough to stop widening the search
+
+    Returns:
+        np.ndarray: 3x3 integer supercell matrix relative to the primitive cell, see get_supercell(primitive=True)
+    """
+    for search_range in range(1, max_search_range + 1):
+        matrix, score = _find_supercell_matrix(crystal.lower(), int(n_sites), search_range)
+        if score <= max_deviation:
+            break
+
+    logging.debug(f"Supercell matrix for {n_sites} site {crystal} cell: {matrix} (cubic deviation {score:.3f})")
+    return np.array(matrix)
+
+
+def decoration_rng(seed=None, worker: int=0):
+    """
+    Get an independent, reproducible random number stream for one worker.
+
+    Each worker gets its own child of the same seed sequence, so workers never share state and a given
+    (seed, worker) pair always produces the same decorations.
+
+    Args:
+        seed: root seed shared by all workers (None draws fresh entropy)
+        worker: index of the worker
+
+    Returns:
+        np.random.Generator
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(worker,)))
+
+
+def generate_random_decorations(atom_counts, n_decorations: int, rng: np.random.Generator|None=None):
+    """
+    Generate random decorations of a supercell as integer species arrays.
+
+    Args:
+        atom_counts: number of atoms of each species, in element order.  The sum is the number of sites.
+        n_decorations: number of decorations to generate
+        rng: random number generator, see decoration_rng
+
+    Returns:
+        np.ndarray: (n_decorations, n_sites) uint8 array of species indices
+    """
+    rng = rng or decoration_rng()
+    base = np.repeat(np.arange(len(atom_counts), dtype=np.uint8), atom_counts)
+
+    # every row is an independent permutation of the same multiset of species
+    return rng.permuted(np.tile(base, (n_decorations, 1)), axis=1)
+
+
+def decoration_to_structure(supercell: Structure, decoration, elements):
+    """
+    Build a pymatgen structure by placing species on the sites of a supercell.
+
+    Args:
+        supercell: Structure providing the lattice and the site positions
+        decoration: species index for each site.  May cover only the first len(decoration) sites.
+        elements: element symbol for each species index
+
+    Returns:
+        Structure
+    """
+    species = np.asarray(elements, dtype=object)[np.asarray(decoration)]
+    return Structure(supercell.lattice, list(species), supercell.frac_coords[:len(species)])
+
+
+def decorations_to_structures(supercell: Structure, decorations, elements):
+    """
+    Lazily build pymatgen structures for a batch of decorations.
+
+    Args:
+        supercell: Structure providing the lattice and the site positions
+        decorations: (n_decorations, n_sites) species index array
+        elements: element symbol for each species index
+
+    Yields:
+        Structure for each decoration
+    """
+    for decoration in decorations:
+        yield decoration_to_structure(supercell, decoration, elements)
+
+
+def create_random_supercell_structure(composition: Composition, crystal: str, total_atoms=100, rng: np.random.Generator|None=None):
 
     valid_crystal_types = {"fcc", "bcc"}
 
@@ -274,59 +667,28 @@ def create_random_supercell_structure(composition: Composition, crystal: str, to
     # use the most common element as the basis for a creating a unary crystal structure.  Could also use the largest.
     el = get_most_common_element(composition)
 
-    # ---- Make a unit cell of just one element type and scale it up to total_atoms -----
+    # ---- Look up the cached positions of a near-cubic supercell with exactly total_atoms sites -----
     if crystal == "fcc":
         a = estimate_lattice_parameter_fcc(el.atomic_radius)
-        
-        # Create FCC structure using space group Fm-3m (225)
-        structure = Structure.from_spacegroup("Fm-3m", Lattice.cubic(a), [el.name], [[0, 0, 0]])
-
-        scaling_factors = calculate_fcc_scaling_factors(total_atoms)
-        print(f"Scaling factors for FCC structure to achieve ~{total_atoms} atoms: {scaling_factors}")
-        supercell = structure.make_supercell(scaling_factors)
-
     elif crystal == "bcc":
         a = estimate_lattice_parameter_bcc(el.atomic_radius)
 
-        # Create BCC structure using space group Im-3m (229)
-        structure = Structure.from_spacegroup("Im-3m", Lattice.cubic(a), [el.name], [[0, 0, 0]])
-
-        # Example usage
-        scaling_factors = calculate_bcc_scaling_factors(total_atoms)
-        print(f"Scaling factors for BCC structure to achieve ~{total_atoms} atoms: {scaling_factors}")
-        supercell = structure.make_supercell(scaling_factors)
-
+    supercell_matrix = find_supercell_matrix(crystal, total_atoms)
+    lattice, frac_coords = get_supercell(crystal, a, supercell_matrix, primitive=True)
 
-    # get a composition dictionary that lists the element and how many atoms it has in the formula
-    comp_dict = composition.to_reduced_dict
+    # get a composition dictionary that lists the element and its atomic fraction
+    comp_dict = composition.fractional_composition.get_el_amt_dict()
     logging.debug(f'Composition dictionary: {comp_dict}')
 
-    # Calculate the total number of atoms for a composition that will be in supercell size of total_atoms
-    num_atoms = {el: int(round(total_atoms * amt)) for el, amt in comp_dict.items()}
+    # Split the total_atoms sites between the elements so that the counts add up exactly
+    counts = apportion_atoms(list(comp_dict.values()), total_atoms)
+    num_atoms = dict(zip(comp_dict.keys(), counts))
 
-    # Ensure total atoms match exactly 100, adjust the largest if necessary
-    # find largest number in comp_dict
-    el_with_most_atoms = max(num_atoms, key=num_atoms.get)
-    actual_total_atoms = sum(num_atoms.values())
-    if actual_total_atoms < total_atoms:
-        num_atoms[el_with_most_atoms] += total_atoms - actual_total_atoms  # Adjust 
+    # Randomly assign the species to the sites
+    decoration = generate_random_decorations(list(num_atoms.values()), 1, rng)[0]
+    supercell = CompactStructure(lattice, frac_coords, decoration, list(num_atoms.keys()))
 
-    # Randomly replace atoms to achieve the desired composition
-    # Flatten the list of atoms based on num_atoms
-    desired_atoms = [el for el, num in num_atoms.items() for _ in range(num)]
-    # Randomly shuffle the atoms
-    np.random.shuffle(desired_atoms)
-
-    # Replace atoms in the supercell with the shuffled atoms
-    for i, specie in enumerate(desired_atoms):
-        supercell.replace(i, specie)
-
-    # If the supercell has more atoms than needed, remove the excess
-    if len(supercell) > total_atoms:
-        del supercell.sites[total_atoms:]
-
-
-    return supercell
+    return supercell.to_pymatgen()
 
 
 def create_disordered_structure(composition: Composition, crystal: str, lattice_parameter: float|None=None, total_atoms=100 ):
@@ -359,15 +721,207 @@ def create_disordered_structure(composition: Composition, crystal: str, lattice_
 
     # Create a structure with disordered composition directly. use the neutral atom instead of oxidations states.
     species = [{Species(el, 0): amt for el, amt in comp_dict.items()}]
-    coords = [[0, 0, 0]]  # Assuming a single site for simplicity; adjust as needed for your structure
 
-    # Create the initial structure
-    structure = Structure.from_spacegroup("Fm-3m" if crystal == "fcc" else "Im-3m", Lattice.cubic(a), species, coords)
-    logging.debug(f"Initial structure: {structure}")
-    
-    primitive_structure = structure.get_primitive_structure()
+    # Place the disordered site on the cached primitive cell, scaled to the lattice parameter
+    lattice, frac_coords = _primitive_template(crystal)
+    primitive_structure = Structure(Lattice(float(a) * lattice), species * len(frac_coords), frac_coords)
     logging.debug(f"Primitive structure: {primitive_structure}")
 
     return primitive_structure, scaling_factors
 
 
+
+
+def neighbor_table(lattice, frac_coords, n_shells: int=2):
+    """
+    Neighbor indices of every site of a lattice, grouped by shell.
+
+    Every site of an FCC/BCC supercell has the same number of neighbors in each shell, so the neighbors fit
+    in a rectangular table.
+
+    Args:
+        lattice: 3x3 lattice matrix, rows are the lattice vectors
+        frac_coords: (n_sites, 3) fractional coordinates
+        n_shells: number of neighbor shells
+
+    Returns:
+        tuple: ((n_sites, n_neighbors) neighbor indices, (n_neighbors,) shell index of each column,
+            (n_shells,) coordination number of each shell)
+    """
+    n_sites = len(frac_coords)
+    _, i, j, shell = shell_pairs(lattice, frac_coords, n_shells)
+
+    order = np.lexsort((shell, i))
+    coordination = np.bincount(shell, minlength=n_shells) // n_sites
+    assert len(i) == n_sites * coordination.sum(), "neighbor table needs the same coordination on every site"
+
+    neighbors = j[order].reshape(n_sites, -1)
+    neighbor_shell = np.repeat(np.arange(n_shells), coordination)
+
+    return neighbors, neighbor_shell, coordination
+
+
+def _sro_objective(counts, norm, target_alpha, weights):
+    alpha = 1 - counts / norm
+    return np.nansum(weights[:, None, None] * (alpha - target_alpha) ** 2), alpha
+
+
+def sro_monte_carlo(species, neighbors, neighbor_shell, coordination, target_alpha, n_steps: int=20000,
+                    weights=None, temperatures=(1e-3, 1e-6), rng: np.random.Generator|None=None):
+    """
+    Species-swap Monte Carlo toward target Warren-Cowley parameters.
+
+    The neighbor pair counts are kept up to date incrementally: a swap of sites u and v only changes the pairs
+    between those two sites and their neighbors, so every step costs O(coordination) instead of O(n_sites).
+
+    Args:
+        species: (n_sites,) initial species indices, the composition is kept fixed
+        neighbors, neighbor_shell, coordination: neighbor table from neighbor_table
+        target_alpha: (n_shells, n_species, n_species) target alpha, NaN entries are not constrained
+        n_steps: number of swap attempts
+        weights: (n_shells,) weight of each shell in the objective, defaults to 1
+        temperatures: (start, end) of the geometric annealing schedule, in objective units
+        rng: random number generator, see decoration_rng
+
+    Returns:
+        tuple: (best species array, its alpha, its objective)
+    """
+    rng = rng or decoration_rng()
+    species = np.array(species, dtype=np.int64)
+    n_sites = len(species)
+    n_shells = len(coordination)
+    target_alpha = np.asarray(target_alpha, dtype=float)
+    n_species = target_alpha.shape[-1]
+    weights = np.ones(n_shells) if weights is None else np.asarray(weights, dtype=float)
+
+    # directed pair counts[shell, species of site, species of neighbor]
+    flat = neighbor_shell[None, :] * n_species * n_species + species[:, None] * n_species + species[neighbors]
+    counts = np.bincount(flat.ravel(), minlength=n_shells * n_species * n_species).astype(float)
+    counts = counts.reshape(n_shells, n_species, n_species)
+
+    # alpha = 1 - P(b|a) / c_b = 1 - counts / (z * n_a * c_b), and n_a, c_b never change
+    n_atoms = np.bincount(species, minlength=n_species).astype(float)
+    norm = coordination[:, None, None] * n_atoms[None, :, None] * (n_atoms / n_sites)[None, None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        objective, alpha = _sro_objective(counts, norm, target_alpha, weights)
+
+    best_species, best_alpha, best_objective = species.copy(), alpha, objective
+    shell_offset = neighbor_shell * n_species * n_species
+    temperature = np.geomspace(temperatures[0], temperatures[1], n_steps)
+    sites = rng.integers(n_sites, size=(n_steps, 2))
+    thresholds = rng.random(n_steps)
+
+    for step in range(n_steps):
+        u, v = sites[step]
+        a, b = species[u], species[v]
+        if a == b:
+            continue
+
+        # pairs between u (a -> b) and v (b -> a) and their other neighbors, counted in both directions.  The
+        # u-v pairs only swap direction, so they do not change the counts.
+        keep_u = (neighbors[u] != v) & (neighbors[u] != u)
+        keep_v = (neighbors[v] != u) & (neighbors[v] != v)
+        s_u = species[neighbors[u, keep_u]]
+        s_v = species[neighbors[v, keep_v]]
+        k_u = shell_offset[keep_u]
+        k_v = shell_offset[keep_v]
+        # in small cells a site can be its own neighbor through a periodic image: each such directed pair
+        # goes from (a, a) to (b, b) for u and from (b, b) to (a, a) for v
+        self_u = shell_offset[neighbors[u] == u]
+        self_v = shell_offset[neighbors[v] == v]
+        index = np.concatenate([
+            k_u + a * n_species + s_u, k_u + s_u * n_species + a,
+            k_u + b * n_species + s_u, k_u + s_u * n_species + b,
+            k_v + b * n_species + s_v, k_v + s_v * n_species + b,
+            k_v + a * n_species + s_v, k_v + s_v * n_species + a,
+            self_u + a * (n_species + 1), self_u + b * (n_species + 1),
+            self_v + b * (n_species + 1), self_v + a * (n_species + 1),
+        ])
+        sign = np.concatenate([-np.ones(2 * len(s_u)), np.ones(2 * len(s_u)),
+                               -np.ones(2 * len(s_v)), np.ones(2 * len(s_v)),
+                               -np.ones(len(self_u)), np.ones(len(self_u)),
+                               -np.ones(len(self_v)), np.ones(len(self_v))])
+        delta = np.bincount(index, weights=sign, minlength=counts.size).reshape(counts.shape)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            trial_objective, trial_alpha = _sro_objective(counts + delta, norm, target_alpha, weights)
+
+        change = trial_objective - objective
+        if change <= 0 or thresholds[step] < np.exp(-change / temperature[step]):
+            species[u], species[v] = b, a
+            counts += delta
+            objective, alpha = trial_objective, trial_alpha
+            if objective < best_objective:
+                best_species, best_alpha, best_objective = species.copy(), alpha, objective
+
+    return best_species.astype(np.uint8), best_alpha, best_objective
+
+
+def _target_alpha_array(target_alpha, elements, n_shells):
+    # accept an array or {(element, element): alpha} dicts (one per shell), unspecified pairs are free
+    if not isinstance(target_alpha, (dict, list, tuple)) or \
+            (isinstance(target_alpha, (list, tuple)) and not isinstance(target_alpha[0], dict)):
+        return np.asarray(target_alpha, dtype=float)
+
+    shells = [target_alpha] if isinstance(target_alpha, dict) else list(target_alpha)
+    index = {el: n for n, el in enumerate(elements)}
+    target = np.full((n_shells, len(elements), len(elements)), np.nan)
+    for k, shell_target in enumerate(shells):
+        for (el_a, el_b), value in shell_target.items():
+            target[k, index[el_a], index[el_b]] = value
+            target[k, index[el_b], index[el_a]] = value
+    return target
+
+
+def generate_sro_structure(composition: Composition, crystal: str, target_alpha, total_atoms=100,
+                           n_shells: int|None=None, lattice_parameter: float|None=None, n_steps: int|None=None,
+                           weights=None, rng: np.random.Generator|None=None):
+    """
+    Create a supercell whose species arrangement matches prescribed Warren-Cowley parameters.
+
+    Starts from a random decoration of the exact-size supercell used by create_random_supercell_structure and
+    anneals it with sro_monte_carlo.
+
+    Args:
+        composition: composition of the alloy (fractions)
+        crystal: "fcc" or "bcc"
+        target_alpha: (n_shells, n_elements, n_elements) array in the element order of the composition, or a
+            {(element, element): alpha} dict for the first shell, or a list of such dicts (one per shell)
+        total_atoms: exact number of sites
+        n_shells: number of shells constrained, defaults to the number of shells in target_alpha
+        lattice_parameter: lattice parameter, estimated from the most common element if not given
+        n_steps: number of swap attempts, defaults to 200 per site
+        weights: (n_shells,) weight of each shell in the objective
+        rng: random number generator, see decoration_rng
+
+    Returns:
+        tuple: (pymatgen Structure, achieved alpha (n_shells, n_elements, n_elements))
+    """
+    crystal = crystal.lower()
+    assert crystal in SPACE_GROUPS, f"{crystal} is not a valid crystal type. Valid crystal types are fcc, bcc."
+    rng = rng or decoration_rng()
+
+    comp_dict = composition.fractional_composition.get_el_amt_dict()
+    elements = list(comp_dict.keys())
+    if n_shells is None:
+        n_shells = len(target_alpha) if isinstance(target_alpha, (list, tuple)) else \
+            (1 if isinstance(target_alpha, dict) else np.shape(target_alpha)[0])
+    target = _target_alpha_array(target_alpha, elements, n_shells)[:n_shells]
+
+    if lattice_parameter is None:
+        el = get_most_common_element(composition)
+        estimate = estimate_lattice_parameter_fcc if crystal == "fcc" else estimate_lattice_parameter_bcc
+        lattice_parameter = estimate(el.atomic_radius)
+
+    lattice, frac_coords = get_supercell(crystal, lattice_parameter, find_supercell_matrix(crystal, total_atoms),
+                                         primitive=True)
+    neighbors, neighbor_shell, coordination = neighbor_table(lattice, frac_coords, n_shells)
+
+    counts = apportion_atoms(list(comp_dict.values()), total_atoms)
+    initial = generate_random_decorations(counts, 1, rng)[0]
+
+    species, alpha, objective = sro_monte_carlo(initial, neighbors, neighbor_shell, coordination, target,
+                                                n_steps=n_steps or 200 * total_atoms, weights=weights, rng=rng)
+    logging.debug(f"SRO Monte Carlo objective for {composition.reduced_formula}: {objective}")
+
+    return CompactStructure(lattice, frac_coords, species, elements).to_pymatgen(), alpha
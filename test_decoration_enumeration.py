@@ -0,0 +1,43 @@
+import contextlib
+import io
+import logging
+
+import pytest
+from pymatgen.core.composition import Composition
+
+import structure_utils as su
+from decoration_enumeration import enumerate_distinct_structures
+
+
+def _primitive(alloy: str):
+    comp = su.adjust_equiatomic_composition(Composition(alloy))
+    # silence the scaling factor prints
+    with contextlib.redirect_stdout(io.StringIO()):
+        structure, _ = su.create_disordered_structure(comp, "fcc")
+    return structure
+
+
+def _orbits(alloy: str, total_atoms: int):
+    return [multiplicity for _, multiplicity in
+            enumerate_distinct_structures(_primitive(alloy), su.find_supercell_matrix("fcc", total_atoms))]
+
+
+def test_orbit_sizes_add_up_to_all_decorations():
+    # every decoration belongs to exactly one orbit: 16!/(8! 8!) and 12!/(4! 4! 4!)
+    orbits = _orbits("CoNi", 16)
+    assert len(orbits) == 153 and sum(orbits) == 12870
+    assert sum(_orbits("CoCrNi", 12)) == 34650
+
+
+def test_too_many_decorations():
+    # an equiatomic ternary on 24 sites has 9.4e9 decorations
+    with pytest.raises(ValueError):
+        next(enumerate_distinct_structures(_primitive("CoCrNi"), su.find_supercell_matrix("fcc", 24)))
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    test_orbit_sizes_add_up_to_all_decorations()
+    test_too_many_decorations()
+    logging.info("decoration_enumeration checks passed")
@@ -0,0 +1,118 @@
+import io
+import logging
+import pathlib
+import tempfile
+
+import numpy as np
+import pytest
+from ase.build import bulk
+from ase.io import write
+from pymatgen.core.structure import Structure
+
+from poscar_reader import read_poscar, read_poscars
+
+
+POSCAR = """CoNi
+3.6
+1.0 0.0 0.0
+0.0 1.0 0.0
+0.0 0.0 1.0
+Co Ni
+2 2
+Direct
+0.0 0.0 0.0
+0.5 0.5 0.0
+0.5 0.0 0.5
+0.0 0.5 0.5
+"""
+
+SINGLE = """Cu
+1.0
+3.6 0 0
+0 3.6 0
+0 0 3.6
+Cu
+1
+Direct
+0 0 0
+"""
+
+
+def _same(structure, reference: Structure):
+    assert list(structure.symbols) == [site.specie.symbol for site in reference]
+    assert np.allclose(structure.lattice, reference.lattice.matrix)
+    difference = structure.frac_coords - reference.frac_coords
+    assert np.allclose(difference - np.round(difference), 0, atol=1e-8)
+
+
+def test_matches_pymatgen():
+    _same(read_poscar(POSCAR), Structure.from_str(POSCAR, fmt="poscar"))
+
+
+def test_scale_factors():
+    reference = read_poscar(POSCAR)
+    # a negative scale is the cell volume, three numbers scale x, y and z
+    assert np.allclose(read_poscar(POSCAR.replace("\n3.6\n", "\n-46.656\n")).lattice, reference.lattice)
+    per_axis = read_poscar(POSCAR.replace("\n3.6\n", "\n3.6 3.6 7.2\n"))
+    assert np.allclose(per_axis.lattice, reference.lattice * [1, 1, 2])
+    assert np.allclose(per_axis.frac_coords, reference.frac_coords)
+
+
+def test_cartesian_and_selective_dynamics():
+    reference = read_poscar(POSCAR)
+    cartesian = POSCAR.replace("Direct\n0.0 0.0 0.0\n0.5 0.5 0.0\n0.5 0.0 0.5\n0.0 0.5 0.5",
+                               "Cartesian\n0.0 0.0 0.0\n0.5 0.5 0.0\n0.5 0.0 0.5\n0.0 0.5 0.5")
+    assert np.allclose(read_poscar(cartesian).frac_coords, reference.frac_coords)
+
+    head, coords = POSCAR.split("Direct\n")
+    flags = ["F F F", "T T T", "T T F", "T T T"]
+    selective = head + "Selective dynamics\nDirect\n" + "".join(f"{line} {flag}\n" for line, flag in
+                                                                 zip(coords.splitlines(), flags))
+    _same(read_poscar(selective), Structure.from_str(selective, fmt="poscar"))
+
+
+def test_vasp4():
+    vasp4 = POSCAR.replace("Co Ni\n", "").replace("CoNi", "Co2 Ni2")
+    assert list(read_poscar(vasp4).symbols) == ["Co", "Co", "Ni", "Ni"]
+    assert list(read_poscar(vasp4.replace("Co2 Ni2", "Fe2 Cr2"), elements=["Fe", "Cr"]).symbols) == ["Fe", "Fe", "Cr", "Cr"]
+    with pytest.raises(ValueError, match="elements="):
+        read_poscar(vasp4.replace("Co2 Ni2", "generated by me"))
+
+
+def test_path_and_file_sources():
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / "POSCAR"
+        path.write_text(POSCAR)
+        for source in (path, str(path), io.StringIO(POSCAR), POSCAR.encode()):
+            assert np.allclose(read_poscar(source).frac_coords, read_poscar(POSCAR).frac_coords)
+
+
+def test_velocity_blocks():
+    # VASP: blank line then velocities; lattice velocities of MD runs; ase: "Cartesian" header then velocities
+    vasp = POSCAR + "\n" + "0.1 0.2 0.3\n" * 4
+    lattice_velocities = SINGLE + "Lattice velocities and vectors\n  1\n" + "0 0 0\n" * 3 + "3.6 0 0\n0 3.6 0\n0 0 3.6\n" \
+        + "\n0.1 0.2 0.3\n"
+    ase_single = SINGLE + "Cartesian\n0.1 0.2 0.3\n"
+    structures = read_poscars(vasp + lattice_velocities + ase_single + vasp + SINGLE)
+    assert [len(s) for s in structures] == [4, 1, 1, 4, 1]
+
+
+def test_concatenated_ase_contcars():
+    text = ""
+    for el, repeat in (("Cu", 2), ("Fe", 3)):
+        atoms = bulk(el, cubic=True).repeat((repeat, 1, 1))
+        atoms.set_velocities(np.random.default_rng(0).normal(size=(len(atoms), 3)))
+        buffer = io.StringIO()
+        write(buffer, atoms, format="vasp", direct=True)
+        text += buffer.getvalue()
+    structures = read_poscars(text)
+    assert [(s.formula, len(s)) for s in structures] == [("Cu8", 8), ("Fe6", 6)]
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    for test in (test_matches_pymatgen, test_scale_factors, test_cartesian_and_selective_dynamics, test_vasp4,
+                 test_path_and_file_sources, test_velocity_blocks, test_concatenated_ase_contcars):
+        test()
+    logging.info("poscar_reader checks passed")
@@ -0,0 +1,69 @@
+import logging
+
+import numpy as np
+
+import structure_utils as su
+from short_range_order import shell_pairs, warren_cowley
+
+
+def _ordered_cell(crystal: str, lattice_parameter: float):
+    # conventional 2x2x2 supercell of a binary ordered structure with half of the sites of each species
+    lattice, frac_coords = su.get_supercell(crystal, lattice_parameter, [2, 2, 2])
+    if crystal == "bcc":
+        # B2: the cube corners are species 0, the body centers species 1
+        species = (np.abs(2 * frac_coords - np.round(2 * frac_coords)).max(axis=1) > 1e-6).astype(np.int64)
+    else:
+        # L1_0: alternating (001) layers
+        species = (np.abs(2 * frac_coords[:, 2] - np.round(2 * frac_coords[:, 2])) > 1e-6).astype(np.int64)
+    return lattice, frac_coords, species
+
+
+def test_b2_alpha():
+    # every first shell neighbor is of the other species, every second shell neighbor of the same species
+    lattice, frac_coords, species = _ordered_cell("bcc", 2.87)
+    _, i, j, shell = shell_pairs(lattice, frac_coords, 2)
+    alpha = warren_cowley(species, i, j, shell, 2, 2)
+    assert np.allclose(alpha[0], [[1, -1], [-1, 1]])
+    assert np.allclose(alpha[1], [[-1, 1], [1, -1]])
+
+
+def test_l10_alpha():
+    # 4 of the 12 first shell neighbors are in the same layer, so P(b | a) = 2/3 and alpha_ab = 1 - (2/3) / (1/2)
+    lattice, frac_coords, species = _ordered_cell("fcc", 3.6)
+    _, i, j, shell = shell_pairs(lattice, frac_coords, 2)
+    alpha = warren_cowley(species, i, j, shell, 2, 2)
+    assert np.allclose(alpha[0], [[1 / 3, -1 / 3], [-1 / 3, 1 / 3]])
+    assert np.allclose(alpha[1], [[-1, 1], [1, -1]])
+
+
+def test_random_alpha_vanishes_on_average():
+    # with the counts fixed, a neighbor of an a site is b with probability n_b / (n - 1), so the expected
+    # alpha_ab is -1 / (n - 1) for a != b, which vanishes for large cells
+    total_atoms = 256
+    lattice, frac_coords = su.get_supercell("fcc", 3.6, su.find_supercell_matrix("fcc", total_atoms), primitive=True)
+    _, i, j, shell = shell_pairs(lattice, frac_coords, 2)
+    decorations = su.generate_random_decorations(su.apportion_atoms([0.5, 0.3, 0.2], total_atoms), 200,
+                                                 su.decoration_rng(0))
+    alpha = warren_cowley(decorations, i, j, shell, 3, 2)
+    off_diagonal = ~np.eye(3, dtype=bool)
+    assert np.allclose(alpha.mean(axis=0)[:, off_diagonal], -1 / (total_atoms - 1), atol=0.01)
+    assert np.allclose(alpha.mean(axis=0), 0, atol=0.02)
+
+
+def test_batch_matches_single():
+    lattice, frac_coords = su.get_supercell("bcc", 2.87, su.find_supercell_matrix("bcc", 54), primitive=True)
+    _, i, j, shell = shell_pairs(lattice, frac_coords, 3)
+    decorations = su.generate_random_decorations(su.apportion_atoms([0.5, 0.5], 54), 5, su.decoration_rng(1))
+    alpha = warren_cowley(decorations, i, j, shell, 2, 3)
+    for decoration, expected in zip(decorations, alpha):
+        assert np.allclose(warren_cowley(decoration, i, j, shell, 2, 3), expected)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    test_b2_alpha()
+    test_l10_alpha()
+    test_random_alpha_vanishes_on_average()
+    test_batch_matches_single()
+    logging.info("short_range_order Warren-Cowley checks passed")
@@ -6,8 +6,9 @@ import os
 import sqs_generator as sqs
 import structure_utils as su
 from pymatgen.core.composition import Composition
-from pymatgen.command_line import mcsqs_caller
 from gcp_utils.utils import tznow, duck_str, timing
+from mcsqs_runner import run_mcsqs_monitored
+from sqs_kernel import select_sqs_parameters
 
 
 # set the default logging level to INFO
@@ -15,7 +16,7 @@ logging.basicConfig(level=logging.DEBUG)
 
 @timing
 def mcsqs_wrapper(**kwargs):
-    return(mcsqs_caller.run_mcsqs(**kwargs))
+    return(run_mcsqs_monitored(**kwargs))
 
 
 # main function
@@ -57,24 +58,20 @@ if __name__ == '__main__':
     comp = Composition(material)
     adjusted_composition = su.adjust_equiatomic_composition(comp)
     logging.info(f"Adjusted composition: {adjusted_composition}")
-    structure, scaling_factors = su.create_disordered_structure(adjusted_composition, "fcc", lattice_parameter=3.54, total_atoms=32)
-    cutoffs = su.propose_fcc_cutoffs(structure)
+    structure, _ = su.create_disordered_structure(adjusted_composition, "fcc", lattice_parameter=3.54)
 
-    # hardcode to match online version
-    cutoffs = {"2": 3.54, "3": 3.54, "4": 3.54}
-    
+    # smallest cutoffs and supercell that reach the target accuracy on this lattice, from short native trial runs
+    cutoffs, total_atoms, trial_error = select_sqs_parameters(adjusted_composition, "fcc", lattice_parameter=3.54)
+    logging.info(f"Selected {total_atoms} atoms with trial error {trial_error}")
+    scaling_factors = total_atoms // len(structure)
 
-    logging.info(f"Generating SQS using {structure}\n with clusters: {cutoffs}")
 
-    # make a temp directory name called temp_yyyymmddhhssmm
-    temp_dir = f"./temp_{tznow().strftime('%Y%m%d%H%M%S')}"
-    # make the directory
-    os.mkdir(temp_dir)
+    logging.info(f"Generating SQS using {structure}\n with clusters: {cutoffs}")
 
-    # run mcsqs
+    # run mcsqs in a scratch directory until the objective plateaus (at most 30 minutes)
 
-    sqs = mcsqs_wrapper(structure=structure, clusters=cutoffs, scaling=scaling_factors, directory=temp_dir, instances=1, search_time=30)
+    sqs = mcsqs_wrapper(structure=structure, clusters=cutoffs, scaling=scaling_factors, time_budget=30 * 60, plateau_time=120)
     
-    # print the sqs structure to a temp file in temp_dir
-    with open(f"{temp_dir}/sqs.json", "w") as f:
-        f.write(duck_str(sqs))
\ No newline at end of file
+    # print the sqs structure to a file named after the run time
+    with open(f"sqs_{tznow().strftime('%Y%m%d%H%M%S')}.json", "w") as f:
+        f.write(duck_str(sqs))
@@ -0,0 +1,76 @@
+import logging
+
+import numpy as np
+from pymatgen.core.composition import Composition
+
+import structure_utils as su
+from sqs_kernel import (
+    ClusterOrbits, cluster_counts, cluster_orbits, random_cluster_probabilities, select_sqs_parameters,
+    sqs_monte_carlo, sqs_objective, _orbit_norms,
+)
+
+
+def _triplet_objective(species, orbits):
+    concentrations = np.bincount(species, minlength=2) / len(species)
+    counts = {3: cluster_counts(species, orbits, 2)}
+    targets = {3: random_cluster_probabilities(concentrations, 3, orbits.vertex_classes)}
+    return sqs_objective(counts, {3: _orbit_norms(orbits)}, targets, {3: np.ones(orbits.n_orbits)})
+
+
+def test_isosceles_apex_occupation():
+    # eight isosceles triangles (base, base, apex) of a 50/50 binary: the sorted species of the triangles are
+    # exactly those of the random alloy, but no triangle has a 00 base with apex 1 or an 11 base with apex 0
+    decorations = [(0, 0, 0), (1, 1, 1), (0, 1, 0), (1, 0, 0), (0, 1, 0), (0, 1, 1), (1, 0, 1), (0, 1, 1)]
+    species = np.array(decorations).ravel()
+    sites = np.arange(len(species)).reshape(-1, 3)
+
+    apex = ClusterOrbits(sites, np.zeros(len(sites)), [1.0], len(species), vertex_classes=[[0, 0, 1]])
+    equilateral = ClusterOrbits(sites, np.zeros(len(sites)), [1.0], len(species))
+    assert np.isclose(_triplet_objective(species, equilateral), 0)
+    assert _triplet_objective(species, apex) > 1e-3
+
+
+def test_fcc_triplet_vertex_classes():
+    # the (1, 1, 2) shell triangles of FCC keep their apex apart from the base
+    lattice, frac_coords = su.get_supercell("fcc", 3.6, su.find_supercell_matrix("fcc", 32), primitive=True)
+    orbits = cluster_orbits(lattice, frac_coords, {2: 4.0, 3: 4.0})[3]
+    classes = {tuple(c) for c in orbits.vertex_classes}
+    assert classes == {(0, 0, 0), (0, 0, 1)}, classes
+    # 3 species: 10 sorted labels, 18 with the apex resolved
+    assert np.count_nonzero(random_cluster_probabilities(np.full(3, 1 / 3), 3, [[0, 0, 1]])) == 18
+
+
+def test_incremental_counts():
+    # the counts kept up to date by the Monte Carlo give the objective of a full recount
+    lattice, frac_coords = su.get_supercell("fcc", 3.6, su.find_supercell_matrix("fcc", 48), primitive=True)
+    orbits = cluster_orbits(lattice, frac_coords, {2: 4.5, 3: 4.0})
+    initial = su.generate_random_decorations(su.apportion_atoms([1 / 3] * 3, 48), 1, su.decoration_rng(0))[0]
+    species, objective = sqs_monte_carlo(initial, orbits, 3, n_steps=2000, rng=su.decoration_rng(1))
+
+    concentrations = np.bincount(species, minlength=3) / len(species)
+    counts = {order: cluster_counts(species, orbit, 3) for order, orbit in orbits.items()}
+    norms = {order: _orbit_norms(orbit) for order, orbit in orbits.items()}
+    targets = {order: random_cluster_probabilities(concentrations, order, orbit.vertex_classes)
+               for order, orbit in orbits.items()}
+    weights = {order: np.ones(orbit.n_orbits) for order, orbit in orbits.items()}
+    assert np.isclose(sqs_objective(counts, norms, targets, weights), objective)
+
+
+def test_selected_cutoffs_between_shells():
+    # the proposed FCC cutoffs (first shell pairs, second shell triplets) moved halfway to the next shell
+    a = 3.6
+    cutoffs, total_atoms, _ = select_sqs_parameters(Composition("CoNi"), "fcc", target_error=1.0, lattice_parameter=a,
+                                                    sizes=[16], n_trials=2, rng=su.decoration_rng(0))
+    assert total_atoms == 16
+    assert np.isclose(cutoffs[2], (a / np.sqrt(2) + a) / 2)
+    assert np.isclose(cutoffs[3], (a + a * np.sqrt(1.5)) / 2)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    test_isosceles_apex_occupation()
+    test_fcc_triplet_vertex_classes()
+    test_incremental_counts()
+    test_selected_cutoffs_between_shells()
+    logging.info("sqs_kernel checks passed")
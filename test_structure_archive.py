@@ -0,0 +1,85 @@
+import logging
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+import pytest
+
+import structure_utils as su
+from poscar_reader import read_poscar
+from structure_archive import ArchiveWriter, StructureArchive
+
+
+ELEMENTS = ["Co", "Cr", "Ni"]
+
+
+def _parent(total_atoms: int=12):
+    return su.get_supercell("fcc", 3.6, su.find_supercell_matrix("fcc", total_atoms), primitive=True)
+
+
+def _decorations(n: int, seed: int, total_atoms: int=12):
+    return su.generate_random_decorations(su.apportion_atoms([1 / 3] * 3, total_atoms), n, su.decoration_rng(seed))
+
+
+def test_append_across_a_partial_chunk(tmp_path):
+    path = str(tmp_path / "archive")
+    lattice, frac_coords = _parent()
+    first, second = _decorations(5, 0), _decorations(6, 1)
+
+    # 5 structures leave the second chunk of 4 partly filled, reopening appends to it
+    with ArchiveWriter(path, lattice, frac_coords, ELEMENTS, chunk_size=4) as writer:
+        writer.extend(first)
+    with ArchiveWriter(path, lattice, frac_coords, ELEMENTS) as writer:
+        assert len(writer) == 5
+        writer.extend(second)
+
+    archive = StructureArchive(path)
+    expected = np.concatenate([first, second])
+    assert len(archive) == 11
+    assert np.array_equal([archive.species(n) for n in range(len(archive))], expected)
+    assert np.array_equal(np.concatenate(list(archive.species_chunks())), expected)
+    assert np.array_equal(archive[-1].species, expected[-1])
+    with pytest.raises(IndexError):
+        archive[11]
+
+
+def test_displacements_and_poscar_export(tmp_path):
+    path = str(tmp_path / "archive")
+    lattice, frac_coords = _parent()
+    decoration = _decorations(1, 2)[0]
+    displacements = np.random.default_rng(3).normal(scale=0.05, size=(len(frac_coords), 3))
+
+    with ArchiveWriter(path, lattice, frac_coords, ELEMENTS, displacements=True) as writer:
+        writer.append(decoration, displacements)
+        writer.append(decoration)
+
+    archive = StructureArchive(path)
+    assert np.allclose(archive.displacements(0), displacements, atol=1e-3)
+    assert not archive.displacements(1).any()
+    structure = archive[0]
+    shift = structure.frac_coords - frac_coords
+    assert np.allclose(shift @ lattice, displacements, atol=1e-3)
+
+    paths = archive.export_poscar(str(tmp_path / "poscars"))
+    assert len(paths) == 2 and all(os.path.exists(p) for p in paths)
+    exported = read_poscar(paths[0])
+    assert sorted(exported.symbols) == sorted(structure.symbols)
+
+
+def test_mismatched_parent(tmp_path):
+    path = str(tmp_path / "archive")
+    lattice, frac_coords = _parent()
+    with ArchiveWriter(path, lattice, frac_coords, ELEMENTS) as writer:
+        writer.extend(_decorations(2, 0))
+    with pytest.raises(ValueError):
+        ArchiveWriter(path, lattice * 1.05, frac_coords, ELEMENTS)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    for test in (test_append_across_a_partial_chunk, test_displacements_and_poscar_export, test_mismatched_parent):
+        with tempfile.TemporaryDirectory() as directory:
+            test(pathlib.Path(directory))
+    logging.info("structure_archive checks passed")
@@ -0,0 +1,36 @@
+import logging
+
+import numpy as np
+
+import structure_utils as su
+from compact_structure import CompactStructure
+from structure_fingerprint import structure_fingerprint, unique_structure_indices
+
+
+def _random_fcc(seed: int, total_atoms: int=32):
+    lattice, frac_coords = su.get_supercell("fcc", 3.6, su.find_supercell_matrix("fcc", total_atoms), primitive=True)
+    decoration = su.generate_random_decorations(su.apportion_atoms([0.5, 0.5], total_atoms), 1, su.decoration_rng(seed))[0]
+    return CompactStructure(lattice, frac_coords, decoration, ["Co", "Ni"]).to_pymatgen()
+
+
+def test_perturbed_copy_is_a_duplicate():
+    # relaxation-sized displacements keep the fingerprint, so the copy is matched and dropped
+    structure = _random_fcc(0)
+    for distance in (0.01, 0.05):
+        perturbed = structure.copy()
+        perturbed.perturb(distance)
+        assert structure_fingerprint(perturbed) == structure_fingerprint(structure)
+        assert unique_structure_indices([structure, perturbed]) == [0]
+
+
+def test_different_decorations_are_kept():
+    structures = [_random_fcc(seed) for seed in range(4)]
+    assert unique_structure_indices(structures + [structures[1].copy()]) == [0, 1, 2, 3]
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    test_perturbed_copy_is_a_duplicate()
+    test_different_decorations_are_kept()
+    logging.info("structure_fingerprint checks passed")
@@ -0,0 +1,55 @@
+import logging
+
+import numpy as np
+
+import structure_utils as su
+from neighbor_list import neighbor_shells
+from short_range_order import shell_pairs, warren_cowley
+
+
+# measured lattice parameters in Angstroms
+CU_FCC = 3.615
+FE_BCC = 2.867
+
+
+def test_lattice_parameter_known_elements():
+    # touching spheres of the metallic radius reproduce the measured lattice parameters within 2 %
+    assert np.isclose(su.estimate_lattice_parameters([[1]], ['Cu'], 'fcc', radius="metallic_radius")[0], CU_FCC, rtol=0.02)
+    assert np.isclose(su.estimate_lattice_parameters([[1]], ['Fe'], 'bcc', radius="metallic_radius")[0], FE_BCC, rtol=0.02)
+    # the atomic radius is a little larger, but still within 10 %
+    assert np.isclose(su.estimate_lattice_parameters([[1]], ['Cu'], 'fcc')[0], CU_FCC, rtol=0.1)
+
+
+def test_lattice_parameter_nearest_neighbor_distance():
+    # the nearest neighbors of the estimated lattice touch: their distance is the atomic diameter
+    radius = 1.25
+    for crystal, estimate in (("fcc", su.estimate_lattice_parameter_fcc), ("bcc", su.estimate_lattice_parameter_bcc)):
+        lattice, frac_coords = su.get_supercell(crystal, estimate(radius), su.find_supercell_matrix(crystal, 32),
+                                                primitive=True)
+        distances, _ = neighbor_shells(lattice, frac_coords, 1)
+        assert np.isclose(distances[0], 2 * radius), f"{crystal} nearest neighbor distance {distances[0]}"
+
+
+def test_sro_monte_carlo_alpha_matches_recount():
+    # the incrementally updated alpha is that of the returned species, also in cells small enough that a
+    # site is its own neighbor through a periodic image
+    for total_atoms in (8, 32):
+        lattice, frac_coords = su.get_supercell("fcc", 3.6, su.find_supercell_matrix("fcc", total_atoms), primitive=True)
+        neighbors, neighbor_shell, coordination = su.neighbor_table(lattice, frac_coords, 2)
+        initial = su.generate_random_decorations(su.apportion_atoms([0.5, 0.5], total_atoms), 1, su.decoration_rng(0))[0]
+        target = np.full((2, 2, 2), np.nan)
+        target[0, 0, 1] = target[0, 1, 0] = -0.3
+
+        species, alpha, _ = su.sro_monte_carlo(initial, neighbors, neighbor_shell, coordination, target, n_steps=500,
+                                               rng=su.decoration_rng(1))
+        _, i, j, shell = shell_pairs(lattice, frac_coords, 2)
+        assert np.allclose(alpha, warren_cowley(species, i, j, shell, 2, 2), equal_nan=True), f"{total_atoms} sites"
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    test_lattice_parameter_known_elements()
+    test_lattice_parameter_nearest_neighbor_distance()
+    test_sro_monte_carlo_alpha_matches_recount()
+    logging.info("structure_utils lattice parameter checks passed")